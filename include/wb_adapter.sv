@@ -10,10 +10,17 @@ module wb_adapter #(
 
   parameter SLAVE_ADR_BITS = 16,
   parameter SLAVE_PORT_SIZE = 8, // port size of slave, in bits
-  parameter SLAVE_GRANULARITY = 8 // granularity of master, in bits
+  parameter SLAVE_GRANULARITY = 8, // granularity of master, in bits
+
+  parameter PIPELINED = 0, // set to 1 for Wishbone B4 pipelined mode
+  parameter PIPELINE_DEPTH = 4 // maximum number of outstanding requests in pipelined mode (power of 2)
 
 ) (
 
+  // clock and reset are only needed for an expander in pipelined mode
+  input wire clk_i,
+  input wire rst_i,
+
   wishbone.slave master_m,
   wishbone.master slave_s
 
@@ -47,6 +54,10 @@ module wb_adapter #(
     assert (SHRINKER_SEL_STRIDE==1) else $warning("SEL: since SLAVE_GRANULARITY > MASTER_GRANULARITY, some master SEL bits will be ignored!");
   end
 
+
+  // stalls requests in pipelined mode, in addition to the slave's stall
+  logic adapter_stall;
+
   
   generate
 
@@ -63,6 +74,12 @@ module wb_adapter #(
           $info("Generating a Wishbone bus granularity adapter");
       end
 
+      assign adapter_stall = 0;
+
+      // addresses map 1:1, so bursts can be passed through
+      assign slave_s.cti = master_m.cti;
+      assign slave_s.bte = master_m.bte;
+
       always_comb begin
         
         // connect address directly; Verilog matches the LSBs automatically
@@ -91,7 +108,7 @@ module wb_adapter #(
       localparam MUX_CONTROL_BITS = $clog2(MUX_STATE_COUNT);
       localparam MUX_SEL_WIDTH = N_SLAVE_SEL_BITS / MUX_STATE_COUNT;
       
-      logic[63:0] tmp_adr, mux_sel;
+      logic[63:0] tmp_adr, mux_sel, resp_mux_sel;
 
       initial begin
         $info("Generating a Wishbone bus expander");
@@ -99,6 +116,10 @@ module wb_adapter #(
         //$info("MUX: MUX_DAT_WIDTH=%p, MUX_SEL_WIDTH=%p, MUX_STATE_COUNT=%p, MUX_CONTROL_BITS=%p", MUX_DAT_WIDTH, MUX_SEL_WIDTH, MUX_STATE_COUNT, MUX_CONTROL_BITS);
       end
 
+      // consecutive master addresses may map to the same slave address, so bursts are turned into classic cycles
+      assign slave_s.cti = 3'b000;
+      assign slave_s.bte = 2'b00;
+
       always_comb begin
 
         // grab off the mux selector bits
@@ -120,7 +141,7 @@ module wb_adapter #(
         // use address to mux slave data to slave data
         master_m.dat_sm <= '0;
         for(int i = 0; i < MUX_STATE_COUNT; i++) begin
-          if (mux_sel == i)
+          if (resp_mux_sel == i)
             master_m.dat_sm <= slave_s.dat_sm[i*MASTER_PORT_SIZE+:MASTER_PORT_SIZE];
         end
 
@@ -136,17 +157,59 @@ module wb_adapter #(
 
       end
 
+      if (PIPELINED) begin
+
+        // in pipelined mode, the master may already present the next address when a response arrives;
+        //   so the selector of each outstanding request is kept in a FIFO
+
+        localparam FIFO_BITS = (PIPELINE_DEPTH > 1) ? $clog2(PIPELINE_DEPTH) : 1;
+
+        logic[MUX_CONTROL_BITS-1:0] sel_fifo_r[2**FIFO_BITS];
+        logic[FIFO_BITS:0] wr_ptr_r, rd_ptr_r;
+        logic fifo_empty, fifo_full;
+
+        assign fifo_empty = (wr_ptr_r == rd_ptr_r);
+        assign fifo_full = (wr_ptr_r[FIFO_BITS-1:0] == rd_ptr_r[FIFO_BITS-1:0]) && (wr_ptr_r[FIFO_BITS] != rd_ptr_r[FIFO_BITS]);
+        assign adapter_stall = fifo_full;
+        assign resp_mux_sel = fifo_empty ? mux_sel : sel_fifo_r[rd_ptr_r[FIFO_BITS-1:0]];
+
+        always_ff @(posedge rst_i or posedge clk_i) begin
+          if (rst_i) begin
+            wr_ptr_r <= '0;
+            rd_ptr_r <= '0;
+          end else if (~master_m.cyc) begin
+            // cycle aborted, responses will not arrive anymore
+            wr_ptr_r <= '0;
+            rd_ptr_r <= '0;
+          end else begin
+            if (slave_s.stb & ~slave_s.stall) begin
+              sel_fifo_r[wr_ptr_r[FIFO_BITS-1:0]] <= mux_sel;
+              wr_ptr_r <= wr_ptr_r + 1;
+            end
+            if (slave_s.ack | slave_s.err | slave_s.rty)
+              rd_ptr_r <= rd_ptr_r + 1;
+          end
+        end
+
+      end else begin
+
+        assign adapter_stall = 0;
+        assign resp_mux_sel = mux_sel;
+
+      end
+
     end
 
   endgenerate
 
 
   // route all other signals directly
-  assign slave_s.stb = master_m.stb;
+  assign slave_s.stb = master_m.stb & ~adapter_stall;
   assign slave_s.cyc = master_m.cyc;
   assign slave_s.we = master_m.we;
   assign master_m.ack = slave_s.ack;
   assign master_m.err = slave_s.err;
   assign master_m.rty = slave_s.rty;
+  assign master_m.stall = slave_s.stall | adapter_stall;
 
 endmodule
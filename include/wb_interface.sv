@@ -25,18 +25,21 @@ interface wishbone #(
   logic stb;
   logic cyc;
   logic we;
+  logic[2:0] cti; // only used for bursts
+  logic[1:0] bte; // only used for bursts
   logic ack;
   logic err;
   logic rty;
+  logic stall; // only used in pipelined mode
 
   modport master (
-    output adr, dat_ms, sel, stb, cyc, we,
-    input dat_sm, ack, err, rty
+    output adr, dat_ms, sel, stb, cyc, we, cti, bte,
+    input dat_sm, ack, err, rty, stall
   );
 
   modport slave (
-    input adr, dat_ms, sel, stb, cyc, we,
-    output dat_sm, ack, err, rty
+    input adr, dat_ms, sel, stb, cyc, we, cti, bte,
+    output dat_sm, ack, err, rty, stall
   );
 
 endinterface
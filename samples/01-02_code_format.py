@@ -49,6 +49,9 @@ if __name__ == '__main__':
         write_func='wr', # to write to the bus, call this function
         write_masked_func='wrm', # to write to the bus with a word-mask, call this function
         accessor_obj=True, # we will get handed an object on which we can call the above methods
+        transactions=True, # also generate transaction(), which merges field accesses per register (and uses execute_batch() of the object, if it exists)
+        snapshot=True, # also generate snapshot(), which reads all readable registers at once (with read_block() of the object, if it exists)
+        numpy_codecs=True, # also generate decode_<register>() and encode_<register>(), to convert between NumPy arrays of register words and field values
     )
     py = RegisterPyGenerator(regset, format=py_fmt)
     py.save(f'{NAME}_object.py')
@@ -67,6 +70,6 @@ if __name__ == '__main__':
     py.save(f'{NAME}_global.py')
 
     
-    # The Markdown generator currently has no options
-    md = RegisterMdGenerator(regset)
+    # The Markdown generator documents the access timing of the HDL, so it gets the same format
+    md = RegisterMdGenerator(regset, sv_format=sv_fmt)
     md.save(f'{NAME}.md')
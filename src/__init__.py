@@ -1,3 +1,5 @@
 from .registers import structure, codegen
 from .bus import structure, codegen
 from .lib import CodeFormatter, SvCodeFormatter, SvModule, SvAlwaysFf, SvIfBlock, SvInstance
+
+from .generate import generate_all, Backend
@@ -0,0 +1,7 @@
+from .cli import main
+
+import sys
+
+
+
+sys.exit(main())
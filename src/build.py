@@ -0,0 +1,146 @@
+from .generate import Backend, GeneratorJob, plan_jobs, run_jobs
+from .registers.structure import RegisterSet, CompiledRegisterSet
+from .bus.structure import WbBus
+
+import dataclasses
+import os
+import runpy
+import sys
+
+
+
+@dataclasses.dataclass
+class BuildSpec:
+    """ Everything the build driver generates code for """
+
+    register_sets: "list[RegisterSet|CompiledRegisterSet]"
+    buses: "list[WbBus]"
+    """ backends to use; None uses all """
+    backends: "list[Backend]|None" = None
+    formats: "dict[Backend,object]" = dataclasses.field(default_factory=dict)
+    """ files the spec was loaded from; generated files depend on them """
+    sources: "list[str]" = dataclasses.field(default_factory=list)
+
+
+
+def load_python_spec(filename: str) -> BuildSpec:
+    """
+    Loads a spec from a Python script
+
+    The script must define a list <register_sets>, and may define a list <buses>, a list <backends> and a dict
+    <formats> (see generate_all()). Modules that the script imports from its own directory are recorded as
+    sources, too.
+    """
+    spec_dir = os.path.dirname(os.path.abspath(filename))
+    modules_before = set(sys.modules.keys())
+    sys.path.insert(0, spec_dir)
+    try:
+        namespace = runpy.run_path(filename, run_name='__fpga_io_gen_spec__')
+    finally:
+        sys.path.remove(spec_dir)
+
+    if 'register_sets' not in namespace:
+        raise ValueError(f'Spec <{filename}> does not define <register_sets>')
+
+    sources = [filename]
+    for name in sorted(set(sys.modules.keys()) - modules_before):
+        module_file = getattr(sys.modules[name], '__file__', None)
+        if module_file is not None and os.path.abspath(module_file).startswith(spec_dir + os.sep):
+            sources.append(os.path.relpath(module_file))
+
+    return BuildSpec(namespace['register_sets'], namespace.get('buses', []), namespace.get('backends'), namespace.get('formats', {}), sources)
+
+
+
+@dataclasses.dataclass
+class BuildNode:
+
+    name: str
+    """ names of the nodes that must be built first """
+    dependencies: "list[str]"
+    """ the job that generates the artifact; None for the register set and bus nodes themselves """
+    job: "GeneratorJob|None" = None
+
+
+
+class BuildGraph:
+    """ Dependency graph from register sets and buses to the generated artifacts; nodes are in topological order """
+
+
+    def __init__(self, spec: BuildSpec, out_dir: "str|dict[Backend,str]", backends: "list[Backend]|None" = None):
+        self.spec = spec
+        if backends is None:
+            backends = spec.backends if spec.backends is not None else list(Backend)
+
+        self.nodes: "dict[str,BuildNode]" = {}
+        for regset in spec.register_sets:
+            self._add(f'registers:{regset.name}', [])
+        for bus in spec.buses:
+            # the slaves of a bus get their address size from their register sets
+            slave_sets = [f'registers:{slave._register_set.name}' for slave in bus.slaves if slave._register_set is not None]
+            self._add(f'bus:{bus.name}', [name for name in slave_sets if name in self.nodes])
+
+        jobs = plan_jobs(spec.register_sets, spec.buses, backends, out_dir, spec.formats)
+        # graphs go first, as the Markdown documentation of a bus links its graph
+        graphs = {}
+        for job in sorted(jobs, key=lambda job: job.backend != Backend.Graph):
+            model_node = f'bus:{job.model.name}' if isinstance(job.model, WbBus) else f'registers:{job.model.name}'
+            dependencies = [model_node]
+            if job.backend == Backend.Markdown and model_node in graphs:
+                dependencies.append(graphs[model_node])
+            node = self._add(job.get_filenames()[0], dependencies, job)
+            if job.backend == Backend.Graph:
+                graphs[model_node] = node
+
+
+    def _add(self, name: str, dependencies: "list[str]", job: "GeneratorJob|None" = None) -> str:
+        if name in self.nodes:
+            raise ValueError(f'Duplicate build node <{name}>')
+        self.nodes[name] = BuildNode(name, dependencies, job)
+        return name
+
+
+    def select(self, targets: "list[str]|None" = None) -> "list[BuildNode]":
+        """
+        Returns the nodes that are needed to build <targets>, in topological order
+
+        A target is a node name (e.g. "registers:My Regs", "bus:My Bus", or the first output file of an artifact), or
+        the name of a register set or bus, which selects all of its artifacts. None selects everything.
+        """
+        if targets is None:
+            return list(self.nodes.values())
+
+        wanted = set()
+        for target in targets:
+            matches = [n.name for n in self.nodes.values() if target in [n.name, n.name.split(':',1)[-1]] or \
+                (n.job is not None and target in [n.job.model.name] + n.job.get_filenames())]
+            if len(matches) == 0:
+                raise ValueError(f'Unknown target <{target}>')
+            wanted.update(matches)
+
+        # the nodes are in topological order, so walking backwards visits dependents before their dependencies
+        for node in reversed(list(self.nodes.values())):
+            if node.name in wanted:
+                wanted.update(node.dependencies)
+        return [node for node in self.nodes.values() if node.name in wanted]
+
+
+    def build(self, targets: "list[str]|None" = None, workers: "int|None" = None) -> "tuple[list[str],list[str]]":
+        """ Builds the selected artifacts; returns (all output files, regenerated files) """
+        jobs = [node.job for node in self.select(targets) if node.job is not None]
+        regenerated = run_jobs(jobs, workers)
+        outputs = [filename for job in jobs for filename in job.get_filenames()]
+        return outputs, [filename for filenames in regenerated for filename in filenames]
+
+
+
+def write_depfile(filename: str, outputs: "list[str]", sources: "list[str]"):
+    """ Writes a Make/Ninja-compatible depfile, in which every output depends on all sources """
+
+    def escape(path: str) -> str:
+        return path.replace('\\', '/').replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+    prerequisites = ' '.join([escape(s) for s in sources])
+    with open(filename, 'w') as fp:
+        for output in outputs:
+            fp.write(f'{escape(output)}: {prerequisites}\n')
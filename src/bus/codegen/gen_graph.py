@@ -1,5 +1,6 @@
 from ..tools import *
 from ..structure.types import WbBus, WbMaster, WbSlave
+from ...output_cache import input_digest, save_outputs
 
 from sys import maxsize
 from graphviz import Graph, Digraph
@@ -12,9 +13,15 @@ class BusGraphGenerator:
     def __init__(self, bus: 'WbBus', filename: str = 'wb_bus.gv'):
         self.bus = bus
         self.filename = filename
-        
-        gen = BusGraphGeneratorHelper(bus, filename)
-        self.graph = gen.graph
+        self._graph = None
+    
+
+    @property
+    def graph(self) -> Graph:
+        # the graph is only built when it is needed, so that save() can skip it if the file is up to date
+        if self._graph is None:
+            self._graph = BusGraphGeneratorHelper(self.bus, self.filename).graph
+        return self._graph
     
 
     def get_graph(self) -> Graph:
@@ -30,14 +37,16 @@ class BusGraphGenerator:
         render:    If True, a graphic is created. The format depends on the file extension of
             filename, e.g. ".pdf" or ".png". If False, the raw dot-file (graphviz format)
             is saved instead.
+        The file is skipped if it is up to date, and only written if its contents changed; returns the regenerated files.
         """
 
+        digest = input_digest(type(self).__name__, self.bus.get_digest(), self.filename, render)
         if render:
-            path_only, ext = os.path.splitext(filename)
+            _, ext = os.path.splitext(filename)
             format = ext[1:] # remove the dot
-            self.graph.render(path_only, cleanup=True, format=format)
+            return save_outputs(digest, [('graph', filename, lambda fp: fp.write(self.graph.pipe(format=format)))], binary=True)
         else:
-            self.graph.save(filename)
+            return save_outputs(digest, [('dot', filename, lambda fp: fp.write(self.graph.source))])
 
 
 
@@ -1,4 +1,5 @@
-from ...tools import md_table, binary_si
+from ...tools import md_table, binary_si, write_lines
+from ...output_cache import input_digest, save_outputs
 from ..structure.types import WbBus, WbNode, WbBusTopology
 
 
@@ -7,18 +8,27 @@ class BusMdGenerator:
 
     def __init__(self, bus: 'WbBus', graph_filename: "str|None" = None):
         self.bus = bus
-        
-        gen = BusMdGeneratorHelper(bus, graph_filename)
-        self.md = gen.md
+        self.graph_filename = graph_filename
+        self._md = None
+    
+
+    @property
+    def md(self) -> "list[str]":
+        # documentation is only generated when it is needed, so that save() can skip it if the file is up to date
+        if self._md is None:
+            self._md = BusMdGeneratorHelper(self.bus, self.graph_filename).md
+        return self._md
     
 
     def get_md(self) -> str:
-        return self.md
+        return '\n'.join(self.md)
     
 
     def save(self, filename: str):
-        with open(filename, 'w') as fp:
-            fp.write(self.get_md())
+        """ Saves the documentation; skipped if the file is up to date, and only written if its contents changed; returns the regenerated files """
+        return save_outputs(input_digest(type(self).__name__, self.bus.get_digest(), self.graph_filename), [
+            ('md', filename, lambda fp: write_lines(fp, self.md)),
+        ])
            
 
 
@@ -26,7 +36,12 @@ def get_signals_str(node: "WbNode") -> str:
 
     adr_lo, adr_hi = node.get_adr_bits()
     sel_hi = node.get_sel_bit_count() - 1
-    return f'`dat[{node.port_size-1}:0]`, `adr[{adr_hi}:{adr_lo}]`, `sel[{sel_hi}:0]`'
+    sigs = f'`dat[{node.port_size-1}:0]`, `adr[{adr_hi}:{adr_lo}]`, `sel[{sel_hi}:0]`'
+    if node.pipelined:
+        sigs += ', `stall`'
+    if node.burst:
+        sigs += ', `cti`, `bte`'
+    return sigs
 
 
 
@@ -144,4 +159,4 @@ class BusMdGeneratorHelper:
         md.append('Note that the base address is given from the bus\'s point of view; masters might have to shift the address.')
         md.append('')
         
-        self.md = '\n'.join(md)
+        self.md = md
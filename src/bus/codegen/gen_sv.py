@@ -1,5 +1,6 @@
 from ..tools import get_adr_bits
-from ...tools import make_sourcecode_name, NamingConvention
+from ...tools import NamingConvention, write_lines
+from ...output_cache import input_digest, save_outputs
 from ..structure.types import WbBus, WbMaster, WbSlave, WbNode
 
 import math
@@ -11,27 +12,40 @@ class BusSvGenerator:
 
     def __init__(self, bus: 'WbBus'):
         self.bus = bus
-        
-        gen = BusSvGeneratorHelper(bus)
-        self.instance = gen.instance
-        self.implementation = gen.implementation
+        self._gen = None
+    
+
+    @property
+    def instance(self) -> "list[str]":
+        return self._generate().instance
+    
+
+    @property
+    def implementation(self) -> "list[str]":
+        return self._generate().implementation
+    
+
+    def _generate(self) -> "BusSvGeneratorHelper":
+        # code is only generated when it is needed, so that save() can skip it if all files are up to date
+        if self._gen is None:
+            self._gen = BusSvGeneratorHelper(self.bus)
+        return self._gen
     
 
     def get_instance_template_code(self) -> str:
-        return self.instance
+        return '\n'.join(self.instance)
     
 
     def get_code(self) -> str:
-        return self.implementation
+        return '\n'.join(self.implementation)
     
 
     def save(self, filename_code: str = None, filename_instance_template: str = None):
-        if filename_code is not None:
-            with open(filename_code, 'w') as fp:
-                fp.write(self.get_code())
-        if filename_instance_template is not None:
-            with open(filename_instance_template, 'w') as fp:
-                fp.write(self.get_instance_template_code())
+        """ Saves the code; files that are up to date are skipped, and files are only written if their contents changed; returns the regenerated files """
+        return save_outputs(input_digest(type(self).__name__, self.bus.get_digest()), [
+            ('code', filename_code, lambda fp: write_lines(fp, self.implementation)),
+            ('instance_template', filename_instance_template, lambda fp: write_lines(fp, self.instance)),
+        ])
            
 
 
@@ -47,11 +61,11 @@ class BusSvGeneratorHelper:
     def update(self):
 
         def module_name(name: str) -> str:
-            return make_sourcecode_name(name, NamingConvention.snake_case)
+            return self.bus.symbols.name(name, NamingConvention.snake_case)
         def signal_name(name: str) -> str:
-            return make_sourcecode_name(name, NamingConvention.snake_case)
+            return self.bus.symbols.name(name, NamingConvention.snake_case)
         def placeholder_name(name: str) -> str:
-            return make_sourcecode_name(name, NamingConvention.CONSTANT_CASE)
+            return self.bus.symbols.name(name, NamingConvention.CONSTANT_CASE)
         
         from ..structure.types import WbBusTopology
 
@@ -59,6 +73,14 @@ class BusSvGeneratorHelper:
         bus_granularity = self.bus.bus_format.granularity
         bus_address_size = self.bus.bus_format.address_size
             
+        bus_pipelined = self.bus.bus_format.pipelined
+        bus_burst = self.bus.bus_format.burst
+        
+        def master_cti(master: WbMaster, name: str) -> str:
+            # masters that cannot burst might leave CTI/BTE undriven, so classic cycles are forced
+            return f'{name}.cti' if master.burst else '3\'b000'
+        def master_bte(master: WbMaster, name: str) -> str:
+            return f'{name}.bte' if master.burst else '2\'b00'
         bus_adr_hi, bus_adr_lo = bus_address_size-1, int(round(math.log2(bus_port_size//bus_granularity)))
         bus_sel_hi = bus_port_size//bus_granularity-1
         
@@ -131,6 +153,11 @@ class BusSvGeneratorHelper:
             impl.append(f'logic bus_ack_l;')
             impl.append(f'logic bus_err_l;')
             impl.append(f'logic bus_rty_l;')
+            if bus_pipelined:
+                impl.append(f'logic bus_stall_l;')
+            if bus_burst:
+                impl.append(f'logic[2:0] bus_cti_l;')
+                impl.append(f'logic[1:0] bus_bte_l;')
 
         adapter_decls = []
         adapter_impls = []
@@ -156,8 +183,12 @@ class BusSvGeneratorHelper:
                         adapter_impls.append(f'\t.MASTER_GRANULARITY({component.granularity}),')
                         adapter_impls.append(f'\t.SLAVE_ADR_BITS({bus_address_size}),')
                         adapter_impls.append(f'\t.SLAVE_PORT_SIZE({bus_port_size}),')
-                        adapter_impls.append(f'\t.SLAVE_GRANULARITY({bus_granularity})')
+                        adapter_impls.append(f'\t.SLAVE_GRANULARITY({bus_granularity}){"," if bus_pipelined else ""}')
+                        if bus_pipelined:
+                            adapter_impls.append(f'\t.PIPELINED(1)')
                         adapter_impls.append(f') wb_adapter_bus_to_slave_{module_name(component.name)} (')
+                        adapter_impls.append(f'\t.clk_i(clk_i),')
+                        adapter_impls.append(f'\t.rst_i(rst_i),')
                         adapter_impls.append(f'\t.master_m({module_name(component.name)}_mi),')
                         adapter_impls.append(f'\t.slave_s({comp_name})')
                     else:
@@ -166,8 +197,12 @@ class BusSvGeneratorHelper:
                         adapter_impls.append(f'\t.MASTER_GRANULARITY({bus_granularity}),')
                         adapter_impls.append(f'\t.SLAVE_ADR_BITS({component.address_size}),')
                         adapter_impls.append(f'\t.SLAVE_PORT_SIZE({component.port_size}),')
-                        adapter_impls.append(f'\t.SLAVE_GRANULARITY({component.granularity})')
+                        adapter_impls.append(f'\t.SLAVE_GRANULARITY({component.granularity}){"," if bus_pipelined else ""}')
+                        if bus_pipelined:
+                            adapter_impls.append(f'\t.PIPELINED(1)')
                         adapter_impls.append(f') wb_adapter_slave_{module_name(component.name)}_to_bus (')
+                        adapter_impls.append(f'\t.clk_i(clk_i),')
+                        adapter_impls.append(f'\t.rst_i(rst_i),')
                         adapter_impls.append(f'\t.master_m({comp_name}),')
                         adapter_impls.append(f'\t.slave_s({module_name(component.name)}_so)')
                     adapter_impls.append(f');')
@@ -207,9 +242,14 @@ class BusSvGeneratorHelper:
                 impl.append(f'assign bus_stb_l = {adapted_names[master.name]}.stb;')
                 impl.append(f'assign bus_cyc_l = {adapted_names[master.name]}.cyc;')
                 impl.append(f'assign bus_we_l = {adapted_names[master.name]}.we;')
+                if bus_burst:
+                    impl.append(f'assign bus_cti_l = {master_cti(master, adapted_names[master.name])};')
+                    impl.append(f'assign bus_bte_l = {master_bte(master, adapted_names[master.name])};')
                 impl.append(f'assign {adapted_names[master.name]}.ack = bus_ack_l;')
                 impl.append(f'assign {adapted_names[master.name]}.err = bus_err_l;')
                 impl.append(f'assign {adapted_names[master.name]}.rty = bus_rty_l;')
+                if bus_pipelined:
+                    impl.append(f'assign {adapted_names[master.name]}.stall = bus_stall_l;')
             
             else:
                 m_cycs = [f'{adapted_names[m.name]}.cyc' for m in self.bus.masters]
@@ -250,12 +290,17 @@ class BusSvGeneratorHelper:
                     impl.append(f'\t\tbus_sel_l <= {adapted_names[master.name]}.sel;')
                     impl.append(f'\t\tbus_stb_l <= {adapted_names[master.name]}.stb;')
                     impl.append(f'\t\tbus_we_l <= {adapted_names[master.name]}.we;')
+                    if bus_burst:
+                        impl.append(f'\t\tbus_cti_l <= {master_cti(master, adapted_names[master.name])};')
+                        impl.append(f'\t\tbus_bte_l <= {master_bte(master, adapted_names[master.name])};')
                 impl.append(f'\tend')
                 impl.append(f'\t')
                 for i,master in enumerate(self.bus.masters):
                     impl.append(f'\t{adapted_names[master.name]}.ack <= bus_ack_l & arbiter_grant_w[{i}];')
                     impl.append(f'\t{adapted_names[master.name]}.err <= bus_err_l & arbiter_grant_w[{i}];')
                     impl.append(f'\t{adapted_names[master.name]}.rty <= bus_rty_l & arbiter_grant_w[{i}];')
+                    if bus_pipelined:
+                        impl.append(f'\t{adapted_names[master.name]}.stall <= bus_stall_l | ~arbiter_grant_w[{i}];')
                     impl.append(f'\t')
                 impl.append(f'end')
                 impl.append(f'')
@@ -280,9 +325,14 @@ class BusSvGeneratorHelper:
                 impl.append(f'assign {adapted_names[slave.name]}.stb = bus_stb_l;')
                 impl.append(f'assign {adapted_names[slave.name]}.we = bus_we_l;')
                 impl.append(f'assign {adapted_names[slave.name]}.cyc = bus_cyc_l;')
+                if bus_burst:
+                    impl.append(f'assign {adapted_names[slave.name]}.cti = bus_cti_l;')
+                    impl.append(f'assign {adapted_names[slave.name]}.bte = bus_bte_l;')
                 impl.append(f'assign bus_ack_l = {adapted_names[slave.name]}.ack;')
                 impl.append(f'assign bus_err_l = {adapted_names[slave.name]}.err;')
                 impl.append(f'assign bus_rty_l = {adapted_names[slave.name]}.rty;')
+                if bus_pipelined:
+                    impl.append(f'assign bus_stall_l = {adapted_names[slave.name]}.stall;')
 
             else:
                 impl.append(f'/////////////////////////////////////////////////////////////')
@@ -304,24 +354,62 @@ class BusSvGeneratorHelper:
                 impl.append(f'\tend')
                 impl.append(f'end')
 
+                if bus_pipelined:
+                    n_slaves = len(self.bus.slaves)
+                    impl.append(f'')
+                    impl.append(f'')
+                    impl.append(f'// pipelined mode: responses are routed to the slave of the outstanding requests;')
+                    impl.append(f'// the bus stalls when a request addresses another slave before all responses arrived')
+                    impl.append(f'')
+                    impl.append(f'logic[{n_slaves-1}:0] resp_sel_r;')
+                    impl.append(f'logic[{n_slaves-1}:0] resp_sel_l;')
+                    impl.append(f'logic[7:0] pending_r;')
+                    impl.append(f'logic switch_stall_l;')
+                    impl.append(f'')
+                    impl.append(f'always_comb begin')
+                    impl.append(f'\tswitch_stall_l <= (pending_r != 0) && (addrcomp_en_l != resp_sel_r);')
+                    impl.append(f'\tresp_sel_l <= (pending_r != 0) ? resp_sel_r : addrcomp_en_l;')
+                    impl.append(f'end')
+                    impl.append(f'')
+                    impl.append(f'always_ff @(posedge rst_i or posedge clk_i) begin')
+                    impl.append(f'\tif (rst_i) begin')
+                    impl.append(f'\t\tresp_sel_r <= \'0;')
+                    impl.append(f'\t\tpending_r <= \'0;')
+                    impl.append(f'\tend else begin')
+                    impl.append(f'\t\tif (bus_stb_l & ~bus_stall_l)')
+                    impl.append(f'\t\t\tresp_sel_r <= addrcomp_en_l;')
+                    impl.append(f'\t\tpending_r <= pending_r + (bus_stb_l & ~bus_stall_l) - (bus_ack_l | bus_err_l | bus_rty_l);')
+                    impl.append(f'\t\tif (~bus_cyc_l)')
+                    impl.append(f'\t\t\tpending_r <= \'0;')
+                    impl.append(f'\tend')
+                    impl.append(f'end')
+                    resp_sel = 'resp_sel_l'
+                else:
+                    resp_sel = 'addrcomp_en_l'
+
                 impl.append(f'')
                 impl.append(f'')
                 impl.append(f'always_comb begin')
                 impl.append(f'')
                 for i,slave in enumerate(self.bus.slaves):
-                    impl.append(f'\t{adapted_names[slave.name]}.stb <= bus_stb_l & addrcomp_en_l[{i}];')
+                    if bus_pipelined:
+                        impl.append(f'\t{adapted_names[slave.name]}.stb <= bus_stb_l & addrcomp_en_l[{i}] & ~switch_stall_l;')
+                    else:
+                        impl.append(f'\t{adapted_names[slave.name]}.stb <= bus_stb_l & addrcomp_en_l[{i}];')
                 impl.append(f'\t')
                 for i,slave in enumerate(self.bus.slaves):
                     if i==0:
-                        impl.append(f'\tif (addrcomp_en_l[{i}]) begin')
+                        impl.append(f'\tif ({resp_sel}[{i}]) begin')
                     elif i==len(self.bus.slaves)-1:
                         impl.append(f'\tend else begin')
                     else:
-                        impl.append(f'\tend else if (addrcomp_en_l[{i}]) begin')
+                        impl.append(f'\tend else if ({resp_sel}[{i}]) begin')
                     impl.append(f'\t\tbus_dat_sm_l <= {adapted_names[slave.name]}.dat_sm;')
                     impl.append(f'\t\tbus_ack_l <= {adapted_names[slave.name]}.ack;')
                     impl.append(f'\t\tbus_err_l <= {adapted_names[slave.name]}.err;')
                     impl.append(f'\t\tbus_rty_l <= {adapted_names[slave.name]}.rty;')
+                    if bus_pipelined:
+                        impl.append(f'\t\tbus_stall_l <= {adapted_names[slave.name]}.stall | switch_stall_l;')
                 impl.append(f'\tend')
                 impl.append(f'\t')
                 impl.append(f'end')
@@ -333,6 +421,9 @@ class BusSvGeneratorHelper:
                     impl.append(f'assign {adapted_names[slave.name]}.sel = bus_sel_l;')
                     impl.append(f'assign {adapted_names[slave.name]}.we  = bus_we_l;')
                     impl.append(f'assign {adapted_names[slave.name]}.cyc = bus_cyc_l;')
+                    if bus_burst:
+                        impl.append(f'assign {adapted_names[slave.name]}.cti = bus_cti_l;')
+                        impl.append(f'assign {adapted_names[slave.name]}.bte = bus_bte_l;')
         
         elif self.bus.topology == WbBusTopology.Crossbar:
 
@@ -378,8 +469,42 @@ class BusSvGeneratorHelper:
 
             for i,master in enumerate(self.bus.masters):
                 impl.append(f'assign master_cyc_w[{i}] = {adapted_names[master.name]}.cyc;')
-            for i,master in enumerate(self.bus.masters):
-                impl.append(f'assign master_adr_w[{i}] = {adapted_names[master.name]}.adr[address_slice_high:address_slice_low];')
+            if bus_pipelined:
+                impl.append(f'')
+                impl.append(f'// pipelined mode: a master keeps its slave until all responses arrived, and')
+                impl.append(f'// it stalls when a request addresses another slave in the meantime')
+                for master in self.bus.masters:
+                    impl.append(f'logic[7:0] {adapted_names[master.name]}_pending_r;')
+                    impl.append(f'logic[address_size-1:0] {adapted_names[master.name]}_held_adr_r;')
+                    impl.append(f'logic {adapted_names[master.name]}_switch_w;')
+                impl.append(f'')
+                for master in self.bus.masters:
+                    m = adapted_names[master.name]
+                    impl.append(f'assign {m}_switch_w = ({m}_pending_r != 0) && ({m}.adr[address_slice_high:address_slice_low] != {m}_held_adr_r);')
+                impl.append(f'')
+                impl.append(f'always_ff @(posedge rst_i or posedge clk_i) begin')
+                impl.append(f'\tif (rst_i) begin')
+                for master in self.bus.masters:
+                    m = adapted_names[master.name]
+                    impl.append(f'\t\t{m}_pending_r <= \'0;')
+                    impl.append(f'\t\t{m}_held_adr_r <= \'0;')
+                impl.append(f'\tend else begin')
+                for master in self.bus.masters:
+                    m = adapted_names[master.name]
+                    impl.append(f'\t\tif ({m}.stb & ~{m}.stall)')
+                    impl.append(f'\t\t\t{m}_held_adr_r <= {m}.adr[address_slice_high:address_slice_low];')
+                    impl.append(f'\t\t{m}_pending_r <= {m}_pending_r + ({m}.stb & ~{m}.stall) - ({m}.ack | {m}.err | {m}.rty);')
+                    impl.append(f'\t\tif (~{m}.cyc)')
+                    impl.append(f'\t\t\t{m}_pending_r <= \'0;')
+                impl.append(f'\tend')
+                impl.append(f'end')
+                impl.append(f'')
+                for i,master in enumerate(self.bus.masters):
+                    m = adapted_names[master.name]
+                    impl.append(f'assign master_adr_w[{i}] = ({m}_pending_r != 0) ? {m}_held_adr_r : {m}.adr[address_slice_high:address_slice_low];')
+            else:
+                for i,master in enumerate(self.bus.masters):
+                    impl.append(f'assign master_adr_w[{i}] = {adapted_names[master.name]}.adr[address_slice_high:address_slice_low];')
             for i,slave in enumerate(self.bus.slaves):
                 impl.append(f'assign slave_addresses_w[{i}] = address_{signal_name(slave.name)};')
             impl.append(f'')
@@ -421,6 +546,15 @@ class BusSvGeneratorHelper:
                 senslist.append(f'{adapted_names[slave.name]}.err, {adapted_names[slave.name]}.rty')
             for master in self.bus.masters:
                 senslist.append(f'{adapted_names[master.name]}_grant_w, {adapted_names[master.name]}_ssel_w')
+            if bus_burst:
+                for master in self.bus.masters:
+                    if master.burst:
+                        senslist.append(f'{adapted_names[master.name]}.cti, {adapted_names[master.name]}.bte')
+            if bus_pipelined:
+                for slave in self.bus.slaves:
+                    senslist.append(f'{adapted_names[slave.name]}.stall')
+                for master in self.bus.masters:
+                    senslist.append(f'{adapted_names[master.name]}_switch_w')
             sensitivity = ',\n\t'.join(senslist)
             impl.append(f'always @({sensitivity}) begin')
             
@@ -431,6 +565,8 @@ class BusSvGeneratorHelper:
                 impl.append(f'\t{adapted_names[master.name]}.ack <= 0;')
                 impl.append(f'\t{adapted_names[master.name]}.err <= 0;')
                 impl.append(f'\t{adapted_names[master.name]}.rty <= 0;')
+                if bus_pipelined:
+                    impl.append(f'\t{adapted_names[master.name]}.stall <= 1;')
             for slave in self.bus.slaves:
                 impl.append(f'\t{adapted_names[slave.name]}.adr <= \'0;')
                 impl.append(f'\t{adapted_names[slave.name]}.dat_ms <= \'x;')
@@ -438,6 +574,9 @@ class BusSvGeneratorHelper:
                 impl.append(f'\t{adapted_names[slave.name]}.stb <= 0;')
                 impl.append(f'\t{adapted_names[slave.name]}.cyc <= 0;')
                 impl.append(f'\t{adapted_names[slave.name]}.we <= 1\'bx;')
+                if bus_burst:
+                    impl.append(f'\t{adapted_names[slave.name]}.cti <= \'0;')
+                    impl.append(f'\t{adapted_names[slave.name]}.bte <= \'0;')
 
             impl.append(f'')
             impl.append(f'\t// multiplexer')
@@ -448,13 +587,21 @@ class BusSvGeneratorHelper:
                     impl.append(f'\t\t\t{adapted_names[slave.name]}.adr[local_address_slice_high:local_address_slice_low] <= {adapted_names[master.name]}.adr[local_address_slice_high:local_address_slice_low];')
                     impl.append(f'\t\t\t{adapted_names[slave.name]}.dat_ms <= {adapted_names[master.name]}.dat_ms;')
                     impl.append(f'\t\t\t{adapted_names[slave.name]}.sel <= {adapted_names[master.name]}.sel;')
-                    impl.append(f'\t\t\t{adapted_names[slave.name]}.stb <= {adapted_names[master.name]}.stb;')
+                    if bus_pipelined:
+                        impl.append(f'\t\t\t{adapted_names[slave.name]}.stb <= {adapted_names[master.name]}.stb & ~{adapted_names[master.name]}_switch_w;')
+                    else:
+                        impl.append(f'\t\t\t{adapted_names[slave.name]}.stb <= {adapted_names[master.name]}.stb;')
                     impl.append(f'\t\t\t{adapted_names[slave.name]}.cyc <= {adapted_names[master.name]}.cyc;')
                     impl.append(f'\t\t\t{adapted_names[slave.name]}.we <= {adapted_names[master.name]}.we;')
+                    if bus_burst:
+                        impl.append(f'\t\t\t{adapted_names[slave.name]}.cti <= {master_cti(master, adapted_names[master.name])};')
+                        impl.append(f'\t\t\t{adapted_names[slave.name]}.bte <= {master_bte(master, adapted_names[master.name])};')
                     impl.append(f'\t\t\t{adapted_names[master.name]}.dat_sm <= {adapted_names[slave.name]}.dat_sm;')
                     impl.append(f'\t\t\t{adapted_names[master.name]}.ack <= {adapted_names[slave.name]}.ack;')
                     impl.append(f'\t\t\t{adapted_names[master.name]}.err <= {adapted_names[slave.name]}.err;')
                     impl.append(f'\t\t\t{adapted_names[master.name]}.rty <= {adapted_names[slave.name]}.rty;')
+                    if bus_pipelined:
+                        impl.append(f'\t\t\t{adapted_names[master.name]}.stall <= {adapted_names[slave.name]}.stall | {adapted_names[master.name]}_switch_w;')
                 impl.append(f'\t\tend')
                 impl.append(f'\tend')
 
@@ -468,5 +615,5 @@ class BusSvGeneratorHelper:
         impl.append(f'endmodule')
         impl.append(f'')
 
-        self.implementation = '\n'.join(impl)
-        self.instance = '\n'.join(inst)
+        self.implementation = impl
+        self.instance = inst
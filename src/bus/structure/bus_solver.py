@@ -29,7 +29,12 @@ class WbBusSolver:
         bus_port_size = max([n.port_size for n in all_nodes])
         bus_granularity = min([n.granularity for n in all_nodes])
         bus_address_size = max([n.address_size for n in all_nodes])
-        self.bus.bus_format = WbNode('Bus', bus_port_size, bus_granularity, bus_address_size)
+        bus_pipelined = all_nodes[0].pipelined
+        for node in all_nodes:
+            if node.pipelined != bus_pipelined:
+                raise RuntimeError(f'Node {node.name} uses {"pipelined" if node.pipelined else "classic"} mode, but node {all_nodes[0].name} does not; all nodes of a bus must use the same mode')
+        bus_burst = any([n.burst for n in all_nodes])
+        self.bus.bus_format = WbNode('Bus', bus_port_size, bus_granularity, bus_address_size, bus_pipelined, bus_burst)
         
         highest_slave_address_size = max([s.address_size for s in self.bus.slaves])
         lowest_master_address_size = min([m.address_size for m in self.bus.masters])
@@ -1,5 +1,7 @@
 from ...registers import RegisterSet
+from ...tools import SymbolTable
 
+import hashlib
 import math
 import enum
 import typing
@@ -9,14 +11,17 @@ import typing
 class WbNode:
 
 
-    def __init__(self, name: str, port_size: int, granularity: int, address_size: int):
+    def __init__(self, name: str, port_size: int, granularity: int, address_size: int, pipelined: bool = False, burst: bool = False):
         """
         name:          Name of this node
         port_size:     Port size, in bits
         granularity:   Bus granularity, in bits
         address_size:  The number of actual address bits (i.e. hi(sel)-lo(sel))
+        pipelined:     Node uses Wishbone B4 pipelined mode instead of classic mode
+        burst:         Node supports registered-feedback bursts (CTI/BTE signals)
         """
         self.name, self.port_size, self.granularity, self.address_size = name, port_size, granularity, address_size
+        self.pipelined, self.burst = pipelined, burst
     
 
     def get_adr_bits(self):
@@ -45,14 +50,16 @@ class WbNode:
 class WbMaster(WbNode):
 
 
-    def __init__(self, name: str, port_size: int, granularity: int, address_size: int):
+    def __init__(self, name: str, port_size: int, granularity: int, address_size: int, pipelined: bool = False, burst: bool = False):
         """
         name:          Name of this master
         port_size:     Port size, in bits
         granularity:   Bus granularity, in bits
         address_size:  The number of actual address bits (i.e. hi(sel)-lo(sel))
+        pipelined:     Master uses Wishbone B4 pipelined mode instead of classic mode
+        burst:         Master drives the CTI/BTE signals to issue bursts
         """
-        super().__init__(name, port_size, granularity, address_size)
+        super().__init__(name, port_size, granularity, address_size, pipelined, burst)
 
         self._address_shift = None
     
@@ -68,18 +75,20 @@ class WbMaster(WbNode):
 class WbSlave(WbNode):
 
 
-    def __init__(self, name: str, port_size: int, granularity: int, address_size: int, base_address: "int|Ellipsis"):
+    def __init__(self, name: str, port_size: int, granularity: int, address_size: int, base_address: "int|Ellipsis", pipelined: bool = False, burst: bool = False):
         """
         name:          Name of this slave
         port_size:     Port size, in bits
         granularity:   Bus granularity, in bits
         address_size:  The number of actual address bits (i.e. hi(sel)-lo(sel))
         base_address:  Absolute base address; set to ... for automatic addressing
+        pipelined:     Slave uses Wishbone B4 pipelined mode instead of classic mode
+        burst:         Slave evaluates the CTI/BTE signals to speed up bursts
         """
         self._requested_base_address = base_address
         self._base_address: typing.Optional[int] = None
         self._register_set: typing.Optional[RegisterSet] = None
-        super().__init__(name, port_size, granularity, address_size)
+        super().__init__(name, port_size, granularity, address_size, pipelined, burst)
 
     
     @staticmethod    
@@ -87,7 +96,7 @@ class WbSlave(WbNode):
         ''' Create a WbSlave from a RegisterSet '''
         adr_lo,adr_hi = register_set.address_bit_range()
         address_size = adr_hi-adr_lo+1
-        slave = WbSlave(register_set.name, register_set.port_size, register_set.granularity(), address_size, register_set._requested_base_address)
+        slave = WbSlave(register_set.name, register_set.port_size, register_set.granularity(), address_size, register_set._requested_base_address, register_set.pipelined, register_set.burst)
         slave._register_set = register_set
         return slave
     
@@ -122,6 +131,8 @@ class WbBus:
         """
         self.name, self.masters, self.slaves, self.topology = name, masters, slaves, topology
         self.bus_format: typing.Optional[WbNode] = None
+        """ source code names of the bus and its nodes; shared by all generators """
+        self.symbols: typing.Optional[SymbolTable] = None
         self.check()
         
         from .bus_solver import WbBusSolver
@@ -138,6 +149,14 @@ class WbBus:
         if len(self.masters) != len(set([m.name for m in self.masters])):
             raise RuntimeError(f'Master names must be unique')
         
+        # each node becomes an interface port of the bus module
+        symbols = SymbolTable(self.name)
+        for master in self.masters:
+            symbols.declare('masters', master.name)
+        for slave in self.slaves:
+            symbols.declare('slaves', slave.name)
+        self.symbols = symbols
+        
         for node in self.masters + self.slaves:
             if node.port_size not in [8, 16, 32, 64]:
                 raise ValueError(f'Node {node.name} has invalid bus port size (must be 8 16, 32 or 64)')
@@ -147,6 +166,17 @@ class WbBus:
                 raise ValueError(f'Node {node.name} has invalid bus granularity (must be >= port_size)')
 
 
+    def get_digest(self) -> str:
+        """ Digest of everything the generated code of this bus depends on """
+        def node_content(node: WbNode):
+            return (type(node).__name__, node.name, node.port_size, node.granularity, node.address_size, node.pipelined, node.burst)
+        content = (self.name, self.topology,
+            [node_content(m) + (m._address_shift,) for m in self.masters],
+            [node_content(s) + (s._base_address,) for s in self.slaves],
+            node_content(self.bus_format))
+        return hashlib.sha256(repr(content).encode('utf-8')).hexdigest()
+
+
     def get_adapter(self, node: "WbNode") -> "tuple[WbNode|WbNode]|None":
         """Returns either a tuple that describes the interfaces on each end of the adapter, or None, if no adapter is needed.
         The first element of the tuple is the interface of the node itself, the 2nd is that of the Bus"""
@@ -0,0 +1,51 @@
+from .generate import Backend
+from .build import BuildGraph, write_depfile
+from .spec_loader import load_spec
+
+import argparse
+import sys
+
+
+
+def main(argv: "list[str]|None" = None) -> int:
+    """ Entry point of the <fpga-io-gen> command """
+
+    backend_names = {backend.name.lower(): backend for backend in Backend}
+
+    parser = argparse.ArgumentParser(prog='fpga-io-gen', description='FPGA I/O Generator')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='generate all stale artifacts of a spec')
+    build_parser.add_argument('spec', help='Python script that defines <register_sets> (and optionally <buses>, <backends>, <formats>), or a JSON/YAML spec')
+    build_parser.add_argument('-o', '--out-dir', default='.', help='output directory (default: current directory)')
+    build_parser.add_argument('-b', '--backend', action='append', choices=list(backend_names.keys()), help='backend to use; may be repeated (default: all)')
+    build_parser.add_argument('-t', '--target', action='append', help='node, register set or bus to build, including its dependencies; may be repeated (default: all)')
+    build_parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of cores)')
+    build_parser.add_argument('-d', '--depfile', help='write a Make/Ninja depfile')
+    build_parser.add_argument('--no-cache', action='store_true', help='do not use or update the cache of a JSON/YAML spec')
+    build_parser.add_argument('--list', action='store_true', help='list the build graph instead of building')
+    build_parser.add_argument('-q', '--quiet', action='store_true', help='do not list the regenerated files')
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(args.spec, use_cache=not args.no_cache)
+        backends = [backend_names[name] for name in args.backend] if args.backend is not None else None
+        graph = BuildGraph(spec, args.out_dir, backends)
+
+        if args.list:
+            for node in graph.select(args.target):
+                dependencies = ', '.join(node.dependencies)
+                print(f'{node.name}' + (f' <- {dependencies}' if dependencies else ''))
+            return 0
+
+        outputs, regenerated = graph.build(args.target, args.jobs)
+        if args.depfile is not None:
+            write_depfile(args.depfile, outputs, spec.sources)
+    except Exception as ex:
+        print(f'fpga-io-gen: error: {ex}', file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        for filename in regenerated:
+            print(f'generated {filename}')
+        print(f'{len(regenerated)} of {len(outputs)} files regenerated')
+    return 0
@@ -0,0 +1,154 @@
+from .tools import make_sourcecode_name, NamingConvention
+from .registers.structure import RegisterSet, CompiledRegisterSet, as_compiled
+from .bus.structure import WbBus
+
+import concurrent.futures
+import dataclasses
+import enum
+import os
+
+
+
+class Backend(enum.Enum):
+    """ SystemVerilog implementation and instance template (register sets and buses) """
+    SystemVerilog = enum.auto()
+    """ C header and code (register sets only) """
+    C = enum.auto()
+    """ Python code (register sets only) """
+    Python = enum.auto()
+    """ Markdown documentation (register sets and buses) """
+    Markdown = enum.auto()
+    """ Rendered graph, as PNG (buses only) """
+    Graph = enum.auto()
+
+
+
+REGISTER_SET_BACKENDS = [Backend.SystemVerilog, Backend.C, Backend.Python, Backend.Markdown]
+BUS_BACKENDS = [Backend.SystemVerilog, Backend.Markdown, Backend.Graph]
+
+
+
+@dataclasses.dataclass
+class GeneratorJob:
+    """ Generation of the files of one register set or bus with one backend """
+
+    model: "CompiledRegisterSet|WbBus"
+    backend: Backend
+    """ path of the output files, without extension """
+    basename: str
+    formats: "dict[Backend,object]"
+    """ a graph is generated for the same bus, so the Markdown documentation can refer to it """
+    with_graph: bool
+
+
+    def get_filenames(self) -> "list[str]":
+        if self.backend == Backend.SystemVerilog:
+            return [f'{self.basename}.sv', f'{self.basename}_instance_template.sv']
+        elif self.backend == Backend.C:
+            return [f'{self.basename}.h', f'{self.basename}.c']
+        elif self.backend == Backend.Python:
+            return [f'{self.basename}.py']
+        elif self.backend == Backend.Markdown:
+            return [f'{self.basename}.md']
+        elif self.backend == Backend.Graph:
+            return [f'{self.basename}.png']
+        else:
+            raise ValueError(f'Invalid backend: {self.backend}')
+
+
+    def run(self) -> "list[str]":
+        """ Generates the files, and returns the ones that had to be regenerated; this is executed in a worker process """
+
+        from .registers.codegen import RegisterSvGenerator, RegisterPyGenerator, RegisterCGenerator, RegisterMdGenerator
+        from .bus.codegen import BusSvGenerator, BusMdGenerator, BusGraphGenerator
+
+        filenames = self.get_filenames()
+        fmt = self.formats.get(self.backend)
+
+        if isinstance(self.model, CompiledRegisterSet):
+            if self.backend == Backend.SystemVerilog:
+                return RegisterSvGenerator(self.model, fmt).save(filename_code=filenames[0], filename_instance_template=filenames[1])
+            elif self.backend == Backend.C:
+                return RegisterCGenerator(self.model, os.path.basename(self.basename), fmt).save(filename_header=filenames[0], filename_code=filenames[1])
+            elif self.backend == Backend.Python:
+                return RegisterPyGenerator(self.model, fmt).save(filenames[0])
+            elif self.backend == Backend.Markdown:
+                return RegisterMdGenerator(self.model, self.formats.get(Backend.SystemVerilog)).save(filenames[0])
+        else:
+            if self.backend == Backend.SystemVerilog:
+                return BusSvGenerator(self.model).save(filename_code=filenames[0], filename_instance_template=filenames[1])
+            elif self.backend == Backend.Markdown:
+                graph_filename = os.path.basename(self.basename) + '.png' if self.with_graph else None
+                return BusMdGenerator(self.model, graph_filename=graph_filename).save(filenames[0])
+            elif self.backend == Backend.Graph:
+                return BusGraphGenerator(self.model).save(filenames[0])
+        raise ValueError(f'Backend {self.backend} does not support {self.model.name}')
+
+
+
+def generate_all(register_sets: "list[RegisterSet|CompiledRegisterSet]", buses: "list[WbBus]", backends: "list[Backend]",
+    out_dir: "str|dict[Backend,str]", workers: "int|None" = None, formats: "dict[Backend,object]|None" = None) -> "list[str]":
+    """
+    Generates the code of all register sets and buses with all backends, and returns the names of the written files
+
+    register_sets: register sets to generate code for
+    buses:         buses to generate code for
+    backends:      backends to use; each backend is only applied to the register sets and buses that it supports
+    out_dir:       output directory, or a dict that maps each backend to its output directory
+    workers:       number of worker processes; None uses all cores, 1 generates everything in this process
+    formats:       optional format objects per backend, e.g. {Backend.Python: RegisterPyGenerator.Format(...)}
+                   the Markdown documentation of register sets describes the timing of the SystemVerilog format
+
+    Every (register set, backend) and (bus, backend) pair is an independent job. The files are named after the
+    register set or bus, and the returned list is in a deterministic order, no matter how many workers are used.
+    """
+    jobs = plan_jobs(register_sets, buses, backends, out_dir, formats)
+    run_jobs(jobs, workers)
+    return [filename for job in jobs for filename in job.get_filenames()]
+
+
+
+def plan_jobs(register_sets: "list[RegisterSet|CompiledRegisterSet]", buses: "list[WbBus]", backends: "list[Backend]",
+    out_dir: "str|dict[Backend,str]", formats: "dict[Backend,object]|None" = None) -> "list[GeneratorJob]":
+    """ Returns the jobs for generate_all(), after checking that no two jobs write the same file """
+
+    formats = formats if formats is not None else {}
+
+    models = []
+    for regset in register_sets:
+        compiled = as_compiled(regset) # validates here, and keeps pickling cheap
+        models.extend([(compiled, backend) for backend in backends if backend in REGISTER_SET_BACKENDS])
+    for bus in buses:
+        models.extend([(bus, backend) for backend in backends if backend in BUS_BACKENDS])
+
+    files_in_use = {}
+    jobs = []
+    for model,backend in models:
+        directory = out_dir[backend] if isinstance(out_dir, dict) else out_dir
+        basename = os.path.join(directory, make_sourcecode_name(model.name, NamingConvention.snake_case))
+        job = GeneratorJob(model, backend, basename, formats, Backend.Graph in backends)
+        for filename in job.get_filenames():
+            if filename in files_in_use:
+                raise ValueError(f'{model.name} and {files_in_use[filename]} would both be generated into <{filename}>')
+            files_in_use[filename] = model.name
+        jobs.append(job)
+    return jobs
+
+
+
+def run_jobs(jobs: "list[GeneratorJob]", workers: "int|None" = None) -> "list[list[str]]":
+    """ Runs the jobs on a process pool; returns the regenerated files of each job, in the same order as the jobs """
+
+    for directory in set([os.path.dirname(filename) for job in jobs for filename in job.get_filenames()]):
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f'Invalid number of workers: {workers}')
+
+    if workers == 1 or len(jobs) <= 1:
+        return [job.run() for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        return list(executor.map(GeneratorJob.run, jobs))
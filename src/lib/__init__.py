@@ -1,2 +1,2 @@
-from .code_gen import CodeFormatter
-from .sv_code_gen import SvCodeFormatter, SvModule, SvCommaList, SvInstance, SvIfBlock, SvAlwaysFf
+from .code_gen import CodeFormatter, CodeFragment, FragmentCache, default_fragment_cache, fragment_key
+from .sv_code_gen import SvCodeFormatter, SvModule, SvCommaList, SvInstance, SvIfBlock, SvCaseBlock, SvAlwaysFf
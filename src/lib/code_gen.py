@@ -1,35 +1,128 @@
+import hashlib
+import io
 import warnings
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Callable
+from typing import Callable, Iterable, Iterator, TextIO
 
 
-@dataclass
+@dataclass(slots=True)
 class LineProperties:
     line_idx: int = field(default=0)
     first_line: bool = field(default=False)
     last_line: bool = field(default=False)
     first_in_indentation: bool = field(default=False)
     last_in_indentation: bool = field(default=False)
-    tags: list[any] = field(default_factory=list)
-    tags_prev: list[any] = field(default_factory=list)
-    tags_next: list[any] = field(default_factory=list)
+    """ tag stacks of hashable tags are interned while rendering, i.e. equal stacks are the same tuple object, so comparing them with == is cheap """
+    tags: tuple = field(default=())
+    tags_prev: tuple = field(default=())
+    tags_next: tuple = field(default=())
 
 
-@dataclass
+@dataclass(slots=True)
 class LineElement:
-    content: "CodeFormatter|Callable[CodeFormatter.LineProperties,str]|str|list[str]" = field(default=None)
+    """ Plain content lines without a tag are stored as <str>; everything else is stored as a LineElement """
+    content: "Callable[LineProperties,str]|str" = field(default=None)
     indent: int = field(default=0)
     blank: int = field(default=0)
-    props: LineProperties = field(default_factory=LineProperties)
     tag: any = field(default=None)
 
 
+# indent/detent elements carry no state, so all formatters share the same objects
+_INDENT = LineElement(indent=+1)
+_DETENT = LineElement(indent=-1)
+_BLANKS: "dict[int,LineElement]" = {}
+
+
+def _blank_element(n: int) -> LineElement:
+    element = _BLANKS.get(n)
+    if element is None:
+        element = _BLANKS[n] = LineElement(blank=n)
+    return element
+
+
+class _TagStacks:
+    """ Interns tag stacks (tuples), so that equal stacks are represented by the same object; stacks with unhashable tags are not interned """
+
+    __slots__ = ('_children',)
+
+    def __init__(self):
+        self._children: "dict[tuple[int,any],tuple]" = {}
+
+    def push(self, stack: tuple, tag: any) -> tuple:
+        key = (id(stack), tag)
+        try:
+            result = self._children.get(key)
+        except TypeError:
+            # unhashable tags (e.g. lists) cannot be interned; such stacks are only equal, not identical
+            return stack + (tag,)
+        if result is None:
+            result = self._children[key] = stack + (tag,)
+        return result
+
+
+class CodeFragment:
+    """ A pre-rendered block of lines (callables already resolved); indentation is relative to where it is inserted """
+
+    __slots__ = ('lines', 'n_content_lines')
+
+    def __init__(self, lines: "tuple[str|LineElement]"):
+        self.lines = lines
+        self.n_content_lines = sum(1 for line in lines if type(line) is str)
+
+
+
+class FragmentCache:
+    """ Least-recently-used cache for CodeFragment objects, see CodeFormatter.fragment() """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits, self.misses = 0, 0
+        self._fragments: "OrderedDict[str,CodeFragment]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def get(self, key: str) -> "CodeFragment|None":
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._fragments.move_to_end(key)
+        return fragment
+
+    def put(self, key: str, fragment: CodeFragment):
+        self._fragments[key] = fragment
+        self._fragments.move_to_end(key)
+        while len(self._fragments) > self.max_entries:
+            self._fragments.popitem(last=False)
+
+    def clear(self):
+        self._fragments.clear()
+
+
+default_fragment_cache = FragmentCache()
+
+
+def fragment_key(*inputs: any) -> str:
+    """ Digest of everything the lines of a fragment depend on; the inputs must have a deterministic repr() """
+    return hashlib.sha256(repr(inputs).encode('utf-8')).hexdigest()
+
+
+
 class CodeFormatter:
 
     def __init__(self):
-        self._lines: list[LineElement]
+        self._lines: "list[str|LineElement|CodeFormatter]"
         self._lines = []
         self._context_needed = False
+        self._parents: list[CodeFormatter] = []
+        # finished state: lines from index <_n_body_lines> on were added by _finish()
+        self._finished = False
+        self._finishing = False
+        self._n_body_lines = 0
+        self._n_content_lines: "int|None" = None
 
     def __enter__(self):
         return self
@@ -55,9 +148,39 @@ class CodeFormatter:
 
     def _finish(self):
         """ Called before code is generated; may be overridden in derived class,
-            e.g. to add additional lines at the end, or to post-process lines """
+            e.g. to add additional lines at the end, or to post-process lines.
+            If lines are added after finishing, the lines added here are discarded, and this is called again later """
         pass
 
+    def _ensure_finished(self):
+        if not self._finished:
+            self._n_body_lines = len(self._lines)
+            self._finishing = True
+            try:
+                self._finish()
+            finally:
+                self._finishing = False
+            self._finished = True
+
+    def _depend_on(self, other: "CodeFormatter"):
+        """ Declares that _finish() uses <other> (e.g. its number of lines), so that changes to <other> cause this formatter
+            to be finished again; not needed for formatters that are added to this one anyway """
+        if self not in other._parents:
+            other._parents.append(self)
+
+    def _modify(self):
+        """ Must be called before lines are added """
+        if self._finished and not self._finishing:
+            # the lines added by _finish() would end up before the new lines; they are re-created when finishing again
+            del self._lines[self._n_body_lines:]
+            self._finished = False
+        # parents might have used this count while finishing, so they must be finished again as well; if the count
+        #   is already invalid, this has already happened (counting a parent also counts this formatter)
+        if self._n_content_lines is not None:
+            self._n_content_lines = None
+            for parent in self._parents:
+                parent._modify()
+
     def sub(self) -> "CodeFormatter":
         """ Inserts and returns another formatter object """
         self._check_context()
@@ -65,11 +188,57 @@ class CodeFormatter:
         self.add(new)
         return new
 
-    def add(self, content: "CodeFormatter|callable|str|list[str]" = None, indented: bool = False, indent_before: bool = False, detent_before: bool = False, indent_after: bool = False, detent_after: bool = False, tag: any = None):
+    def _new_fragment_formatter(self) -> "CodeFormatter":
+        """ Creates the formatter that is handed to the build-function of fragment(); may be overridden in derived class """
+        return CodeFormatter()
+
+    def _fragment_context(self) -> any:
+        """ Everything that the lines of a fragment might depend on besides its inputs; may be overridden in derived class """
+        return type(self)
+
+    def fragment(self, inputs: any, build: "Callable[[CodeFormatter],None]", cache: FragmentCache = None) -> CodeFragment:
+        """
+        Inserts a pre-rendered block of lines, and returns it
+
+        inputs: everything the lines depend on (e.g. a tuple of parameters), with a deterministic repr()
+        build:  only called if the cache has no fragment for a digest of <inputs> (see fragment_key()); gets an empty
+                formatter, to which it must add the lines
+        cache:  the cache to use; uses default_fragment_cache if omitted
+        
+        The fragment is rendered on its own (callables only see the lines of the fragment), and is inserted at the current
+        indentation. Inserting a cached fragment does not call <build> or any callables again.
+        """
+        self._check_context()
+        cache = cache if cache is not None else default_fragment_cache
+        cache_key = fragment_key(self._fragment_context(), inputs)
+        fragment = cache.get(cache_key)
+        if fragment is None:
+            formatter = self._new_fragment_formatter()
+            build(formatter)
+            fragment = formatter._render_fragment()
+            cache.put(cache_key, fragment)
+        self.add(fragment)
+        return fragment
+
+    def _render_fragment(self) -> CodeFragment:
+        lines = []
+        level = 0
+        for line_level, content, _ in self._layout(self._iter_lines(), 0):
+            while level < line_level:
+                lines.append(_INDENT)
+                level += 1
+            while level > line_level:
+                lines.append(_DETENT)
+                level -= 1
+            lines.append(content if content else _blank_element(1))
+        lines.extend([_DETENT] * level)
+        return CodeFragment(tuple(lines))
+
+    def add(self, content: "CodeFormatter|CodeFragment|callable|str|list[str]" = None, indented: bool = False, indent_before: bool = False, detent_before: bool = False, indent_after: bool = False, detent_after: bool = False, tag: any = None):
         """
         Add one or more lines
 
-        content:   a line, or an array of lines, or another CodeFormatter object, or a callable *
+        content:   a line, or an array of lines, or another CodeFormatter object, or a CodeFragment, or a callable *
         indented:  indent these lines
         end_sep:   add this string at the end of each lines, except if if the next line is detented (i.e. end-of-block); useful e.g. for comma-separated lists
         block_tag: any object you want to add to the content, in order to later identify it (see LineProperties.block_tags)
@@ -77,17 +246,20 @@ class CodeFormatter:
         * if it is a callable, it will be called with a <LineProperties> object as argument; must return a string
         """
         self._check_context()
+        self._modify()
         def add_str(content):
             if content == '':
-                self._lines.append(LineElement(blank=1))
+                self._lines.append(_blank_element(1))
+            elif tag is None:
+                self._lines.append(content)
             else:
                 self._lines.append(LineElement(content, tag=tag))
         if indented:
             indent_before , detent_after = True, True
         if indent_before:
-            self._lines.append(LineElement(indent=+1))
+            self._lines.append(_INDENT)
         if detent_before:
-            self._lines.append(LineElement(indent=-1))
+            self._lines.append(_DETENT)
         if content is None:
             pass
         elif isinstance(content, str):
@@ -98,13 +270,16 @@ class CodeFormatter:
             for i, line in enumerate(content):
                 add_str(line)
         elif isinstance(content, CodeFormatter):
+            self._depend_on(content)
+            self._lines.append(content)
+        elif isinstance(content, CodeFragment):
             self._lines.append(content)
         else:
             raise ValueError(f'Unknown line type: <{type(content)}> ({content})')
         if indent_after:
-            self._lines.append(LineElement(indent=+1))
+            self._lines.append(_INDENT)
         if detent_after:
-            self._lines.append(LineElement(indent=-1))
+            self._lines.append(_DETENT)
 
     def block(self, header_content: "CodeFormatter|str|list[str]" = None, footer_content: "CodeFormatter|str|list[str]" = None, **kwargs) -> "CodeFormatter.ContextManager":
         """ Same as add(), but can be used in a <with>-statement; all lines added within the <with> will be indented """
@@ -143,131 +318,161 @@ class CodeFormatter:
     def blank(self, n = 1):
         """ Insert a number of blank lines (multiple blanks are combined into the longest of them) """
         self._check_context()
-        self._lines.append(LineElement(blank=n))
-
-    def _finish_and_unroll_lines(self):
-        self._finish()
-        all_lines = []
-        def recurse(line):
-            nonlocal all_lines
-            if isinstance(line, CodeFormatter):
-                line._finish()
-                for line in line._lines:
-                    recurse(line)
+        self._modify()
+        self._lines.append(_blank_element(n))
+
+    def _iter_lines(self) -> "Iterator[str|LineElement]":
+        """ Lazily yields the lines of this formatter and of all nested formatters and fragments, finishing the formatters
+            on the way; uses an explicit stack instead of recursion, so the nesting depth is not limited """
+        self._ensure_finished()
+        stack = [iter(self._lines)]
+        while stack:
+            for line in stack[-1]:
+                if type(line) is str:
+                    yield line
+                elif isinstance(line, CodeFormatter):
+                    line._ensure_finished()
+                    stack.append(iter(line._lines))
+                    break
+                elif isinstance(line, CodeFragment):
+                    yield from line.lines
+                else:
+                    yield line
             else:
-                all_lines.append(line)
-        for line in self._lines:
-            recurse(line)
-        return all_lines
+                stack.pop()
 
-    def _update_line_props(self, lines: "list[LineElement]"):
-
-        block_tags = []
-        for line in lines:
-            if line.indent > 0:
-                block_tags.append(line.tag)
-            elif line.indent < 0:
-                if len(block_tags) < 1:
-                    raise RuntimeError('Too many detents')
-                del block_tags[-1]
-            elif line.content is not None:
-                line.props.tags = block_tags + [line.tag]
-
-        first_found = False
-        block_opened = False
-        block_tags_prev = []
-        for i, line in enumerate(lines):
-            if (not first_found) and (line.content):
-                line.props.first_line = True
-                first_found = True
-            if block_opened and line.content:
-                line.props.first_in_indentation = True
-                block_opened = False
-            if line.indent > 0:
-                block_opened = True
-            if line.content:
-                line.props.tags_prev = block_tags_prev
-                block_tags_prev = line.props.tags
-
-        last_found = False
-        block_closed = False
-        block_tags_next = []
-        for i, line in reversed(list(enumerate(lines))):
-            if (not last_found) and (line.content):
-                line.props.last_line = True
-                last_found = True
-            if block_closed and line.content:
-                line.props.last_in_indentation = True
-                block_closed = False
-            if line.indent < 0:
-                block_closed = True
-            if line.content:
-                line.props.tags_next = block_tags_next
-                block_tags_next = line.props.tags
+    def _layout(self, lines: "Iterable[str|LineElement]", initial_indent: int) -> "Iterator[tuple[int,str|None,bool]]":
+        """ Lays out the lines in a single forward pass; yields a tuple (indent level, content, is last line) for each
+            line that is to be written, with content None for blank lines. The properties of a content line depend on the
+            next content line, so exactly one content line (plus the blanks that follow it) is held back until its
+            successor is known """
 
+        tag_stacks = _TagStacks()
+        block_tags = ()
+        block_tags_outer = []
+        indent_level = initial_indent
         line_idx = 0
-        for line in lines:
-            line.props.line_idx = line_idx
-            if line.content:
-                line_idx += 1
-            line_idx += line.blank
 
-        return lines
+        held, held_level = None, 0
+        held_blanks = []
+        blanks_already_inserted = 0
+        block_opened = block_closed = False
+        tags_prev = ()
 
-    def _resolve_callables(self, lines: "list[LineElement]"):
-        for line in lines:
-            if callable(line.content):
-                line.content = line.content(line.props)
-        return lines
+        def resolve(content, props):
+            return content(props) if callable(content) else content
+        # callables are counted as content when the line properties are determined, but lines they resolve to '' are dropped
+        emitted = False
 
-    def _assemble_code(self, lines: "list[LineElement]", indent, line_end, indent_blank_lines, initial_indent, break_last_line):
-        text = ''
-        blanks_already_inserted = 0
-        indent_level = initial_indent
-        first_done = False
-        last_done = False
         for line in lines:
 
-            if line.indent != 0:
-                indent_level += line.indent
-                continue
+            if type(line) is str:
+                content, tag = line, None
+            else:
+                content, tag = line.content, line.tag
+
+                if line.indent > 0:
+                    block_tags_outer.append(block_tags)
+                    block_tags = tag_stacks.push(block_tags, line.tag)
+                    indent_level += line.indent
+                    block_opened = True
+                    continue
+                
+                if line.indent < 0:
+                    if len(block_tags_outer) < 1:
+                        raise RuntimeError('Too many detents')
+                    block_tags = block_tags_outer.pop()
+                    indent_level += line.indent
+                    block_closed = True
+                    continue
 
             if indent_level < 0:
                 warnings.warn(f'Negative indent level')
 
-            if line.blank > 0 and not line.props.first_line:
-                if (not first_done) or (last_done):
+            if content is None:
+                line_idx += line.blank
+                if held is None:
                     continue
                 # if multiple blanks touch, only use the longest of them
                 n = max(0, line.blank - blanks_already_inserted)
-                for _ in range(n):
-                    if indent_blank_lines:
-                        text += indent*indent_level
-                    text += line_end
+                held_blanks.extend([indent_level] * n)
                 blanks_already_inserted += n
                 continue
 
-            if line.content:
-                text += indent*indent_level + line.content
-                if (not line.props.last_line) or break_last_line:
-                    text += line_end
+            if content:
+                props = LineProperties(line_idx=line_idx, first_line=(held is None), first_in_indentation=block_opened,
+                    tags=tag_stacks.push(block_tags, tag), tags_prev=tags_prev)
+                if held is not None:
+                    held_props.tags_next = props.tags
+                    held_props.last_in_indentation = block_closed
+                    text = resolve(held, held_props)
+                    if text:
+                        yield held_level, text, False
+                        emitted = True
+                    if emitted:
+                        for blank_level in held_blanks:
+                            yield blank_level, None, False
+                held, held_props, held_level = content, props, indent_level
+                held_blanks = []
                 blanks_already_inserted = 0
-                first_done = True
-                last_done |= line.props.last_line
-                continue
+                block_opened = block_closed = False
+                tags_prev = props.tags
+                line_idx += 1
+
+        if held is not None:
+            held_props.last_line = True
+            held_props.last_in_indentation = block_closed
+            text = resolve(held, held_props)
+            if text:
+                yield held_level, text, True
 
         final_level = indent_level - initial_indent
         if final_level != 0:
             warnings.warn(f'Indentation ends at level {final_level:+d}')
-        return text
+
+    def _render(self, lines: "Iterable[str|LineElement]", write: "Callable[[str],None]", indent, line_end, indent_blank_lines, initial_indent, break_last_line):
+        for level, content, last in self._layout(lines, initial_indent):
+            if content is None:
+                write((indent*level if indent_blank_lines else '') + line_end)
+            else:
+                write(indent*level + content)
+                if (not last) or break_last_line:
+                    write(line_end)
 
     def get_numbert_of_content_lines(self):
         """ Gets the number of lines that contain actual content (i.e. without blanks); note that this also counts content lines that are zero-length strings """
-        return len(self._finish_and_unroll_lines())
-
-    def generate(self, indent = '\t', line_end = '\n', indent_blank_lines = False, initial_indent = 0, break_last_line = True):
+        if self._n_content_lines is None:
+            # post-order traversal over all formatters whose count is unknown, with an explicit stack
+            self._ensure_finished()
+            stack = [[self, iter(self._lines), 0]]
+            while stack:
+                frame = stack[-1]
+                for line in frame[1]:
+                    if type(line) is str:
+                        frame[2] += 1
+                    elif isinstance(line, CodeFormatter):
+                        if line._n_content_lines is None:
+                            line._ensure_finished()
+                            stack.append([line, iter(line._lines), 0])
+                            break
+                        frame[2] += line._n_content_lines
+                    elif isinstance(line, CodeFragment):
+                        frame[2] += line.n_content_lines
+                    elif line.content:
+                        frame[2] += 1
+                else:
+                    formatter, _, n = stack.pop()
+                    formatter._n_content_lines = n
+                    if stack:
+                        stack[-1][2] += n
+        return self._n_content_lines
+
+    def generate(self, indent = '\t', line_end = '\n', indent_blank_lines = False, initial_indent = 0, break_last_line = True) -> str:
         """ Generate formatted code """
-        lines = self._finish_and_unroll_lines()
-        lines = self._update_line_props(lines)
-        lines = self._resolve_callables(lines)
-        return self._assemble_code(lines, indent, line_end, indent_blank_lines, initial_indent, break_last_line)
+        buffer = io.StringIO()
+        self.generate_to(buffer, indent, line_end, indent_blank_lines, initial_indent, break_last_line)
+        return buffer.getvalue()
+
+    def generate_to(self, fp: TextIO, indent = '\t', line_end = '\n', indent_blank_lines = False, initial_indent = 0, break_last_line = True):
+        """ Same as generate(), but writes the formatted code line by line to a file-like object """
+        self._render(self._iter_lines(), fp.write, indent, line_end, indent_blank_lines, initial_indent, break_last_line)
@@ -1,14 +1,14 @@
-from .code_gen import CodeFormatter
+from .code_gen import CodeFormatter, LineProperties
 
 
 class SvCommaList(CodeFormatter):
 
     @staticmethod
     def Functor(code: str, suffix: str):
-        def wrapper(props: "CodeFormatter.LineProperties"):
+        def wrapper(props: "LineProperties"):
             result = code
             if props.tags[-1] == 'comma_list':
-                # add a comma at the end, except for the last item in the list
+                # add a comma at the end, except for the last item in the list (tag stacks are mostly interned, so this is cheap)
                 if props.tags_next == props.tags:
                     result += ','
             if suffix:
@@ -42,6 +42,12 @@ class SvCodeFormatter(CodeFormatter):
         if self._module is not None:
             super().add('endmodule')
 
+    def _new_fragment_formatter(self) -> "SvCodeFormatter":
+        return SvCodeFormatter(parent=self)
+
+    def _fragment_context(self) -> any:
+        return (type(self), self.rst, self.clk, self.rst_active_high, self.clk_rising)
+
     def sub(self, blank_after: bool = True) -> "SvCodeFormatter":
         """ Inserts and returns another formatter object """
         new = SvCodeFormatter(parent=self)
@@ -90,23 +96,18 @@ class SvCodeFormatter(CodeFormatter):
     def always_ff(self, blanks: bool = True):
         return SvAlwaysFf(self, self.rst, self.clk, self.rst_active_high, self.clk_rising, blanks)
 
-    def always_comb(self):
-        raise NotImplementedError()
+    def always_comb(self, blank_at_end: bool = True):
+        return self.block('always_comb', blank_at_end=blank_at_end)
 
     def always_latch_block(self):
         raise NotImplementedError()
 
-    def case(self, header_code: str):
-
-        frame = CodeFormatter()
-
-        super().add(f'case ({header_code})', indent_after=True)
-        super().add(frame)
-        super().add('endcase', detent_before=True)
-        super().blank()
-
-        super()._push(frame)
-        return self
+    def case(self, expression: str, unique: bool = False, blank_after: bool = True) -> "SvCaseBlock":
+        blk = SvCaseBlock(self, expression, unique)
+        super().add(blk)
+        if blank_after:
+            super().blank()
+        return blk
 
 
 class SvAlwaysFf(SvCodeFormatter):
@@ -159,7 +160,8 @@ class SvIfBlock(SvCodeFormatter):
         pass
 
     def _finish(self):
-        super().add('end', detent_before=True)
+        if not self._first:
+            super().add('end', detent_before=True)
 
     def ifthen(self, condition: str, suffix: str = '') -> "SvCodeFormatter":
         if self._first:
@@ -176,6 +178,35 @@ class SvIfBlock(SvCodeFormatter):
         return self
 
 
+class SvCaseBlock(SvCodeFormatter):
+
+    def __init__(self, parent: "SvCodeFormatter", expression: str, unique: bool):
+        super().__init__(parent=parent)
+        self._item_open = False
+        super().add(f'{"unique " if unique else ""}case ({expression})', indent_after=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def _finish(self):
+        if self._item_open:
+            super().add('end', detent_before=True)
+        super().add('endcase', detent_before=True)
+
+    def item(self, label: str, suffix: str = '') -> "SvCodeFormatter":
+        if self._item_open:
+            super().add('end', detent_before=True)
+        super().add(f'{label}: begin{suffix}', indent_after=True)
+        self._item_open = True
+        return self
+
+    def default(self, suffix: str = '') -> "SvCodeFormatter":
+        return self.item('default', suffix)
+
+
 class SvModule(SvCodeFormatter):
 
     def __init__(self, parent: "SvCodeFormatter", name: str, clk_port: bool, rst_port: bool):
@@ -183,6 +214,7 @@ class SvModule(SvCodeFormatter):
         self._name = name
         self.parameters = SvCommaList()
         self.ports = SvCommaList()
+        self._depend_on(self.parameters)
         if parent.clk is not None and clk_port:
             self.ports.add_comma(f'input {parent.clk}')
         if parent.rst is not None and rst_port:
@@ -214,6 +246,7 @@ class SvInstance(SvCodeFormatter):
         self._module_name, self._instance_name = module_name, instance_name
         self.parameters = SvCommaList()
         self.signals = SvCommaList()
+        self._depend_on(self.parameters)
         if parent.clk is not None and clk_port is not None:
             self.map_signal(clk_port, parent.clk)
         if parent.rst is not None and rst_port:
@@ -0,0 +1,114 @@
+import filecmp
+import functools
+import hashlib
+import json
+import os
+import typing
+
+
+
+# Every generated file gets a hidden sidecar manifest next to it, which records a digest of everything the file was
+# generated from, and a hash of the file contents. If both still match, a generator's save() method skips generation.
+
+SIDECAR_PREFIX = '.'
+SIDECAR_SUFFIX = '.fiogen.json'
+TEMP_SUFFIX = '.fiogen.tmp'
+
+
+
+@functools.lru_cache(maxsize=None)
+def _code_digest() -> str:
+    """ Hash of the generator code itself, so that outputs are regenerated after updating this package """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                with open(os.path.join(root, name), 'rb') as fp:
+                    h.update(name.encode('utf-8'))
+                    h.update(fp.read())
+    return h.hexdigest()
+
+
+def input_digest(*inputs: typing.Any) -> str:
+    """ Digest of all inputs of a generator; the inputs must have a deterministic repr() """
+    h = hashlib.sha256(_code_digest().encode('utf-8'))
+    h.update(repr(inputs).encode('utf-8'))
+    return h.hexdigest()
+
+
+def get_sidecar_filename(filename: str) -> str:
+    directory, name = os.path.split(filename)
+    return os.path.join(directory, f'{SIDECAR_PREFIX}{name}{SIDECAR_SUFFIX}')
+
+
+def _file_hash(filename: str) -> "str|None":
+    try:
+        with open(filename, 'rb') as fp:
+            return hashlib.sha256(fp.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def is_up_to_date(filename: str, digest: str) -> bool:
+    """ Checks if <filename> was generated from inputs with the given digest, and was not modified since """
+    try:
+        with open(get_sidecar_filename(filename), 'r') as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError):
+        return False
+    if manifest.get('input') != digest:
+        return False
+    return manifest.get('output') == _file_hash(filename)
+
+
+def replace_if_changed(temp_filename: str, filename: str) -> bool:
+    """ Moves <temp_filename> to <filename>, unless the file already has exactly the same contents (then the temporary
+    file is removed); returns True if the file was replaced """
+    try:
+        unchanged = filecmp.cmp(temp_filename, filename, shallow=False)
+    except OSError:
+        unchanged = False
+    if unchanged:
+        os.remove(temp_filename)
+        return False
+    os.replace(temp_filename, filename)
+    return True
+
+
+def save_outputs(digest: str, outputs: "list[tuple[str,str|None,typing.Callable[[typing.IO],None]]]", binary: bool = False) -> "list[str]":
+    """
+    Saves the outputs of a generator, skipping outputs that are up to date; returns the files that were regenerated
+
+    digest:  input digest of the generator (see input_digest())
+    outputs: list of (role, filename, write_func); role distinguishes the different files of one generator,
+             filename may be None to skip that output, write_func writes the contents to a file-like object
+    binary:  write_func writes bytes instead of text
+
+    The contents are streamed into a temporary file next to the output, which only replaces the output if it differs.
+    """
+    regenerated = []
+    for role, filename, write_func in outputs:
+        if filename is None:
+            continue
+        file_digest = input_digest(digest, role)
+        if is_up_to_date(filename, file_digest):
+            continue
+        directory, name = os.path.split(filename)
+        temp_filename = os.path.join(directory, f'{SIDECAR_PREFIX}{name}{TEMP_SUFFIX}')
+        try:
+            with open(temp_filename, 'wb' if binary else 'w') as fp:
+                write_func(fp)
+            replace_if_changed(temp_filename, filename)
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+        update_sidecar(filename, file_digest)
+        regenerated.append(filename)
+    return regenerated
+
+
+def update_sidecar(filename: str, digest: str):
+    with open(get_sidecar_filename(filename), 'w') as fp:
+        json.dump({'input': digest, 'output': _file_hash(filename)}, fp)
@@ -1,4 +1,4 @@
-from .gen_sv import RegisterSvGenerator
+from .gen_sv import RegisterSvGenerator, AddressDecoder
 from .gen_py import RegisterPyGenerator
 from .gen_c import RegisterCGenerator
 from .gen_md import RegisterMdGenerator
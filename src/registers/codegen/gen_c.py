@@ -1,5 +1,7 @@
 from ..structure.types import RegisterSet, RegType, FieldType, FieldFunction
-from ...tools import check_names, make_sourcecode_name, NamingConvention
+from ..structure.compiled import CompiledRegisterSet, as_compiled
+from ...tools import NamingConvention, write_lines
+from ...output_cache import input_digest, save_outputs
 
 from dataclasses import dataclass, field
 import math
@@ -45,21 +47,12 @@ def reg_type(n_bytes):
         raise Exception(f'Invalid register size: {n_bytes} bytes')
 
 
-def fn_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
-
-def var_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
-
-def const_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.CONSTANT_CASE)
-
-
 @dataclass
 class ShadowVar:
     fn_name: str
     shadow_var: str
-    dirty_var: str
+    """ index in the dirty bitmap; None if the shadow is never flushed """
+    dirty_index: typing.Optional[int]
     is_readable: bool
     shadow_read: bool
     shadow_write: bool
@@ -81,48 +74,67 @@ class RegisterCGenerator:
         
         """Headers (including quotes or brackets) that are included at the top of the code"""
         includes: list[str] = field(default_factory=lambda: ['"adapt_me_please.h"'])
+        
+        """
+        Optional function that writes <count> words to consecutive registers: void f(unsigned int address, const <register type> *words, int count);
+        if set, flush_shadow() writes contiguous dirty registers with one call
+        """
+        block_write_func: typing.Optional[str] = None
 
-    def __init__(self, registers: RegisterSet, filename: str = 'Registers', format: Format = None):
+    def __init__(self, registers: "RegisterSet|CompiledRegisterSet", filename: str = 'Registers', format: Format = None):
         """
-        registers:     the register set to create C-code from
+        registers:     the register set to create C-code from (compiled or not)
         filename:      the intended name of the file (so that the "#include ..." is correct)
         format:        a RegisterCGenerator.Format object to control code generation
         """
         
-        self.registers = registers
+        self.registers = as_compiled(registers)
         self.filename = filename
         self.format = format if format is not None else RegisterCGenerator.Format()
+        self._gen = None
+    
+
+    @property
+    def code_header(self) -> "list[str]":
+        return self._generate().code_header
+    
+
+    @property
+    def code_source(self) -> "list[str]":
+        return self._generate().code_source
+    
 
-        gen = RegisterCGeneratorHelper(registers, filename, format)
-        self.code_header = gen.code_header
-        self.code_source = gen.code_source
+    def _generate(self) -> "RegisterCGeneratorHelper":
+        # code is only generated when it is needed, so that save() can skip it if all files are up to date
+        if self._gen is None:
+            self._gen = RegisterCGeneratorHelper(self.registers, self.filename, self.format)
+        return self._gen
     
 
     def get_code(self) -> str:
         """Returns the generated C-code as a string"""
 
-        return self.code_source
+        return '\n'.join(self.code_source)
     
 
     def get_header(self) -> str:
         """Returns the generated C-header as a string"""
 
-        return self.code_header
+        return '\n'.join(self.code_header)
     
 
     def save(self, filename_header: str = None, filename_code: str = None):
-        if filename_header is not None:
-            with open(filename_header, 'w') as fp:
-                fp.write(self.get_header())
-        if filename_code is not None:
-            with open(filename_code, 'w') as fp:
-                fp.write(self.get_code())
+        """ Saves the code; files that are up to date are skipped, and files are only written if their contents changed; returns the regenerated files """
+        return save_outputs(input_digest(type(self).__name__, self.registers.digest, self.filename, self.format), [
+            ('header', filename_header, lambda fp: write_lines(fp, self.code_header)),
+            ('code', filename_code, lambda fp: write_lines(fp, self.code_source)),
+        ])
 
 
 
 class RegisterCGeneratorHelper:
 
-    def __init__(self, registers: RegisterSet, filename: str = 'Registers', format: "RegisterCGenerator.Format" = None):
+    def __init__(self, registers: CompiledRegisterSet, filename: str = 'Registers', format: "RegisterCGenerator.Format" = None):
 
         self.registers = registers
         self.filename = filename
@@ -136,13 +148,25 @@ class RegisterCGeneratorHelper:
         self.code_reset = []
         self.shadow_vars: typing.Optional[list[ShadowVar]] = []
 
-        check_names(self.registers)
+        # registers that are flushed from their shadow, by address; bit i of the dirty bitmap belongs to register i
+        self.flush_regs = sorted([reg for reg in registers.registers if reg.need_shadow_write], key=lambda reg: reg.abs_adr)
+        self.dirty_indices = {reg.name: i for i,reg in enumerate(self.flush_regs)}
 
         self.prepare()
         self.generate()
         self.finish()        
 
     
+    def fn_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
+
+    def var_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
+
+    def const_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.CONSTANT_CASE)
+
+
     def prepare(self):
 
         # boilerplate code at the top
@@ -171,7 +195,7 @@ class RegisterCGeneratorHelper:
         self.reg_type = reg_type(reg_size)
     
 
-    def begin_register(self, name: str, description: str, comment: str, abs_addr: int, is_readable: bool, is_writable: bool, is_resettable: bool, is_strobed: bool, need_shadow_read: bool, need_shadow_write: bool):
+    def begin_register(self, name: str, description: str, comment: str, abs_addr: int, is_readable: bool, is_writable: bool, is_resettable: bool, is_strobed: bool, need_shadow_read: bool, need_shadow_write: bool, count: int = 1):
         
         self.r_readable = is_readable
         self.r_writable = is_writable
@@ -180,21 +204,32 @@ class RegisterCGeneratorHelper:
         self.r_shadow_read = need_shadow_read
         self.r_shadow_write = need_shadow_write
 
-        self.r_shadow_var = f'register_{var_name(name)}_shadow'
-        self.r_dirty_var = f'register_{var_name(name)}_dirty'
+        self.r_shadow_var = f'register_{self.var_name(name)}_shadow'
+        self.r_dirty_index = self.dirty_indices.get(name)
+        if self.r_dirty_index is not None:
+            self.r_dirty_word = f'shadow_dirty[{self.r_dirty_index//32}]'
+            self.r_dirty_bit = f'0x{1<<(self.r_dirty_index%32):X}u'
         if need_shadow_read or need_shadow_write:
-            self.shadow_vars.append(ShadowVar(fn_name(name), self.r_shadow_var, self.r_dirty_var, is_readable, need_shadow_read, need_shadow_write))
+            self.shadow_vars.append(ShadowVar(self.fn_name(name), self.r_shadow_var, self.r_dirty_index, is_readable, need_shadow_read, need_shadow_write))
         
-        self.r_addr_const = f'REGISTER_{const_name(name)}_ADDRESS'
+        self.r_addr_const = f'REGISTER_{self.const_name(name)}_ADDRESS'
+
+        # register arrays get an additional index argument on all accessors
+        self.r_count = count
+        self.r_count_const = f'REGISTER_{self.const_name(name)}_COUNT'
+        self.r_idx_arg = 'index' if count > 1 else ''
+        self.r_idx_args = 'index, ' if count > 1 else ''
+        self.r_idx_params = 'int index, ' if count > 1 else ''
 
         self.code_defs.append(f'// {name}: {description}')
         if comment is not None:
             for line in comment.splitlines():
                 self.code_defs.append(f'// {line}')
         self.code_defs.append(f'#define {self.r_addr_const} (0x{abs_addr:X})')
+        if count > 1:
+            self.code_defs.append(f'#define {self.r_count_const} ({count})')
         if need_shadow_read or need_shadow_write:
             self.code_defs.append(f'int {self.r_shadow_var} = 0;')
-            self.code_defs.append(f'{self.reg_type} {self.r_dirty_var} = 0;')
         self.code_defs.append('')
 
         self.f_default_consts = []
@@ -207,12 +242,12 @@ class RegisterCGeneratorHelper:
         self.f_type = field_type(dtype)
         self.f_is_boolean = dtype is FieldType.Boolean
 
-        self.f_offs_const = f'REGISTER_{const_name(self.reg_name)}_FIELD_{const_name(name)}_OFFSET'
-        self.f_bitmask_const = f'REGISTER_{const_name(self.reg_name)}_FIELD_{const_name(name)}_BITMASK'
+        self.f_offs_const = f'REGISTER_{self.const_name(self.reg_name)}_FIELD_{self.const_name(name)}_OFFSET'
+        self.f_bitmask_const = f'REGISTER_{self.const_name(self.reg_name)}_FIELD_{self.const_name(name)}_BITMASK'
         if not self.r_strobed:
-            self.f_wordmask_const = f'REGISTER_{const_name(self.reg_name)}_FIELD_{const_name(name)}_WORDMASk'
+            self.f_wordmask_const = f'REGISTER_{self.const_name(self.reg_name)}_FIELD_{self.const_name(name)}_WORDMASk'
         if self.r_resettable:
-            self.f_def_const = f'REGISTER_{const_name(self.reg_name)}_FIELD_{const_name(name)}_DEFAULT'
+            self.f_def_const = f'REGISTER_{self.const_name(self.reg_name)}_FIELD_{self.const_name(name)}_DEFAULT'
 
         if self.r_resettable:
             self.f_default_consts.append(self.f_def_const)
@@ -241,7 +276,7 @@ class RegisterCGeneratorHelper:
 
     def add_read_func(self):
                     
-        sig = f'{self.f_type} get_{fn_name(self.reg_name)}_{fn_name(self.field_name)}()'
+        sig = f'{self.f_type} get_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}({"int index" if self.r_count > 1 else ""})'
 
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -251,16 +286,16 @@ class RegisterCGeneratorHelper:
         self.code_public_funcs.append(sig)
         self.code_public_funcs.append('{')
         if self.f_is_boolean:
-            self.code_public_funcs.append(f'\treturn ((_read_{fn_name(self.reg_name)}() & {self.f_bitmask_const}) != 0);')
+            self.code_public_funcs.append(f'\treturn ((_read_{self.fn_name(self.reg_name)}({self.r_idx_arg}) & {self.f_bitmask_const}) != 0);')
         else:
-            self.code_public_funcs.append(f'\treturn ((_read_{fn_name(self.reg_name)}() & {self.f_bitmask_const}) >> {self.f_offs_const});')
+            self.code_public_funcs.append(f'\treturn ((_read_{self.fn_name(self.reg_name)}({self.r_idx_arg}) & {self.f_bitmask_const}) >> {self.f_offs_const});')
         self.code_public_funcs.append('}')
         self.code_public_funcs.append('')
     
 
     def add_read_shadow_func(self):
                     
-        sig = f'{self.f_type} get_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_shadow(int load_shadow)'
+        sig = f'{self.f_type} get_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_shadow(int load_shadow)'
         
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -270,7 +305,7 @@ class RegisterCGeneratorHelper:
         self.code_public_funcs.append(sig)
         self.code_public_funcs.append('{')
         self.code_public_funcs.append(f'\tif (load_shadow)')
-        self.code_public_funcs.append(f'\t\t_read_{fn_name(self.reg_name)}();')
+        self.code_public_funcs.append(f'\t\t_read_{self.fn_name(self.reg_name)}();')
         if self.f_is_boolean:
             self.code_public_funcs.append(f'\treturn (({self.r_shadow_var} & {self.f_bitmask_const}) != 0);')
         else:
@@ -281,7 +316,7 @@ class RegisterCGeneratorHelper:
 
     def add_overwrite_func(self):
                     
-        sig = f'void set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}(_overwrite({self.f_type} value)'
+        sig = f'void set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}(_overwrite({self.r_idx_params}{self.f_type} value)'
                             
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -291,16 +326,16 @@ class RegisterCGeneratorHelper:
         self.code_public_funcs.append(sig)
         self.code_public_funcs.append('{')
         if self.f_is_boolean:
-            self.code_public_funcs.append(f'\t_write_{fn_name(self.reg_name)}(value = {self.f_bitmask_const} : 0);')
+            self.code_public_funcs.append(f'\t_write_{self.fn_name(self.reg_name)}({self.r_idx_args}value = {self.f_bitmask_const} : 0);')
         else:
-            self.code_public_funcs.append(f'\t_write_{fn_name(self.reg_name)}((value << {self.f_offs_const}) & {self.f_bitmask_const});')
+            self.code_public_funcs.append(f'\t_write_{self.fn_name(self.reg_name)}({self.r_idx_args}(value << {self.f_offs_const}) & {self.f_bitmask_const});')
         self.code_public_funcs.append('}')
         self.code_public_funcs.append('')
     
 
     def add_write_masked_func(self):
 
-        sig = f'void set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_masked({self.f_type} value)'
+        sig = f'void set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_masked({self.r_idx_params}{self.f_type} value)'
                             
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -310,16 +345,16 @@ class RegisterCGeneratorHelper:
         self.code_public_funcs.append(sig)
         self.code_public_funcs.append('{')
         if self.f_is_boolean:
-            self.code_public_funcs.append(f'\t_write_{fn_name(self.reg_name)}_masked(value ? {self.f_bitmask_const} : 0, {self.f_wordmask_const});')
+            self.code_public_funcs.append(f'\t_write_{self.fn_name(self.reg_name)}_masked({self.r_idx_args}value ? {self.f_bitmask_const} : 0, {self.f_wordmask_const});')
         else:
-            self.code_public_funcs.append(f'\t_write_{fn_name(self.reg_name)}_masked((value << {self.f_offs_const}) & {self.f_bitmask_const}, {self.f_wordmask_const});')
+            self.code_public_funcs.append(f'\t_write_{self.fn_name(self.reg_name)}_masked({self.r_idx_args}(value << {self.f_offs_const}) & {self.f_bitmask_const}, {self.f_wordmask_const});')
         self.code_public_funcs.append('}')
         self.code_public_funcs.append('')
     
 
     def add_read_modify_write_func(self):
                     
-        sig = f'void set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_rmw({self.f_type} value, int lazy)'
+        sig = f'void set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_rmw({self.r_idx_params}{self.f_type} value, int lazy)'
                             
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -328,20 +363,20 @@ class RegisterCGeneratorHelper:
         self.code_public_funcs.extend(self._field_comment)
         self.code_public_funcs.append(sig)
         self.code_public_funcs.append('{')
-        self.code_public_funcs.append(f'\t{self.f_type} regOld = self._read_{fn_name(self.reg_name)}(1);')
+        self.code_public_funcs.append(f'\t{self.f_type} regOld = self._read_{self.fn_name(self.reg_name)}({self.r_idx_args}1);')
         if self.f_is_boolean:
             self.code_public_funcs.append(f'\t{self.f_type} regNew = (regOld | (value ? {self.f_bitmask_const}) : (regOld & (~{self.f_bitmask_const})));')
         else:
             self.code_public_funcs.append(f'\t{self.f_type} regNew = (regOld & (~{self.f_bitmask_const})) | ((value << {self.f_offs_const}) & {self.f_bitmask_const});')
         self.code_public_funcs.append(f'\tif ((!lazy) || (regOld != regNew))')
-        self.code_public_funcs.append(f'\t\t_write_{fn_name(self.reg_name)}(regNew);')
+        self.code_public_funcs.append(f'\t\t_write_{self.fn_name(self.reg_name)}({self.r_idx_args}regNew);')
         self.code_public_funcs.append('}')
         self.code_public_funcs.append('')
     
 
     def add_write_shadow_func(self):
                                                 
-        sig = f'void set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_shadow({self.f_type} value, int flush)'
+        sig = f'void set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_shadow({self.f_type} value, int flush)'
 
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -354,16 +389,16 @@ class RegisterCGeneratorHelper:
             self.code_public_funcs.append(f'\t{self.r_shadow_var} |= (value ? {self.f_bitmask_const} : 0);')
         else:
             self.code_public_funcs.append(f'\t{self.r_shadow_var} = ({self.r_shadow_var} & ~{self.f_bitmask_const}) | ((value << {self.f_offs_const}) & {self.f_bitmask_const});')
-        self.code_public_funcs.append(f'\t{self.r_dirty_var} = 1;')
+        self.code_public_funcs.append(f'\t{self.r_dirty_word} |= {self.r_dirty_bit};')
         self.code_public_funcs.append(f'\tif (flush)')
-        self.code_public_funcs.append(f'\t\t_write_{fn_name(self.reg_name)}({self.r_shadow_var});')
+        self.code_public_funcs.append(f'\t\t_write_{self.fn_name(self.reg_name)}({self.r_shadow_var});')
         self.code_public_funcs.append('}')
         self.code_public_funcs.append('')
 
 
     def add_strobe_func(self):
     
-        sig = f'void strobe_{fn_name(self.reg_name)}_{fn_name(self.field_name)}((void)'
+        sig = f'void strobe_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}((void)'
         
         self.code_header.extend(self._field_comment)
         self.code_header.append(sig + ';')
@@ -372,7 +407,7 @@ class RegisterCGeneratorHelper:
         self.code_public_funcs.extend(self._field_comment)
         self.code_public_funcs.append(sig)
         self.code_public_funcs.append('{')
-        self.code_public_funcs.append(f'\t_write_{fn_name(self.reg_name)}({self.f_bitmask_const});')
+        self.code_public_funcs.append(f'\t_write_{self.fn_name(self.reg_name)}({self.f_bitmask_const});')
         self.code_public_funcs.append('}')
         self.code_public_funcs.append('')
 
@@ -383,24 +418,35 @@ class RegisterCGeneratorHelper:
     def end_register(self):
 
         if (self.r_resettable) and (len(self.f_default_consts)>0):
-            self.code_reset.append(f'\t_write_{self.reg_name}({" | ".join(self.f_default_consts)});')
+            if self.r_count > 1:
+                self.code_reset.append(f'\tfor (int index = 0; index < {self.r_count_const}; index++)')
+                self.code_reset.append(f'\t\t_write_{self.fn_name(self.reg_name)}(index, {" | ".join(self.f_default_consts)}, 0);')
+            else:
+                self.code_reset.append(f'\t_write_{self.fn_name(self.reg_name)}({" | ".join(self.f_default_consts)}, 0);')
+
+        # the caller is responsible for keeping the index of an array within 0..COUNT-1
+        if self.r_count > 1:
+            addr = f'{self.r_addr_const} + index*{self.registers.port_size//8}'
+        else:
+            addr = self.r_addr_const
 
         if self.r_writable:
             self.code_private_funcs.append(f'/* Intenal function to write to field <{self.field_name}> */')
-            self.code_private_funcs.append(f'void _write_{fn_name(self.reg_name)}({self.f_type} value, int hold_cyc)')
+            self.code_private_funcs.append(f'void _write_{self.fn_name(self.reg_name)}({self.r_idx_params}{self.f_type} value, int hold_cyc)')
             self.code_private_funcs.append('{')
-            self.code_private_funcs.append(f'\t{self.format.write_func}({self.r_addr_const}, value, hold_cyc);')
+            self.code_private_funcs.append(f'\t{self.format.write_func}({addr}, value, hold_cyc);')
             if self.r_shadow_write or self.r_shadow_read:
                 self.code_private_funcs.append(f'\t{self.r_shadow_var} = value;')
-                self.code_private_funcs.append(f'\t{self.r_dirty_var} = 0;')
+                if self.r_dirty_index is not None:
+                    self.code_private_funcs.append(f'\t{self.r_dirty_word} &= ~{self.r_dirty_bit};')
             self.code_private_funcs.append('}')
             self.code_private_funcs.append('')
 
         if self.r_writable and not self.r_strobed:
             self.code_private_funcs.append(f'/* Intenal function to do a masked write to field <{self.field_name}> */')
-            self.code_private_funcs.append(f'void _write_{fn_name(self.reg_name)}_masked({self.f_type} value, int mask)')
+            self.code_private_funcs.append(f'void _write_{self.fn_name(self.reg_name)}_masked({self.r_idx_params}{self.f_type} value, int mask)')
             self.code_private_funcs.append('{')
-            self.code_private_funcs.append(f'\t{self.format.write_masked_func}({self.r_addr_const}, value, mask);')
+            self.code_private_funcs.append(f'\t{self.format.write_masked_func}({addr}, value, mask);')
             if self.r_shadow_write or self.r_shadow_read:
                 self.code_private_funcs.append(f'\tfor (int b = 0; b < {self.registers.port_size//8}; b++)')
                 self.code_private_funcs.append(f'\t\tif (mask&(1<<b))')
@@ -410,19 +456,65 @@ class RegisterCGeneratorHelper:
 
         if self.r_readable:
             self.code_private_funcs.append(f'/* Intenal function to read from field <{self.field_name}> */')
-            self.code_private_funcs.append(f'{self.f_type} _read_{fn_name(self.reg_name)}(int hold_cyc)')
+            self.code_private_funcs.append(f'{self.f_type} _read_{self.fn_name(self.reg_name)}({self.r_idx_params}int hold_cyc)')
             self.code_private_funcs.append('{')
-            self.code_private_funcs.append(f'\t{self.f_type} value = {self.format.read_func}({self.r_addr_const}, hold_cyc);')
+            self.code_private_funcs.append(f'\t{self.f_type} value = {self.format.read_func}({addr}, hold_cyc);')
             if self.r_shadow_write or self.r_shadow_read:
                 self.code_private_funcs.append(f'\t{self.r_shadow_var} = value;')
-                self.code_private_funcs.append(f'\t{self.r_dirty_var} = 0;')
+                if self.r_dirty_index is not None:
+                    self.code_private_funcs.append(f'\t{self.r_dirty_word} &= ~{self.r_dirty_bit};')
             self.code_private_funcs.append(f'\treturn value;')
             self.code_private_funcs.append('}')
             self.code_private_funcs.append('')
                 
 
+    def add_flush_shadow_body(self):
+
+        n_regs = len(self.flush_regs)
+        n_words = (n_regs + 31) // 32
+        all_bits = [(1 << min(32, n_regs - 32*w)) - 1 for w in range(n_words)]
+
+        self.code_defs.append(f'// dirty flags of the shadow registers that flush_shadow() writes, by address; bit i%32 of word i/32 belongs to register i')
+        self.code_defs.append(f'static unsigned int shadow_dirty[{n_words}] = {{0}};')
+        self.code_defs.append(f'static const unsigned int shadow_flush_all[{n_words}] = {{{", ".join([f"0x{bits:X}u" for bits in all_bits])}}};')
+        self.code_defs.append(f'static const unsigned int shadow_flush_addresses[{n_regs}] = {{{", ".join([f"0x{reg.abs_adr:X}" for reg in self.flush_regs])}}};')
+        self.code_defs.append(f'static int * const shadow_flush_values[{n_regs}] = {{{", ".join([f"&register_{self.var_name(reg.name)}_shadow" for reg in self.flush_regs])}}};')
+        self.code_defs.append('')
+
+        # the dirty registers are visited in address order, by iterating over the set bits (__builtin_ctz() is a GCC/Clang builtin)
+        c = self.code_public_funcs
+        if self.format.block_write_func is not None:
+            c.append(f'\t{self.reg_type} words[{n_regs}];')
+            c.append(f'\tunsigned int first = 0, count = 0;')
+        c.append(f'\tfor (unsigned int w = 0; w < {n_words}; w++)')
+        c.append('\t{')
+        c.append(f'\t\tunsigned int dirty = force ? shadow_flush_all[w] : shadow_dirty[w];')
+        c.append(f'\t\tshadow_dirty[w] &= ~dirty;')
+        c.append(f'\t\twhile (dirty != 0)')
+        c.append('\t\t{')
+        c.append(f'\t\t\tunsigned int i = w*32 + __builtin_ctz(dirty);')
+        c.append(f'\t\t\tdirty &= dirty - 1;')
+        if self.format.block_write_func is not None:
+            # contiguous dirty registers are collected into runs, which are written at once
+            c.append(f'\t\t\tif (count > 0 && shadow_flush_addresses[i] != shadow_flush_addresses[first] + count*{self.registers.port_size//8})')
+            c.append('\t\t\t{')
+            c.append(f'\t\t\t\t{self.format.block_write_func}(shadow_flush_addresses[first], words, count);')
+            c.append(f'\t\t\t\tcount = 0;')
+            c.append('\t\t\t}')
+            c.append(f'\t\t\tif (count == 0)')
+            c.append(f'\t\t\t\tfirst = i;')
+            c.append(f'\t\t\twords[count++] = *shadow_flush_values[i];')
+        else:
+            c.append(f'\t\t\t{self.format.write_func}(shadow_flush_addresses[i], *shadow_flush_values[i], 0);')
+        c.append('\t\t}')
+        c.append('\t}')
+        if self.format.block_write_func is not None:
+            c.append(f'\tif (count > 0)')
+            c.append(f'\t\t{self.format.block_write_func}(shadow_flush_addresses[first], words, count);')
+
+
     def finish(self):
-        
+
         if len(self.code_reset)>0:
             
             com = '// set all registers to their default values'
@@ -456,13 +548,7 @@ class RegisterCGeneratorHelper:
                 self.code_public_funcs.extend(com)
                 self.code_public_funcs.append(sig)
                 self.code_public_funcs.append('{')
-                for s in self.shadow_vars:
-                    if not s.shadow_write: continue
-                    self.code_public_funcs.append(f'\tif (force || {s.dirty_var})')
-                    self.code_public_funcs.append('\t{')
-                    self.code_public_funcs.append(f'\t\t_write_{s.fn_name}({s.shadow_var});')
-                    self.code_public_funcs.append(f'\t\t{s.dirty_var} = 0;')
-                    self.code_public_funcs.append('\t}')
+                self.add_flush_shadow_body()
                 self.code_public_funcs.append('}')
                 self.code_public_funcs.append('')
 
@@ -489,5 +575,4 @@ class RegisterCGeneratorHelper:
         self.code_main.extend(['//////////////////////////////////////////////////', ''])
         self.code_main.extend(self.code_private_funcs)
 
-        self.code_header = '\n'.join(self.code_header)
-        self.code_source = '\n'.join(self.code_main)
+        self.code_source = self.code_main
@@ -1,5 +1,8 @@
-from ...tools import check_names, md_table
+from ...tools import md_table, write_lines
+from ...output_cache import input_digest, save_outputs
 from ..structure.types import RegType, RegisterSet, Register, WriteEventType, FieldChangeType, Field, FieldType, FieldFunction
+from ..structure.compiled import CompiledRegisterSet, as_compiled
+from .gen_sv import RegisterSvGenerator
 
 import math
 from dataclasses import dataclass
@@ -9,28 +12,39 @@ import enum
 
 class RegisterMdGenerator:
 
-    def __init__(self, registers: RegisterSet):
-        self.registers = registers
-        
-        gen = RegisterMdGeneratorHelper(registers)
-        self.md = gen.md
+    def __init__(self, registers: "RegisterSet|CompiledRegisterSet", sv_format: RegisterSvGenerator.Format = None):
+        """ sv_format: format of the generated HDL, whose access timing is documented; defaults to the format RegisterSvGenerator uses """
+        self.registers = as_compiled(registers)
+        self.sv_format = sv_format
+        self._md = None
+    
+
+    @property
+    def md(self) -> "list[str]":
+        # documentation is only generated when it is needed, so that save() can skip it if the file is up to date
+        if self._md is None:
+            self._md = RegisterMdGeneratorHelper(self.registers, self.sv_format).md
+        return self._md
     
 
     def get_md(self) -> str:
-        return self.md
+        return '\n'.join(self.md)
     
 
     def save(self, filename: str):
-        with open(filename, 'w') as fp:
-            fp.write(self.get_md())
+        """ Saves the documentation; skipped if the file is up to date, and only written if its contents changed; returns the regenerated files """
+        return save_outputs(input_digest(type(self).__name__, self.registers.digest, self.sv_format), [
+            ('md', filename, lambda fp: write_lines(fp, self.md)),
+        ])
 
 
 
 class RegisterMdGeneratorHelper:
 
 
-    def __init__(self, registers: RegisterSet):
+    def __init__(self, registers: CompiledRegisterSet, sv_format: RegisterSvGenerator.Format = None):
         self.registers = registers
+        self.sv_format = sv_format if sv_format is not None else RegisterSvGenerator.Format()
         
         self.generate()
     
@@ -45,6 +59,25 @@ class RegisterMdGeneratorHelper:
         md.append(f'Base address is 0x{self.registers.get_base_address():08X}.')
         md.append('')
         md.append(f'All registers are {self.registers.port_size} bit wide, granularity is 8 bit')
+        if self.registers.pipelined:
+            md.append('')
+            md.append('The Wishbone interface uses pipelined mode.')
+        if self.registers.burst:
+            md.append('')
+            md.append('Incrementing and wrapping bursts (CTI/BTE) transfer one word per clock cycle.')
+            side_effect_regs = [reg.name for reg in self.registers.registers if reg.regtype == RegType.ReadEvent or (reg.regtype in [RegType.WriteRead, RegType.Read] and reg.write_event in [WriteEventType.StrobeOnWrite, WriteEventType.StrobeAfterWriteOnCycleEnd])]
+            if len(side_effect_regs) > 0:
+                md.append(f'Reading has side effects for {", ".join(side_effect_regs)}; these registers are not read ahead, so a burst inserts one wait state before them.')
+        md.append('')
+        latency = self.sv_format.get_read_latency()
+        if latency == 0:
+            md.append('Write and read accesses are acknowledged in the same clock cycle.')
+        elif self.registers.pipelined:
+            md.append(f'Write and read accesses are acknowledged {latency} clock cycle{"s" if latency!=1 else ""} after the request; a new request can be issued in every clock cycle.')
+        else:
+            md.append(f'Write accesses are acknowledged in the same clock cycle. Read accesses are acknowledged {latency} clock cycle{"s" if latency!=1 else ""} after the strobe.')
+        if self.sv_format.read_pipeline_stages > 0:
+            md.append(f'This includes {self.sv_format.read_pipeline_stages} pipeline stage{"s" if self.sv_format.read_pipeline_stages!=1 else ""} in the read data path.')
 
 
         md.append('')
@@ -75,7 +108,17 @@ class RegisterMdGeneratorHelper:
                 comments.append(reg.comment)
                 com = len(comments)
             
-            table.append([f'0x{reg.get_relative_address():08X}', f'0x{reg.get_absolute_address():08X}', reg.name, reg.description, typ, hw, com])
+            if reg.is_array():
+                last = (reg.count-1) * (self.registers.port_size//8)
+                rel_addr = f'0x{reg.get_relative_address():08X}..0x{reg.get_relative_address()+last:08X}'
+                abs_addr = f'0x{reg.get_absolute_address():08X}..0x{reg.get_absolute_address()+last:08X}'
+                name = f'{reg.name}[{reg.count}]'
+            else:
+                rel_addr = f'0x{reg.get_relative_address():08X}'
+                abs_addr = f'0x{reg.get_absolute_address():08X}'
+                name = reg.name
+            
+            table.append([rel_addr, abs_addr, name, reg.description, typ, hw, com])
 
         md.extend(md_table(table))
 
@@ -111,6 +154,8 @@ class RegisterMdGeneratorHelper:
                 md.append('This register is write-only. It only sends triggers to the hardware.')
             if reg.write_event != 0 and reg.write_event is not None:
                 md.append('Writing to this register triggers the hardware.')
+            if reg.is_array():
+                md.append(f'This is an array of {reg.count} registers, stored in block RAM; element i is located at offset i*{self.registers.port_size//8}.')
             md.append('')
             
             table = [['Bits', 'Name', 'Description', 'Default', 'Access', 'Specials', 'Comments']]
@@ -178,7 +223,7 @@ class RegisterMdGeneratorHelper:
         md.append('')
 
         
-        self.md = '\n'.join(md)
+        self.md = md
         
 
 
@@ -1,7 +1,10 @@
 from ..structure.types import RegisterSet, RegType, FieldType, FieldFunction
-from ...tools import check_names, make_sourcecode_name, NamingConvention
+from ..structure.compiled import CompiledRegisterSet, as_compiled
+from ...tools import NamingConvention, write_lines
+from ...output_cache import input_digest, save_outputs
 
 from dataclasses import dataclass, field
+import keyword
 import re
 import typing
 
@@ -26,46 +29,66 @@ class RegisterPyGenerator:
         
         """Lines that are added to the top of the code to import Python modules"""
         import_clauses: list[str] = field(default_factory=lambda: [])
+        
+        """Set to True to generate transaction(), which queues field accesses and submits them merged per register"""
+        transactions: bool = False
+        
+        """
+        Optional function that submits a list of bus operations at once, and returns one result per operation;
+        operations are ('read', address), ('write', address, value) and ('write_masked', address, value, mask),
+        results are the read values, or None for writes. If it does not exist, the operations are submitted one by one.
+        """
+        batch_func: str = 'execute_batch'
+        
+        """Set to True to generate snapshot(), which reads all readable registers at once, and decodes their fields on demand"""
+        snapshot: bool = False
+        
+        """Set to True to include event registers in snapshot(); reading them clears their latches, so polling snapshot() consumes events"""
+        snapshot_events: bool = False
+        
+        """Optional function that reads <count> consecutive registers, starting at <address>, and returns a sequence of words"""
+        block_read_func: str = 'read_block'
+        
+        """Optional function that writes a sequence of words to consecutive registers, starting at <address>; flush_shadow() uses it for contiguous dirty registers"""
+        block_write_func: str = 'write_block'
+        
+        """Set to True to generate decode_<register>() and encode_<register>() functions, which work on NumPy arrays of register words"""
+        numpy_codecs: bool = False
+        
+        """Set to True to generate async accessors, which await the read/write functions (and the optional batch and block-read functions)"""
+        async_mode: bool = False
 
 
-    def __init__(self, registers: RegisterSet, format: Format = None):
+    def __init__(self, registers: "RegisterSet|CompiledRegisterSet", format: Format = None):
         """
-        registers:     the register set to create Python code from
+        registers:     the register set to create Python code from (compiled or not)
         format:        a RegisterPyGenerator.Format object to control code generation
         """
         
-        self.registers = registers
+        self.registers = as_compiled(registers)
         self.format = format if format is not None else RegisterPyGenerator.Format()
+        self._code = None
+    
 
-        check_names(self.registers)
-
-        gen = RegisterPyGeneratorHelper(registers, format)
-        self.code = gen.final_code
+    @property
+    def code(self) -> "list[str]":
+        # code is only generated when it is needed, so that save() can skip it if the file is up to date
+        if self._code is None:
+            self._code = RegisterPyGeneratorHelper(self.registers, self.format).final_code
+        return self._code
     
 
     def get_code(self) -> str:
         """Returns the generated Python code as a string"""
 
-        return self.code
+        return '\n'.join(self.code)
     
 
     def save(self, filename: str):
-        with open(filename, 'w') as fp:
-            fp.write(self.get_code())
-
-
-
-def class_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.PascalCase)
-
-def fn_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
-
-def var_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
-
-def const_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
+        """ Saves the code; skipped if the file is up to date, and only written if its contents changed; returns the regenerated files """
+        return save_outputs(input_digest(type(self).__name__, self.registers.digest, self.format), [
+            ('code', filename, lambda fp: write_lines(fp, self.code)),
+        ])
 
 
 
@@ -73,7 +96,8 @@ def const_name(name: str) -> str:
 class ShadowVar:
     fn_name: str
     shadow_var: str
-    dirty_var: str
+    """ bit in the dirty bitmap; 0 if the shadow is never flushed """
+    dirty_bit: int
     is_readable: bool
     shadow_read: bool
     shadow_write: bool
@@ -82,23 +106,50 @@ class ShadowVar:
 
 class RegisterPyGeneratorHelper:
 
-    def __init__(self, registers: RegisterSet, format: "RegisterPyGenerator.Format" = None):
+    def __init__(self, registers: CompiledRegisterSet, format: "RegisterPyGenerator.Format" = None):
 
         self.registers = registers
         self.format = format if format is not None else RegisterPyGenerator.Format()
 
+        # functions that access the bus are coroutines in async mode
+        self.def_kw = 'async def' if self.format.async_mode else 'def'
+        self.await_kw = 'await ' if self.format.async_mode else ''
+
         self.code_main = []
         self.code_defs = []
+        self.code_init = []
+        self.slots = []
         self.code_public_funcs = []
         self.code_private_funcs = []
         self.code_reset = []
+        self.code_txn_funcs = []
+        self.snapshot_regs = []
+        self.snapshot_fields = []
+        self.codec_regs: "list[tuple[str,str,bool,bool,list[tuple[str,int,int,str,str,int]]]]" = []
         self.shadow_vars: typing.Optional[list[ShadowVar]] = []
 
+        # registers that are flushed from their shadow, by address; bit i of the dirty bitmap belongs to register i
+        self.flush_regs = sorted([reg for reg in registers.registers if reg.need_shadow_write], key=lambda reg: reg.abs_adr)
+        self.dirty_bits = {reg.name: 1<<i for i,reg in enumerate(self.flush_regs)}
+
         self.prepare()
         self.generate()
         self.finish()        
 
     
+    def class_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.PascalCase)
+
+    def fn_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
+
+    def var_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
+
+    def const_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
+
+
     def prepare(self):
 
         # boilerplate code at the top
@@ -108,26 +159,39 @@ class RegisterPyGeneratorHelper:
         if len(self.format.import_clauses) > 0:
             self.code_main.append('')
     
+        if self.format.snapshot:
+            self.code_main.append('import array')
+        if self.format.numpy_codecs:
+            self.code_main.append('import numpy as np')
+        if self.format.snapshot or self.format.numpy_codecs:
+            self.code_main.append('')
         self.code_main.append('# automatically generated code')
         self.code_main.append('')
-        self.code_main.append(f'class {class_name(self.registers.name)}:')
+        self.code_main.append(f'class {self.class_name(self.registers.name)}:')
         if self.format.accessor_obj:
             
-            self.code_main.append(f'\tdef __init__(self, hwaccess):')
-            self.code_main.append(f'\t\tself.hw = hwaccess')
+            self.slots.append('hw')
+            self.code_init.append(f'\t\tself.hw = hwaccess')
             
             self.read_func = f'self.hw.{self.format.read_func}'
             self.write_func = f'self.hw.{self.format.write_func}'
             self.write_masked_func = f'self.hw.{self.format.write_masked_func}'
+            self.batch_func_lookup = f'getattr(self.hw, \'{self.format.batch_func}\', None)'
+            self.block_read_func_lookup = f'getattr(self.hw, \'{self.format.block_read_func}\', None)'
+            self.block_write_func_lookup = f'getattr(self.hw, \'{self.format.block_write_func}\', None)'
 
         else:
-            self.code_main.append(f'\tdef __init__(self):')
-            
             self.read_func = self.format.read_func
             self.write_func =self.format.write_func
             self.write_masked_func = self.format.write_masked_func
+            self.batch_func_lookup = f'globals().get(\'{self.format.batch_func}\')'
+            self.block_read_func_lookup = f'globals().get(\'{self.format.block_read_func}\')'
+            self.block_write_func_lookup = f'globals().get(\'{self.format.block_write_func}\')'
 
-        self.code_main.append('')
+        # dirty flags of all shadow registers, see dirty_bits
+        if any([reg.need_shadow_read or reg.need_shadow_write for reg in self.registers.registers]):
+            self.slots.append('_shadow_dirty')
+            self.code_init.append(f'\t\tself._shadow_dirty = 0')
 
 
     def generate(self):
@@ -139,7 +203,7 @@ class RegisterPyGeneratorHelper:
         ...
     
 
-    def begin_register(self, name: str, description: str, comment: str, abs_addr: int, is_readable: bool, is_writable: bool, is_resettable: bool, is_strobed: bool, need_shadow_read: bool, need_shadow_write: bool):
+    def begin_register(self, name: str, description: str, comment: str, abs_addr: int, is_readable: bool, is_writable: bool, is_resettable: bool, is_strobed: bool, need_shadow_read: bool, need_shadow_write: bool, count: int = 1):
         
         self.r_readable = is_readable
         self.r_writable = is_writable
@@ -148,25 +212,54 @@ class RegisterPyGeneratorHelper:
         self.r_shadow_read = need_shadow_read
         self.r_shadow_write = need_shadow_write
 
-        self.r_shadow_var = f'self._register_{var_name(name)}_shadow'
-        self.r_dirty_var = f'self._register_{var_name(name)}_dirty'
+        self.r_shadow_var = f'self._register_{self.var_name(name)}_shadow'
+        self.r_dirty_bit = self.dirty_bits.get(name, 0)
+        self.r_set_dirty = f'self._shadow_dirty |= 0x{self.r_dirty_bit:X}'
+        self.r_clear_dirty = f'self._shadow_dirty &= ~0x{self.r_dirty_bit:X}' if self.r_dirty_bit != 0 else None
         if need_shadow_read or need_shadow_write:
-            self.shadow_vars.append(ShadowVar(fn_name(name), self.r_shadow_var, self.r_dirty_var, is_readable, need_shadow_read, need_shadow_write))
+            self.shadow_vars.append(ShadowVar(self.fn_name(name), self.r_shadow_var, self.r_dirty_bit, is_readable, need_shadow_read, need_shadow_write))
         
-        self.r_addr_const = f'self._register_{const_name(name)}_addr'
+        # the accessors use literal constants; the named constants are class attributes, for reference
+        self.r_addr_const = f'0x{abs_addr:X}'
 
-        self.code_defs.append(f'\t\t# {name}: {description}')
+        # register arrays get an additional index argument on all accessors
+        self.r_count = count
+        self.r_count_const = f'{count}'
+        self.r_idx_param = ', index:int' if count > 1 else ''
+        self.r_idx_arg = 'index' if count > 1 else ''
+        self.r_idx_args = 'index, ' if count > 1 else ''
+
+        self.code_defs.append(f'\t# {name}: {description}')
         if comment is not None:
             for line in comment.splitlines():
-                self.code_defs.append(f'\t\t# {line}')
-        self.code_defs.append(f'\t\t{self.r_addr_const} = 0x{abs_addr:X}')
-        if need_shadow_read or need_shadow_write:
-            self.code_defs.append(f'\t\t{self.r_shadow_var} = 0')
-            self.code_defs.append(f'\t\t{self.r_dirty_var} = False')
+                self.code_defs.append(f'\t# {line}')
+        self.code_defs.append(f'\t_register_{self.const_name(name)}_addr = {self.r_addr_const}')
+        if count > 1:
+            self.code_defs.append(f'\t_register_{self.const_name(name)}_count = {self.r_count_const}')
         self.code_defs.append('')
+        if need_shadow_read or need_shadow_write:
+            self.slots.append(self.r_shadow_var[len('self.'):])
+            self.code_init.append(f'\t\t{self.r_shadow_var} = 0')
 
-        self.f_default_consts = []
+        self.r_default = 0
         self.reg_name = name
+        self.codec_regs.append((self.fn_name(name), description, is_readable, is_writable, []))
+
+        # for transactions: the bits that are covered by fields (writing all of them needs no read-modify-write)
+        self.r_used_bitmask = 0
+        for reg in self.registers.registers:
+            if reg.name == name:
+                for f in reg.fields:
+                    self.r_used_bitmask |= f.bitmask
+        # event registers clear their latches when they are read, so they are only part of snapshots on request
+        is_event = any(reg.event for reg in self.registers.registers if reg.name == name)
+        self.r_in_snapshot = is_readable and (self.format.snapshot_events or not is_event)
+        if self.r_in_snapshot:
+            self.snapshot_regs.append((abs_addr, count, self.r_shadow_var if (need_shadow_read or need_shadow_write) else None, self.r_dirty_bit))
+        if need_shadow_read or need_shadow_write:
+            self.r_txn_shadow = f"('{self.r_shadow_var[len('self.'):]}', 0x{self.r_dirty_bit:X})"
+        else:
+            self.r_txn_shadow = 'None'
 
 
     def begin_field(self, name: str, description: str, comment: str, f_offs: int, f_size: int, f_bitmask: int, f_wordmask: int, dtype: FieldType, default: int):
@@ -175,29 +268,27 @@ class RegisterPyGeneratorHelper:
         self.f_type = dtype
         self.f_is_boolean = dtype is FieldType.Boolean
 
-        self.f_offs_const = f'self._register_{const_name(self.reg_name)}_field_{const_name(name)}_offset'
-        self.f_bitmask_const = f'self._register_{const_name(self.reg_name)}_field_{const_name(name)}_bitmask'
+        self.f_offs_const = f'{f_offs}'
+        self.f_bitmask_const = f'0x{f_bitmask:X}'
         if not self.r_strobed:
-            self.f_wordmask_const = f'self._register_{const_name(self.reg_name)}_field_{const_name(name)}_wordmask'
+            self.f_wordmask_const = f'0x{f_wordmask:X}'
         if self.r_resettable:
-            self.f_def_const = f'self._register_{const_name(self.reg_name)}_field_{const_name(name)}_default'
+            self.r_default |= (default&((1<<f_size)-1))<<f_offs
 
-        if self.r_resettable:
-            self.f_default_consts.append(self.f_def_const)
-        
-        self.code_defs.append(f'\t\t# {self.reg_name}.{name}: {description}')
+        const_prefix = f'_register_{self.const_name(self.reg_name)}_field_{self.const_name(name)}'
+        self.code_defs.append(f'\t# {self.reg_name}.{name}: {description}')
         if comment is not None:
             for line in comment.splitlines():
-                self.code_defs.append(f'\t\t# {line}')
-        self.code_defs.append(f'\t\t{self.f_offs_const} = {f_offs}')
-        self.code_defs.append(f'\t\t{self.f_bitmask_const} = 0x{f_bitmask:X}')
+                self.code_defs.append(f'\t# {line}')
+        self.code_defs.append(f'\t{const_prefix}_offset = {self.f_offs_const}')
+        self.code_defs.append(f'\t{const_prefix}_bitmask = {self.f_bitmask_const}')
         if not self.r_strobed:
-            self.code_defs.append(f'\t\t{self.f_wordmask_const} = 0x{f_wordmask:X}')
+            self.code_defs.append(f'\t{const_prefix}_wordmask = {self.f_wordmask_const}')
         if self.r_resettable:
             if default < 0:
-                self.code_defs.append(f'\t\t{self.f_def_const} = 0x{((default&((1<<f_size)-1))<<f_offs):X} # {default}')
+                self.code_defs.append(f'\t{const_prefix}_default = 0x{((default&((1<<f_size)-1))<<f_offs):X} # {default}')
             else:
-                self.code_defs.append(f'\t\t{self.f_def_const} = 0x{(default<<f_offs):X}')
+                self.code_defs.append(f'\t{const_prefix}_default = 0x{(default<<f_offs):X}')
         self.code_defs.append('')
 
         self._field_comment = [f'\t\t""" {description} (<{self.reg_name}>.<{name}>)']
@@ -205,29 +296,48 @@ class RegisterPyGeneratorHelper:
             for line in comment.splitlines():
                 self._field_comment.append(f'\t\t {line}')
         self._field_comment[-1] += ' """'
+
+        if dtype in [FieldType.Boolean, FieldType.Strobe]:
+            kind, np_dtype = 'b', 'bool_'
+        else:
+            signed = dtype in [FieldType.Signed8Bit, FieldType.Signed16Bit, FieldType.Signed32Bit, FieldType.Signed64Bit]
+            bits = {FieldType.Unsigned8Bit: 8, FieldType.Unsigned16Bit: 16, FieldType.Unsigned32Bit: 32, FieldType.Unsigned64Bit: 64,
+                FieldType.Signed8Bit: 8, FieldType.Signed16Bit: 16, FieldType.Signed32Bit: 32, FieldType.Signed64Bit: 64}[dtype]
+            kind, np_dtype = ('s', f'int{bits}') if signed else ('u', f'uint{bits}')
+        self.codec_regs[-1][4].append((self.fn_name(name), f_offs, f_size, kind, np_dtype, default if self.r_resettable else 0))
+
+        if self.r_in_snapshot:
+            self.snapshot_fields.append((f'{self.fn_name(self.reg_name)}_{self.fn_name(name)}', self.snapshot_regs[-1][0], self.r_count, f_bitmask, f_offs, self.f_is_boolean))
+
+        # accesses that are available in transactions; collected by the add_*_func() methods
+        self.f_txn_read = False
+        self.f_txn_write_mode = None
+        self.f_txn_strobe = False
     
 
     def add_read_func(self):
+
+        self.f_txn_read = True
                     
-        sig = f'\tdef get_{fn_name(self.reg_name)}_{fn_name(self.field_name)}(self) -> int:'
+        sig = f'\t{self.def_kw} get_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}(self{self.r_idx_param}) -> int:'
 
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
         if self.f_is_boolean:
-            self.code_public_funcs.append(f'\t\treturn ((self._read_{const_name(self.reg_name)}() & {self.f_bitmask_const}) != 0)')
+            self.code_public_funcs.append(f'\t\treturn (({self.await_kw}self._read_{self.const_name(self.reg_name)}({self.r_idx_arg}) & {self.f_bitmask_const}) != 0)')
         else:
-            self.code_public_funcs.append(f'\t\treturn ((self._read_{const_name(self.reg_name)}() & {self.f_bitmask_const}) >> {self.f_offs_const})')
+            self.code_public_funcs.append(f'\t\treturn (({self.await_kw}self._read_{self.const_name(self.reg_name)}({self.r_idx_arg}) & {self.f_bitmask_const}) >> {self.f_offs_const})')
         self.code_public_funcs.append('')
     
 
     def add_read_shadow_func(self):
                     
-        sig = f'\tdef get_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_shadow(self, load_shadow:bool=False) -> int:'
+        sig = f'\t{self.def_kw} get_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_shadow(self, load_shadow:bool=False) -> int:'
         
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
         self.code_public_funcs.append(f'\t\tif load_shadow:')
-        self.code_public_funcs.append(f'\t\t\tself._read_{fn_name(self.reg_name)}()')
+        self.code_public_funcs.append(f'\t\t\t{self.await_kw}self._read_{self.fn_name(self.reg_name)}()')
         if self.f_is_boolean:
             self.code_public_funcs.append(f'\t\treturn (({self.r_shadow_var} & {self.f_bitmask_const}) != 0)')
         else:
@@ -236,50 +346,56 @@ class RegisterPyGeneratorHelper:
     
 
     def add_overwrite_func(self):
+
+        self.f_txn_write_mode = max(self.f_txn_write_mode or 0, 0)
                     
-        sig = f'\tdef set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_overwrite(self, value:int):'
+        sig = f'\t{self.def_kw} set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_overwrite(self{self.r_idx_param}, value:int):'
                             
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
         if self.f_is_boolean:
-            self.code_public_funcs.append(f'\t\tself._write_{fn_name(self.reg_name)}({self.f_bitmask_const} if value else 0)')
+            self.code_public_funcs.append(f'\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}({self.r_idx_args}{self.f_bitmask_const} if value else 0)')
         else:
-            self.code_public_funcs.append(f'\t\tself._write_{fn_name(self.reg_name)}((value << {self.f_offs_const}) & {self.f_bitmask_const})')
+            self.code_public_funcs.append(f'\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}({self.r_idx_args}(value << {self.f_offs_const}) & {self.f_bitmask_const})')
         self.code_public_funcs.append('')
     
 
     def add_write_masked_func(self):
 
-        sig = f'\tdef set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_masked(self, value:int):'
+        self.f_txn_write_mode = max(self.f_txn_write_mode or 0, 1)
+
+        sig = f'\t{self.def_kw} set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_masked(self{self.r_idx_param}, value:int):'
                             
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
         if self.f_is_boolean:
-            self.code_public_funcs.append(f'\t\tself._write_{fn_name(self.reg_name)}_masked({self.f_bitmask_const} if value else 0, {self.f_wordmask_const})')
+            self.code_public_funcs.append(f'\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}_masked({self.r_idx_args}{self.f_bitmask_const} if value else 0, {self.f_wordmask_const})')
         else:
-            self.code_public_funcs.append(f'\t\tself._write_{fn_name(self.reg_name)}_masked((value << {self.f_offs_const}) & {self.f_bitmask_const}, {self.f_wordmask_const})')
+            self.code_public_funcs.append(f'\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}_masked({self.r_idx_args}(value << {self.f_offs_const}) & {self.f_bitmask_const}, {self.f_wordmask_const})')
         self.code_public_funcs.append('')
     
 
     def add_read_modify_write_func(self):
+
+        self.f_txn_write_mode = 2
                     
-        sig = f'\tdef set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_rmw(self, value:int, lazy:bool=False):'
+        sig = f'\t{self.def_kw} set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_rmw(self{self.r_idx_param}, value:int, lazy:bool=False):'
                             
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
-        self.code_public_funcs.append(f'\t\tregOld = self._read_{fn_name(self.reg_name)}(hold_cyc=True)')
+        self.code_public_funcs.append(f'\t\tregOld = {self.await_kw}self._read_{self.fn_name(self.reg_name)}({self.r_idx_args}hold_cyc=True)')
         if self.f_is_boolean:
             self.code_public_funcs.append(f'\t\tregNew = (regOld | {self.f_bitmask_const}) if value else (regOld & (~{self.f_bitmask_const}))')
         else:
             self.code_public_funcs.append(f'\t\tregNew = (regOld & (~{self.f_bitmask_const})) | ((value << {self.f_offs_const}) & {self.f_bitmask_const})')
         self.code_public_funcs.append(f'\t\tif (not lazy) or (regOld != regNew):')
-        self.code_public_funcs.append(f'\t\t\tself._write_{fn_name(self.reg_name)}(regNew)')
+        self.code_public_funcs.append(f'\t\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}({self.r_idx_args}regNew)')
         self.code_public_funcs.append('')
     
 
     def add_write_shadow_func(self):
                                                 
-        sig = f'\tdef set_{fn_name(self.reg_name)}_{fn_name(self.field_name)}_shadow(self, value:int, flush:bool=False):'
+        sig = f'\t{self.def_kw} set_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}_shadow(self, value:int, flush:bool=False):'
 
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
@@ -287,43 +403,90 @@ class RegisterPyGeneratorHelper:
             self.code_public_funcs.append(f'\t\t{self.r_shadow_var} |= ({self.f_bitmask_const} if value else 0)')
         else:
             self.code_public_funcs.append(f'\t\t{self.r_shadow_var} = ({self.r_shadow_var} & ~{self.f_bitmask_const}) | ((value << {self.f_offs_const}) & {self.f_bitmask_const})')
-        self.code_public_funcs.append(f'\t\t{self.r_dirty_var} = True')
+        self.code_public_funcs.append(f'\t\t{self.r_set_dirty}')
         self.code_public_funcs.append(f'\t\tif flush:')
-        self.code_public_funcs.append(f'\t\t\tself._write_{fn_name(self.reg_name)}({self.r_shadow_var})')
+        self.code_public_funcs.append(f'\t\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}({self.r_shadow_var})')
         self.code_public_funcs.append('')
 
 
     def add_strobe_func(self):
+
+        self.f_txn_strobe = True
     
-        sig = f'\tdef strobe_{fn_name(self.reg_name)}_{fn_name(self.field_name)}(self):'
+        sig = f'\t{self.def_kw} strobe_{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}(self{self.r_idx_param}):'
         
         self.code_public_funcs.append(sig)
         self.code_public_funcs.extend(self._field_comment)
-        self.code_public_funcs.append(f'\t\tself._write_{fn_name(self.reg_name)}({self.f_bitmask_const})')
+        self.code_public_funcs.append(f'\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}({self.r_idx_args}{self.f_bitmask_const})')
         self.code_public_funcs.append('')
 
 
     def end_field(self):
-        ...
+        if self.format.transactions:
+            self.add_transaction_funcs()
+
+
+    def add_transaction_funcs(self):
+
+        name = f'{self.fn_name(self.reg_name)}_{self.fn_name(self.field_name)}'
+        addr = f'self._regs._address_{self.fn_name(self.reg_name)}(index)' if self.r_count > 1 else self.r_addr_const
+        bitmask, offs = self.f_bitmask_const, self.f_offs_const
+
+        if self.f_txn_read:
+            self.code_txn_funcs.append(f'\tdef get_{name}(self{self.r_idx_param}) -> PendingRead:')
+            self.code_txn_funcs.extend(self._field_comment)
+            self.code_txn_funcs.append(f'\t\treturn self._read({addr}, {bitmask}, {offs}, {self.f_is_boolean}, {self.r_txn_shadow})')
+            self.code_txn_funcs.append('')
+
+        if self.f_txn_write_mode is not None:
+            mode = ['self._OVERWRITE', 'self._MASKED', 'self._RMW'][self.f_txn_write_mode]
+            value = f'{bitmask} if value else 0' if self.f_is_boolean else f'(value << {offs}) & {bitmask}'
+            self.code_txn_funcs.append(f'\tdef set_{name}(self{self.r_idx_param}, value:int):')
+            self.code_txn_funcs.extend(self._field_comment)
+            self.code_txn_funcs.append(f'\t\tself._write({addr}, {value}, {bitmask}, {self.f_wordmask_const}, {mode}, 0x{self.r_used_bitmask:X}, {self.r_txn_shadow})')
+            self.code_txn_funcs.append('')
+
+        if self.f_txn_strobe:
+            self.code_txn_funcs.append(f'\tdef strobe_{name}(self{self.r_idx_param}):')
+            self.code_txn_funcs.extend(self._field_comment)
+            self.code_txn_funcs.append(f'\t\tself._write({addr}, {bitmask}, {bitmask}, 0, self._OVERWRITE, 0x{self.r_used_bitmask:X}, None)')
+            self.code_txn_funcs.append('')
 
     def end_register(self):
 
-        if (self.r_resettable) and (len(self.f_default_consts)>0):
-            self.code_reset.append(f'\t\tself._write_{fn_name(self.reg_name)}({" | ".join(self.f_default_consts)})')
+        if (self.r_resettable) and (len(self.codec_regs[-1][4])>0):
+            if self.r_count > 1:
+                self.code_reset.append(f'\t\tfor index in range({self.r_count_const}):')
+                self.code_reset.append(f'\t\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}(index, 0x{self.r_default:X})')
+            else:
+                self.code_reset.append(f'\t\t{self.await_kw}self._write_{self.fn_name(self.reg_name)}(0x{self.r_default:X})')
+
+        if self.r_count > 1:
+            addr = f'self._address_{self.fn_name(self.reg_name)}(index)'
+            self.code_private_funcs.append(f'\t# Internal function to calculate the address of an element of <{self.reg_name}>')
+            self.code_private_funcs.append(f'\tdef _address_{self.fn_name(self.reg_name)}(self, index: int) -> int:')
+            self.code_private_funcs.append(f'\t\tif not (0 <= index < {self.r_count_const}):')
+            self.code_private_funcs.append(f'\t\t\traise IndexError(f\'Index {{index}} out of range for register array <{self.reg_name}>\')')
+            self.code_private_funcs.append(f'\t\treturn {self.r_addr_const} + index*{self.registers.port_size//8}')
+            self.code_private_funcs.append('')
+        else:
+            addr = self.r_addr_const
+        idx_param = ', index: int' if self.r_count > 1 else ''
 
         if self.r_writable:
             self.code_private_funcs.append(f'\t# Internal function to write to field <{self.field_name}>')
-            self.code_private_funcs.append(f'\tdef _write_{fn_name(self.reg_name)}(self, value: int, hold_cyc: bool = False):')
-            self.code_private_funcs.append(f'\t\t{self.write_func}({self.r_addr_const}, value, hold_cyc)')
+            self.code_private_funcs.append(f'\t{self.def_kw} _write_{self.fn_name(self.reg_name)}(self{idx_param}, value: int, hold_cyc: bool = False):')
+            self.code_private_funcs.append(f'\t\t{self.await_kw}{self.write_func}({addr}, value, hold_cyc)')
             if self.r_shadow_write or self.r_shadow_read:
                 self.code_private_funcs.append(f'\t\t{self.r_shadow_var} = value')
-                self.code_private_funcs.append(f'\t\t{self.r_dirty_var} = False')
+                if self.r_clear_dirty is not None:
+                    self.code_private_funcs.append(f'\t\t{self.r_clear_dirty}')
             self.code_private_funcs.append('')
 
         if self.r_writable and not self.r_strobed:
             self.code_private_funcs.append(f'\t# Internal function to do a masked write to field <{self.field_name}>')
-            self.code_private_funcs.append(f'\tdef _write_{fn_name(self.reg_name)}_masked(self, value: int, mask: int):')
-            self.code_private_funcs.append(f'\t\t{self.write_masked_func}({self.r_addr_const}, value, mask)')
+            self.code_private_funcs.append(f'\t{self.def_kw} _write_{self.fn_name(self.reg_name)}_masked(self{idx_param}, value: int, mask: int):')
+            self.code_private_funcs.append(f'\t\t{self.await_kw}{self.write_masked_func}({addr}, value, mask)')
             if self.r_shadow_write or self.r_shadow_read:
                 self.code_private_funcs.append(f'\t\tfor b in range({self.registers.port_size//8}):')
                 self.code_private_funcs.append(f'\t\t\tif mask&(1<<b):')
@@ -332,11 +495,12 @@ class RegisterPyGeneratorHelper:
 
         if self.r_readable:
             self.code_private_funcs.append(f'\t# Internal function to read from field <{self.field_name}>')
-            self.code_private_funcs.append(f'\tdef _read_{fn_name(self.reg_name)}(self, hold_cyc: bool = False) -> int:')
-            self.code_private_funcs.append(f'\t\tvalue = {self.read_func}({self.r_addr_const}, hold_cyc)')
+            self.code_private_funcs.append(f'\t{self.def_kw} _read_{self.fn_name(self.reg_name)}(self{idx_param}, hold_cyc: bool = False) -> int:')
+            self.code_private_funcs.append(f'\t\tvalue = {self.await_kw}{self.read_func}({addr}, hold_cyc)')
             if self.r_shadow_write or self.r_shadow_read:
                 self.code_private_funcs.append(f'\t\t{self.r_shadow_var} = value')
-                self.code_private_funcs.append(f'\t\t{self.r_dirty_var} = False')
+                if self.r_clear_dirty is not None:
+                    self.code_private_funcs.append(f'\t\t{self.r_clear_dirty}')
             self.code_private_funcs.append(f'\t\treturn value')
             self.code_private_funcs.append('')
                 
@@ -344,7 +508,7 @@ class RegisterPyGeneratorHelper:
     def finish(self):
         
         if len(self.code_reset)>0:
-            self.code_public_funcs.append(f'\tdef reset(self):')
+            self.code_public_funcs.append(f'\t{self.def_kw} reset(self):')
             self.code_public_funcs.append(f'\t\t""" set all self.registers to their default values """')
             self.code_public_funcs.extend(self.code_reset)
             self.code_public_funcs.append('')
@@ -352,30 +516,363 @@ class RegisterPyGeneratorHelper:
         any_shadow_write = any([s.shadow_write for s in self.shadow_vars])
         if any_shadow_write:
 
-            self.code_public_funcs.append(f'\tdef flush_shadow(self, force:bool=False):')
+            self.code_public_funcs.append(f'\t{self.def_kw} flush_shadow(self, force:bool=False):')
             self.code_public_funcs.append(f'\t\t"""')
             self.code_public_funcs.append(f'\t\twrite all dirty shadow register contents to hardware')
             self.code_public_funcs.append(f'\t\tset force=True to force flushing, even if nothing changed locally')
+            self.code_public_funcs.append(f'\t\tcontiguous dirty registers are written with one call of {self.format.block_write_func}(), if it exists')
             self.code_public_funcs.append(f'\t\t"""')
-            for s in self.shadow_vars:
-                if not s.shadow_write: continue
-                self.code_public_funcs.append(f'\t\tif force or {s.dirty_var}:')
-                self.code_public_funcs.append(f'\t\t\tself._write_{s.fn_name}({s.shadow_var})')
-                self.code_public_funcs.append(f'\t\t\t{s.dirty_var} = False')
+            self.add_flush_shadow_body()
             self.code_public_funcs.append('')
             
         any_shadow_read = any([s.shadow_read for s in self.shadow_vars])
         if any_shadow_read:
-            self.code_public_funcs.append(f'\tdef load_shadow(self):')
+            self.code_public_funcs.append(f'\t{self.def_kw} load_shadow(self):')
             self.code_public_funcs.append(f'\t\t""" read all shadow register contents from hardware (only readable self.registers)"""')
             for s in self.shadow_vars:
                 if not s.shadow_read: continue
-                self.code_public_funcs.append(f'\t\tself._read_{s.fn_name}()')
+                self.code_public_funcs.append(f'\t\t{self.await_kw}self._read_{s.fn_name}()')
             self.code_public_funcs.append('')
         
+        if self.format.transactions:
+            self.add_transaction_class()
+        if self.format.snapshot and len(self.snapshot_regs) > 0:
+            self.add_snapshot_class()
+        
         self.code_main.extend(self.code_defs)
+        # the mutable state has slots, so instances carry no attribute dict
+        self.code_main.append(f'\t__slots__ = {tuple(self.slots)!r}')
+        self.code_main.append('')
+        self.code_main.append(f'\tdef __init__(self{", hwaccess" if self.format.accessor_obj else ""}):')
+        self.code_main.extend(self.code_init if len(self.code_init) > 0 else ['\t\tpass'])
+        self.code_main.append('')
         self.code_main.extend(self.code_public_funcs)
         self.code_main.extend(['\t##################################################', ''])
         self.code_main.extend(self.code_private_funcs)
+        if self.format.transactions:
+            self.code_main.extend(self.code_txn_class)
+        if self.format.snapshot and len(self.snapshot_regs) > 0:
+            self.code_main.extend(self.code_snapshot_class)
+        if self.format.numpy_codecs:
+            self.add_codec_funcs()
+
+        self.final_code = self.code_main
+
+
+    def add_flush_shadow_body(self):
+
+        stride = self.registers.port_size//8
+        all_bits = (1<<len(self.flush_regs)) - 1
+
+        self.code_defs.append(f'\t# (dirty bit, address, shadow) of the registers that flush_shadow() writes, by address')
+        self.code_defs.append(f'\t_SHADOW_FLUSH = (')
+        for reg in self.flush_regs:
+            self.code_defs.append(f'\t\t(0x{self.dirty_bits[reg.name]:X}, 0x{reg.abs_adr:X}, \'_register_{self.var_name(reg.name)}_shadow\'),')
+        self.code_defs.append(f'\t)')
+        self.code_defs.append('')
+
+        # contiguous dirty registers are collected into runs, which are written at once
+        c = self.code_public_funcs
+        c.append(f'\t\tdirty = 0x{all_bits:X} if force else self._shadow_dirty')
+        c.append(f'\t\tif dirty == 0:')
+        c.append(f'\t\t\treturn')
+        # the bits are cleared before writing, so that shadows that are changed meanwhile (e.g. by another task in async mode)
+        #   stay dirty; if a write fails, all of them are marked as dirty again
+        c.append(f'\t\tself._shadow_dirty &= ~dirty')
+        c.append(f'\t\ttry:')
+        c.append(f'\t\t\tblock_write = {self.block_write_func_lookup}')
+        c.append(f'\t\t\taddress, words = 0, []')
+        c.append(f'\t\t\tfor bit, reg_address, shadow in self._SHADOW_FLUSH:')
+        c.append(f'\t\t\t\tif not (dirty & bit):')
+        c.append(f'\t\t\t\t\tcontinue')
+        c.append(f'\t\t\t\tif len(words) > 0 and reg_address != address + len(words)*{stride}:')
+        c.append(f'\t\t\t\t\t{self.await_kw}self._write_run(block_write, address, words)')
+        c.append(f'\t\t\t\t\twords = []')
+        c.append(f'\t\t\t\tif len(words) == 0:')
+        c.append(f'\t\t\t\t\taddress = reg_address')
+        c.append(f'\t\t\t\twords.append(getattr(self, shadow))')
+        c.append(f'\t\t\t{self.await_kw}self._write_run(block_write, address, words)')
+        c.append(f'\t\texcept BaseException:')
+        c.append(f'\t\t\tself._shadow_dirty |= dirty')
+        c.append(f'\t\t\traise')
+
+        self.code_private_funcs.append(f'\t# Internal function to write consecutive registers, with one block write if possible')
+        self.code_private_funcs.append(f'\t{self.def_kw} _write_run(self, block_write, address: int, words: list):')
+        self.code_private_funcs.append(f'\t\tif block_write is not None and len(words) > 1:')
+        self.code_private_funcs.append(f'\t\t\t{self.await_kw}block_write(address, words)')
+        self.code_private_funcs.append(f'\t\telse:')
+        self.code_private_funcs.append(f'\t\t\tfor index, word in enumerate(words):')
+        self.code_private_funcs.append(f'\t\t\t\t{self.await_kw}{self.write_func}(address + index*{stride}, word, False)')
+        self.code_private_funcs.append('')
+
+
+    def add_codec_funcs(self):
+
+        word_dtype = f'uint{self.registers.port_size}'
+
+        c = self.code_main
+        c.append('')
+        c.append(f'# field tables of the register codecs: (name, offset, size, kind, dtype), kind is \'u\'nsigned, \'s\'igned or \'b\'oolean')
+        c.append(f'_CODEC_FIELDS = {{')
+        for reg,_,decode,encode,fields in self.codec_regs:
+            if not (decode or encode):
+                continue
+            c.append(f'\t\'{reg}\': (')
+            for name,offs,size,kind,np_dtype,_ in fields:
+                c.append(f'\t\t(\'{name}\', {offs}, {size}, \'{kind}\', np.{np_dtype}),')
+            c.append(f'\t),')
+        c.append(f'}}')
+        c.append('')
+        c.append('')
+        c.append(f'def _decode(words, fields) -> "dict[str,np.ndarray]":')
+        c.append(f'\twords = np.asarray(words).astype(np.uint64)')
+        c.append(f'\tresult = {{}}')
+        c.append(f'\tfor name, offset, size, kind, dtype in fields:')
+        c.append(f'\t\tvalues = (words >> np.uint64(offset)) & np.uint64((1 << size) - 1)')
+        c.append(f'\t\tif kind == \'b\':')
+        c.append(f'\t\t\tresult[name] = (values != 0)')
+        c.append(f'\t\telif kind == \'s\':')
+        c.append(f'\t\t\tvalues = values.astype(np.int64)')
+        c.append(f'\t\t\tif size < 64:')
+        c.append(f'\t\t\t\t# sign-extend')
+        c.append(f'\t\t\t\tsign = np.int64(1 << (size - 1))')
+        c.append(f'\t\t\t\tvalues = (values ^ sign) - sign')
+        c.append(f'\t\t\tresult[name] = values.astype(dtype)')
+        c.append(f'\t\telse:')
+        c.append(f'\t\t\tresult[name] = values.astype(dtype)')
+        c.append(f'\treturn result')
+        c.append('')
+        c.append('')
+        c.append(f'def _encode(values: dict, fields) -> np.ndarray:')
+        c.append(f'\twords = np.uint64(0)')
+        c.append(f'\tfor name, offset, size, kind, dtype in fields:')
+        c.append(f'\t\tvalue = np.asarray(values[name])')
+        c.append(f'\t\tif kind == \'b\':')
+        c.append(f'\t\t\tvalue = value.astype(bool).astype(np.uint64)')
+        c.append(f'\t\telse:')
+        c.append(f'\t\t\tvalue = value.astype(np.int64).astype(np.uint64)')
+        c.append(f'\t\twords = words | ((value & np.uint64((1 << size) - 1)) << np.uint64(offset))')
+        c.append(f'\treturn np.asarray(words).astype(np.{word_dtype})')
+        # decoders are only generated for registers that can be read, encoders only for registers that can be written
+        for reg,description,decode,encode,fields in self.codec_regs:
+            if decode:
+                c.append('')
+                c.append('')
+                c.append(f'def decode_{reg}(words) -> "dict[str,np.ndarray]":')
+                c.append(f'\t""" {description}: decode all fields of an array of register words """')
+                c.append(f'\treturn _decode(words, _CODEC_FIELDS[\'{reg}\'])')
+            if not encode:
+                continue
+            c.append('')
+            c.append('')
+            # field names become parameter names, which must not be keywords
+            params = [(name, f'{name}_' if keyword.iskeyword(name) else name, default) for name,_,_,_,_,default in fields]
+            c.append(f'def encode_{reg}(*, {", ".join([f"{param}={default}" for _,param,default in params])}) -> np.ndarray:')
+            c.append(f'\t""" {description}: encode field values (scalars or arrays) into register words """')
+            values = ', '.join([f"'{name}': {param}" for name,param,_ in params])
+            c.append(f'\treturn _encode({{{values}}}, _CODEC_FIELDS[\'{reg}\'])')
+        c.append('')
+
+
+    def add_snapshot_class(self):
+
+        regs_class = self.class_name(self.registers.name)
+        snapshot_class = f'{regs_class}Snapshot'
+        stride = self.registers.port_size//8
+        typecode = {8: 'B', 16: 'H', 32: 'I', 64: 'Q'}[self.registers.port_size] # 'L' has 8 bytes on LP64 platforms
+
+        # words are stored in address order; only the addresses of the snapshot registers are read, in runs of consecutive
+        #   addresses, so that write-only and unmapped addresses in between are not accessed
+        addresses = sorted([addr + i*stride for addr,count,_,_ in self.snapshot_regs for i in range(count)])
+        word_index = {addr: i for i,addr in enumerate(addresses)}
+        runs = []
+        for addr in addresses:
+            if len(runs) > 0 and runs[-1][0] + runs[-1][1]*stride == addr:
+                runs[-1][1] += 1
+            else:
+                runs.append([addr, 1])
+
+        self.code_public_funcs.append(f'\t{self.def_kw} snapshot(self) -> \'{snapshot_class}\':')
+        self.code_public_funcs.append(f'\t\t""" read all readable registers (with block reads of consecutive registers, if possible), and return an object that decodes their fields """')
+        self.code_public_funcs.append(f'\t\tblock_read = {self.block_read_func_lookup}')
+        self.code_public_funcs.append(f'\t\twords = array.array(\'{typecode}\')')
+        self.code_public_funcs.append(f'\t\tif block_read is not None:')
+        for addr,n_words in runs:
+            self.code_public_funcs.append(f'\t\t\twords.extend({self.await_kw}block_read(0x{addr:X}, {n_words}))')
+        self.code_public_funcs.append(f'\t\telse:')
+        self.code_public_funcs.append(f'\t\t\tfor address in {snapshot_class}._ADDRESSES:')
+        self.code_public_funcs.append(f'\t\t\t\twords.append({self.await_kw}{self.read_func}(address, False))')
+        # shadows with pending writes keep their values, so that flush_shadow() still writes them
+        for addr,_,shadow_var,dirty_bit in self.snapshot_regs:
+            if shadow_var is None:
+                continue
+            if dirty_bit != 0:
+                self.code_public_funcs.append(f'\t\tif not self._shadow_dirty & 0x{dirty_bit:X}:')
+                self.code_public_funcs.append(f'\t\t\t{shadow_var} = words[{word_index[addr]}]')
+            else:
+                self.code_public_funcs.append(f'\t\t{shadow_var} = words[{word_index[addr]}]')
+        self.code_public_funcs.append(f'\t\treturn {snapshot_class}(words)')
+        self.code_public_funcs.append('')
+
+        c = self.code_snapshot_class = ['']
+        c.append(f'class {snapshot_class}:')
+        c.append(f'\t"""')
+        c.append(f'\tcontents of all readable registers of a {regs_class} object, read at once by snapshot()')
+        c.append(f'\tfields are decoded when they are accessed, e.g. snapshot.<register>_<field>; fields of register arrays are tuples')
+        c.append(f'\t"""')
+        c.append('')
+        c.append(f'\t__slots__ = (\'words\',)')
+        c.append('')
+        c.append(f'\t# addresses of the words, if they are read one by one')
+        c.append(f'\t_ADDRESSES = ({", ".join([f"0x{addr:X}" for addr in addresses])}{"," if len(addresses) == 1 else ""})')
+        c.append('')
+        c.append(f'\t# name: (word index, count, bitmask, offset, is boolean)')
+        c.append(f'\t_FIELDS = {{')
+        for name,addr,count,bitmask,offs,is_boolean in self.snapshot_fields:
+            c.append(f'\t\t\'{name}\': ({word_index[addr]}, {count}, 0x{bitmask:X}, {offs}, {is_boolean}),')
+        c.append(f'\t}}')
+        c.append('')
+        c.append(f'\tdef __init__(self, words: array.array):')
+        c.append(f'\t\tself.words = words')
+        c.append('')
+        c.append(f'\tdef __getattr__(self, name: str):')
+        c.append(f'\t\ttry:')
+        c.append(f'\t\t\tindex, count, bitmask, offset, is_boolean = {snapshot_class}._FIELDS[name]')
+        c.append(f'\t\texcept KeyError:')
+        c.append(f'\t\t\traise AttributeError(name) from None')
+        c.append(f'\t\tif is_boolean:')
+        c.append(f'\t\t\tvalues = tuple([(word & bitmask) != 0 for word in self.words[index:index+count]])')
+        c.append(f'\t\telse:')
+        c.append(f'\t\t\tvalues = tuple([(word & bitmask) >> offset for word in self.words[index:index+count]])')
+        c.append(f'\t\treturn values if count > 1 else values[0]')
+        c.append('')
+        c.append(f'\tdef as_dict(self) -> dict:')
+        c.append(f'\t\t""" decode all fields """')
+        c.append(f'\t\treturn {{name: getattr(self, name) for name in {snapshot_class}._FIELDS}}')
+        c.append('')
+
+
+    def add_transaction_class(self):
+
+        regs_class = self.class_name(self.registers.name)
+        txn_class = f'{regs_class}Transaction'
+        lanes = self.registers.port_size//8
+
+        self.code_public_funcs.append(f'\tdef transaction(self) -> \'{txn_class}\':')
+        self.code_public_funcs.append(f'\t\t""" queue field accesses in a with-block; they are submitted merged per register when the block ends """')
+        self.code_public_funcs.append(f'\t\treturn {txn_class}(self)')
+        self.code_public_funcs.append('')
 
-        self.final_code = '\n'.join(self.code_main)
+        self.code_private_funcs.append(f'\t# Internal function to submit a list of bus operations, as a batch if possible')
+        self.code_private_funcs.append(f'\t{self.def_kw} _execute(self, operations: list) -> list:')
+        self.code_private_funcs.append(f'\t\tif len(operations) == 0:')
+        self.code_private_funcs.append(f'\t\t\treturn []')
+        self.code_private_funcs.append(f'\t\tbatch = {self.batch_func_lookup}')
+        self.code_private_funcs.append(f'\t\tif batch is not None:')
+        self.code_private_funcs.append(f'\t\t\treturn {self.await_kw}batch(operations)')
+        self.code_private_funcs.append(f'\t\tresults = []')
+        self.code_private_funcs.append(f'\t\tfor operation in operations:')
+        self.code_private_funcs.append(f'\t\t\tif operation[0] == \'read\':')
+        self.code_private_funcs.append(f'\t\t\t\tresults.append({self.await_kw}{self.read_func}(operation[1], False))')
+        self.code_private_funcs.append(f'\t\t\telif operation[0] == \'write\':')
+        self.code_private_funcs.append(f'\t\t\t\t{self.await_kw}{self.write_func}(operation[1], operation[2], False)')
+        self.code_private_funcs.append(f'\t\t\t\tresults.append(None)')
+        self.code_private_funcs.append(f'\t\t\telse:')
+        self.code_private_funcs.append(f'\t\t\t\t{self.await_kw}{self.write_masked_func}(operation[1], operation[2], operation[3])')
+        self.code_private_funcs.append(f'\t\t\t\tresults.append(None)')
+        self.code_private_funcs.append(f'\t\treturn results')
+        self.code_private_funcs.append('')
+
+        c = self.code_txn_class = ['']
+        c.append(f'class PendingRead:')
+        c.append(f'\t""" Result of a field read in a transaction; the value is available after the transaction was submitted """')
+        c.append('')
+        c.append(f'\tdef __init__(self, bitmask: int, offset: int, is_boolean: bool):')
+        c.append(f'\t\tself._bitmask, self._offset, self._is_boolean = bitmask, offset, is_boolean')
+        c.append(f'\t\tself._value = None')
+        c.append('')
+        c.append(f'\t@property')
+        c.append(f'\tdef value(self) -> int:')
+        c.append(f'\t\tif self._value is None:')
+        c.append(f'\t\t\traise RuntimeError(\'The transaction was not submitted yet\')')
+        c.append(f'\t\treturn self._value')
+        c.append('')
+        c.append(f'\tdef _resolve(self, word: int):')
+        c.append(f'\t\tif self._is_boolean:')
+        c.append(f'\t\t\tself._value = ((word & self._bitmask) != 0)')
+        c.append(f'\t\telse:')
+        c.append(f'\t\t\tself._value = ((word & self._bitmask) >> self._offset)')
+        c.append('')
+        c.append('')
+        c.append(f'class {txn_class}:')
+        c.append(f'\t"""')
+        c.append(f'\tqueues field accesses to a {regs_class} object, and submits them when the {"async " if self.format.async_mode else ""}with-block ends (or on commit())')
+        c.append(f'\tall reads are submitted first, with one read per register, then all writes, with one write per register')
+        c.append(f'\treads return a PendingRead, whose value is available after submitting')
+        c.append(f'\t"""')
+        c.append('')
+        c.append(f'\t_OVERWRITE, _MASKED, _RMW = 0, 1, 2')
+        c.append('')
+        c.append(f'\tdef __init__(self, regs: {regs_class}):')
+        c.append(f'\t\tself._regs = regs')
+        c.append(f'\t\tself._reads = {{}}')
+        c.append(f'\t\tself._writes = {{}}')
+        c.append('')
+        a = 'a' if self.format.async_mode else ''
+        c.append(f'\t{self.def_kw} __{a}enter__(self) -> \'{txn_class}\':')
+        c.append(f'\t\treturn self')
+        c.append('')
+        c.append(f'\t{self.def_kw} __{a}exit__(self, exc_type, exc_value, traceback):')
+        c.append(f'\t\tif exc_type is None:')
+        c.append(f'\t\t\t{self.await_kw}self.commit()')
+        c.append('')
+        c.append(f'\t{self.def_kw} commit(self):')
+        c.append(f'\t\t""" submit all queued accesses, and resolve the pending reads """')
+        c.append(f'\t\tregs = self._regs')
+        c.append(f'\t\taddresses = list(self._reads.keys())')
+        c.append(f'\t\tfor address,(value, bitmask, wordmask, mode, used_bitmask, shadow) in self._writes.items():')
+        c.append(f'\t\t\tif mode == self._RMW and (bitmask & used_bitmask) != used_bitmask and address not in self._reads:')
+        c.append(f'\t\t\t\taddresses.append(address)')
+        c.append(f'\t\twords = dict(zip(addresses, {self.await_kw}regs._execute([(\'read\', address) for address in addresses])))')
+        c.append(f'\t\tfor address,(pending_reads, shadow) in self._reads.items():')
+        c.append(f'\t\t\tfor pending in pending_reads:')
+        c.append(f'\t\t\t\tpending._resolve(words[address])')
+        c.append(f'\t\t\tif shadow is not None:')
+        c.append(f'\t\t\t\tsetattr(regs, shadow[0], words[address])')
+        c.append(f'\t\t\t\tregs._shadow_dirty &= ~shadow[1]')
+        c.append('')
+        c.append(f'\t\toperations, shadow_updates = [], []')
+        c.append(f'\t\tfor address,(value, bitmask, wordmask, mode, used_bitmask, shadow) in self._writes.items():')
+        c.append(f'\t\t\tpartial = (bitmask & used_bitmask) != used_bitmask')
+        c.append(f'\t\t\tif partial and mode == self._MASKED:')
+        c.append(f'\t\t\t\toperations.append((\'write_masked\', address, value, wordmask))')
+        c.append(f'\t\t\t\tif shadow is not None:')
+        c.append(f'\t\t\t\t\tlanes = sum([0xFF<<(8*b) for b in range({lanes}) if wordmask&(1<<b)])')
+        c.append(f'\t\t\t\t\tshadow_updates.append((shadow, (getattr(regs, shadow[0]) & ~lanes) | (value & lanes), 0))')
+        c.append(f'\t\t\telse:')
+        c.append(f'\t\t\t\tif partial and mode == self._RMW:')
+        c.append(f'\t\t\t\t\tvalue = (words[address] & ~bitmask) | value')
+        c.append(f'\t\t\t\toperations.append((\'write\', address, value))')
+        c.append(f'\t\t\t\tif shadow is not None:')
+        c.append(f'\t\t\t\t\tshadow_updates.append((shadow, value, shadow[1]))')
+        c.append(f'\t\t{self.await_kw}regs._execute(operations)')
+        c.append(f'\t\tfor shadow,value,clean_bit in shadow_updates:')
+        c.append(f'\t\t\tsetattr(regs, shadow[0], value)')
+        c.append(f'\t\t\tregs._shadow_dirty &= ~clean_bit')
+        c.append(f'\t\tself._reads, self._writes = {{}}, {{}}')
+        c.append('')
+        c.extend(self.code_txn_funcs)
+        c.append(f'\t##################################################')
+        c.append('')
+        c.append(f'\tdef _read(self, address: int, bitmask: int, offset: int, is_boolean: bool, shadow: tuple) -> PendingRead:')
+        c.append(f'\t\tpending = PendingRead(bitmask, offset, is_boolean)')
+        c.append(f'\t\tself._reads.setdefault(address, ([], shadow))[0].append(pending)')
+        c.append(f'\t\treturn pending')
+        c.append('')
+        c.append(f'\tdef _write(self, address: int, value: int, bitmask: int, wordmask: int, mode: int, used_bitmask: int, shadow: tuple):')
+        c.append(f'\t\tif address in self._writes:')
+        c.append(f'\t\t\told_value, old_bitmask, old_wordmask, old_mode, _, _ = self._writes[address]')
+        c.append(f'\t\t\tvalue = (old_value & ~bitmask) | value')
+        c.append(f'\t\t\tbitmask, wordmask, mode = old_bitmask | bitmask, old_wordmask | wordmask, max(old_mode, mode)')
+        c.append(f'\t\tself._writes[address] = (value, bitmask, wordmask, mode, used_bitmask, shadow)')
+        c.append('')
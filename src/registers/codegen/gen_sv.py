@@ -1,5 +1,7 @@
-from ...tools import check_names, clog2, make_sourcecode_name, NamingConvention
-from ..structure.types import RegType, RegisterSet, Register, WriteEventType, FieldChangeType, Field, FieldType
+from ...tools import clog2, NamingConvention
+from ...output_cache import input_digest, save_outputs
+from ..structure.types import RegType, RegisterSet, WriteEventType, FieldChangeType
+from ..structure.compiled import CompiledRegisterSet, CompiledRegister, CompiledField, as_compiled
 from ...lib import SvCodeFormatter, SvModule, SvInstance, SvAlwaysFf, SvIfBlock
 
 import math
@@ -17,6 +19,14 @@ class VarnameType(enum.Enum):
 
 
 
+class AddressDecoder(enum.Enum):
+    """ chain of if/else-if statements; synthesizes to a priority multiplexer """
+    IfElse = enum.auto()
+    """ unique case statement; synthesizes to a parallel multiplexer, which is faster for many registers """
+    UniqueCase = enum.auto()
+
+
+
 class RegisterSvGenerator:
 
     @dataclass
@@ -31,48 +41,62 @@ class RegisterSvGenerator:
         handshake_req_suffix: str = '_req'
         handshake_ack_prefix: str = ''
         handshake_ack_suffix: str = '_ack'
+        address_decoder: AddressDecoder = AddressDecoder.IfElse
+        read_pipeline_stages: int = 0
+        read_bank_size: int = None
+        combinational_read: bool = False
 
+        def get_read_latency(self) -> int:
+            """ number of clock cycles from the read strobe to the acknowledge """
+            if self.combinational_read:
+                return 0
+            return 1 + self.read_pipeline_stages
 
-    def __init__(self, registers: RegisterSet, format: Format = None):
-        self.registers = registers
+
+    def __init__(self, registers: "RegisterSet|CompiledRegisterSet", format: Format = None):
+        self.registers = as_compiled(registers)
         self.fmt = format if format is not None else RegisterSvGenerator.Format()
-        
-        gen = RegisterSvGeneratorHelper(registers, format)
-        self.instance = gen.instance
-        self.implementation = gen.implementation
+        self._gen = None
     
 
-    def get_instance_template_code(self) -> str:
-        return self.instance
+    @property
+    def instance(self) -> SvCodeFormatter:
+        return self._generate().instance
     
 
-    def get_code(self) -> str:
-        return self.implementation
+    @property
+    def implementation(self) -> SvCodeFormatter:
+        return self._generate().implementation
     
 
-    def save(self, filename_code: str = None, filename_instance_template: str = None):
-        if filename_code is not None:
-            with open(filename_code, 'w') as fp:
-                fp.write(self.get_code())
-        if filename_instance_template is not None:
-            with open(filename_instance_template, 'w') as fp:
-                fp.write(self.get_instance_template_code())
+    def _generate(self) -> "RegisterSvGeneratorHelper":
+        # code is only generated when it is needed, so that save() can skip it if all files are up to date
+        if self._gen is None:
+            self._gen = RegisterSvGeneratorHelper(self.registers, self.fmt)
+        return self._gen
+    
 
+    def get_instance_template_code(self) -> str:
+        return self.instance.generate()
+    
 
+    def get_code(self) -> str:
+        return self.implementation.generate()
+    
 
-def module_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
-def signal_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.snake_case)
-def placeholder_name(name: str) -> str:
-    return make_sourcecode_name(name, NamingConvention.CONSTANT_CASE)
+    def save(self, filename_code: str = None, filename_instance_template: str = None):
+        """ Saves the code; files that are up to date are skipped, and files are only written if their contents changed; returns the regenerated files """
+        return save_outputs(input_digest(type(self).__name__, self.registers.digest, self.fmt), [
+            ('code', filename_code, lambda fp: self.implementation.generate_to(fp)),
+            ('instance_template', filename_instance_template, lambda fp: self.instance.generate_to(fp)),
+        ])
 
 
 
 class RegisterSvGeneratorHelper:
 
 
-    def __init__(self, registers: RegisterSet, format: "RegisterSvGenerator.Format" = None):
+    def __init__(self, registers: CompiledRegisterSet, format: "RegisterSvGenerator.Format" = None):
         self.registers = registers
         self.fmt = format if format is not None else RegisterSvGenerator.Format()
         
@@ -81,9 +105,7 @@ class RegisterSvGeneratorHelper:
 
     def generate(self):
         
-        check_names(self.registers)
-        self.perform_pre_checks()
-    
+        
         _,_,addr_hi = self.calc_address_ranges()
 
         impl = SvCodeFormatter(rst='rst_i', clk='clk_i')
@@ -92,13 +114,16 @@ class RegisterSvGeneratorHelper:
         for line in self.generate_overview_txt():
             impl.add(f'// {line}')
         impl.blank()
-        impl_module = impl.module(module_name(self.registers.name))
+        impl_module = impl.module(self.module_name(self.registers.name))
         impl_declarations = impl.sub()
         impl_wishbone = impl.sub()
         impl_register = impl.always_ff()
         with impl_register:
             impl_autoclears = impl_register.sub()
             impl_decoder = impl_register.sub()
+        arrays = [reg for reg in self.registers.registers if reg.is_array()]
+        if len(arrays) > 0:
+            impl_arrays = impl.sub()
         impl_outputs = impl.sub()
         
         templ = SvCodeFormatter(rst='__RESET_SIGNAL_PLACEHOLDER__', clk='__CLOCK_SIGNAL_PLACEHOLDER__')
@@ -106,7 +131,7 @@ class RegisterSvGeneratorHelper:
         templ.blank()
         templ.add(f'wishbone #(.ADR_BITS({addr_hi+1}), .PORT_SIZE({self.registers.port_size}), .GRANULARITY({8})) __INTERFACE_PLACEHOLDER__();')
         templ.blank()
-        templ_inst = templ.instance(module_name(self.registers.name), '__INSTANCE_PLACEHOLDER__', clk_port='clk_i', rst_port='rst_i')
+        templ_inst = templ.instance(self.module_name(self.registers.name), '__INSTANCE_PLACEHOLDER__', clk_port='clk_i', rst_port='rst_i')
 
         if self.has_any_strobed_regs():
             for reg in self.registers.registers:
@@ -131,25 +156,17 @@ class RegisterSvGeneratorHelper:
         templ_inst.signals.add(f'// Register fields')
 
         for reg in self.registers.registers:
+            if reg.is_array():
+                continue
             for field in reg.fields:
-                f_lo,f_size,f_hi = self.get_field_size(field)
+                f_lo,f_size,f_hi = field.offset, field.size, field.msb
 
-                if self.is_signed(field.datatype):
-                    f_val_min, f_val_max = -(1<<(f_size-1)), (1<<(f_size-1))-1
-                else:
-                    f_val_min, f_val_max = 0, (1<<f_size)-1
-                if field.default < f_val_min or field.default > f_val_max:
-                    raise Exception(f'Default <{field.default}> for field {self.registers.name}.{reg.name}.{field.name} is out of range {f_val_min}..{f_val_max}')
-                    
                 if field.default < 0:
                     f_def_com = f' // {field.default}'
                     f_def = field.default & ((1<<f_size)-1)
                 else:
                     f_def_com = ''
                     f_def = field.default
-
-                if f_hi >= self.registers.port_size:
-                    raise Exception(f'Field {self.registers.name}.{reg.name}.{field.name} is wider than the bus')
                     
                 if self.is_strobed(field.datatype) and f_size>1:
                     raise Exception(f'Strobed field {self.registers.name}.{reg.name}.{field.name} must have a size of 1')
@@ -162,20 +179,17 @@ class RegisterSvGeneratorHelper:
                 regname = self.get_varname(reg, field, VarnameType.Register)
                 ackname = self.get_varname(reg, field, VarnameType.AckPort)
                 
-                if self.is_writable(reg.regtype):
+                if reg.writable or reg.strobed:
                     impl_module.ports.add_comma(f'output{f_dim} {portname}')
                 else:
                     impl_module.ports.add_comma(f'input{f_dim} {portname}')
                 templ_inst.map_signal(portname, '__SIGNAL_PLACEHOLDER__')
                 
-                if self.is_writable(reg.regtype):
+                if reg.writable or reg.strobed:
                     impl_outputs.add(f'assign {portname} = {regname};')
                     impl_declarations.add(f'reg{f_dim} {regname};')
                     impl_register.reset.add(f'{regname} <= {f_size}\'h{f_def:X};{f_def_com}')
-                if self.is_event(reg.regtype):
-                    f_hi,f_lo = field.bits[0], field.bits[-1]
-                    if f_hi!=f_lo:
-                        raise ValueError(f'Field {reg.name}.{field.name} must be exactly one bit wide, as it is in an event-type register')
+                if reg.event:
                     regname_delay = self.get_varname(reg, field, VarnameType.DelayRegister)
                     regname_latch = self.get_varname(reg, field, VarnameType.LatchRegister)
                     impl_declarations.add(f'reg{f_dim} {regname_delay}, {regname_latch};')
@@ -192,65 +206,118 @@ class RegisterSvGeneratorHelper:
                 
         impl.blank()
 
+        # array declarations are inserted after all other declarations, as they might refer to them
+        array_declarations = SvCodeFormatter(parent=impl_declarations)
+        array_rd_adr = 'rd_adr_w' if (self.registers.burst and not self.fmt.combinational_read) else 'wb_s.adr'
+        array_dat = [self.gen_array(reg, impl_module, templ_inst, array_declarations, impl_arrays, array_rd_adr) for reg in arrays]
+
         impl_module.ports.add(f'// Wishbone slave')
         impl_module.ports.add(f'wishbone.slave wb_s')
 
         templ_inst.signals.add(f'// Wishbone slave')
         templ_inst.signals.add(f'.wb_s(__INTERFACE_PLACEHOLDER__)')
         
-        impl_declarations.blank()
-        impl_declarations.add(f'reg ack_r;')
-        impl_declarations.add(f'reg[{self.registers.port_size-1}:0] wb_dat_r;')
-        impl_register.reset.add(f'wb_dat_r <= {self.registers.port_size}\'h0;')
-        impl_register.reset.add(f'ack_r <= 0;')
+        comb_read = self.fmt.combinational_read
+        pipelined = self.registers.pipelined
+        if comb_read and self.fmt.read_pipeline_stages > 0:
+            raise ValueError('A combinational read path cannot have read pipeline stages')
+        # a combinational read path already transfers one word per clock, so it needs no burst logic
+        burst = self.registers.burst and not comb_read
+        if burst and self.fmt.read_pipeline_stages > 0:
+            raise ValueError('Bursts are only supported without read pipeline stages')
+        if len(arrays) > 0 and (comb_read or self.fmt.read_pipeline_stages > 0):
+            raise ValueError('Register arrays are read from block RAM, which requires the default registered read path')
+        side_effect_regs = [reg for reg in self.registers.registers if reg.event or (reg.readable and self.is_strobed_after_write(reg.write_event))]
+        adr_lo = int(math.ceil(math.log2(self.registers.port_size//8)))
 
-        impl_register.add(f'ack_r <= 0;')
-        impl_register.add(f'wb_dat_r <= {self.registers.port_size}\'h0;')
-        impl_register.blank()
+        impl_declarations.blank()
+        if comb_read:
+            impl_declarations.add(f'logic[{self.registers.port_size-1}:0] wb_dat_c;')
+        else:
+            impl_declarations.add(f'reg ack_r;')
+            impl_declarations.add(f'reg[{self.registers.port_size-1}:0] wb_dat_r;')
+            if burst:
+                impl_declarations.add(f'logic[$bits(wb_s.adr)-1:0] rd_adr_w;')
+                impl_declarations.add(f'logic[$bits(wb_s.adr)-1:0] burst_adr_w;')
+                if len(side_effect_regs) > 0:
+                    # reading these registers has side effects, which must not happen for a word the master might not take
+                    side_effect_adr = ' | '.join(f'(burst_adr_w == (\'h{reg.get_relative_address():X} >> {adr_lo}))' for reg in side_effect_regs)
+                    impl_declarations.add(f'wire burst_side_effect_w = {side_effect_adr}; // the next word is not read ahead')
+                    impl_declarations.add(f'wire burst_next_w = wb_s.stb & ~wb_s.we & ack_r & (wb_s.cti == 3\'b010) & ~burst_side_effect_w; // incrementing burst continues')
+                else:
+                    impl_declarations.add(f'wire burst_next_w = wb_s.stb & ~wb_s.we & ack_r & (wb_s.cti == 3\'b010); // incrementing burst continues')
+            impl_register.reset.add(f'wb_dat_r <= {self.registers.port_size}\'h0;')
+            impl_register.reset.add(f'ack_r <= 0;')
+        if len(arrays) > 0:
+            impl_declarations.add(array_declarations)
+
+        n_stages = self.fmt.read_pipeline_stages
+        if n_stages < 0:
+            raise ValueError(f'Invalid number of read pipeline stages: {n_stages}')
+        if n_stages > 0:
+            read_banks = self.get_read_banks()
+            self.gen_read_pipeline(read_banks, impl_declarations, impl_register)
+        elif not comb_read:
+            impl_register.add(f'ack_r <= 0;')
+            impl_register.add(f'wb_dat_r <= {self.registers.port_size}\'h0;')
+            impl_register.blank()
         
         impl_outputs.blank()
-        impl_outputs.add('assign wb_s.dat_sm = wb_dat_r;')
-        impl_outputs.add('assign wb_s.ack = wb_s.stb & (wb_s.we | ack_r);')
+        dat_sm = ' | '.join(['wb_dat_r'] + array_dat)
+        if comb_read:
+            impl_outputs.add('assign wb_s.dat_sm = wb_dat_c;')
+            impl_outputs.add('assign wb_s.ack = wb_s.stb;')
+        elif pipelined:
+            impl_outputs.add(f'assign wb_s.dat_sm = {dat_sm};')
+            impl_outputs.add('assign wb_s.ack = ack_r; // one registered acknowledge per request')
+        else:
+            impl_outputs.add(f'assign wb_s.dat_sm = {dat_sm};')
+            impl_outputs.add('assign wb_s.ack = wb_s.stb & (wb_s.we | ack_r);')
         impl_outputs.add('assign wb_s.err = \'0;')
         impl_outputs.add('assign wb_s.rty = \'0;')
+        impl_outputs.add('assign wb_s.stall = \'0; // accepts a request in every cycle')
         
         latches = SvCodeFormatter(parent=impl_register)
         for reg in self.registers.registers:
-            if self.is_event(reg.regtype):
-                for field in reg.fields:
-                    _,f_size,_ = self.get_field_size(field)
-                    if f_size > 1:
-                        raise ValueError(f'Field {reg.name}.{field.name} must be exactly one bit wide, as it is in an event-type register')
-                    portname = self.get_varname(reg, field, VarnameType.Port)
-                    regname_delay = self.get_varname(reg, field, VarnameType.DelayRegister)
-                    regname_latch = self.get_varname(reg, field, VarnameType.LatchRegister)
-                    latches.add(f'{regname_delay} <= {portname}; // latch current state')
-                    if FieldChangeType.Rising in field.trigger_on:
-                        with latches.block(f'if (({portname} == 1) && ({regname_delay} == 0))', ' // rising edge', begin=False, end=False, blank_at_end=False):
-                            latches.add(f'{regname_latch} <= 1;')
-                    if FieldChangeType.Falling in field.trigger_on:
-                        with latches.block(f'if (({portname} == 0) && ({regname_delay} == 1))', ' // falling edge', begin=False, end=False, blank_at_end=False):
-                            latches.add(f'{regname_latch} <= 1;')
-                    if FieldChangeType.High in field.trigger_on:
-                        with latches.block(f'if ({portname} == 1)', ' // high', begin=False, end=False, blank_at_end=False):
-                            latches.add(f'{regname_latch} <= 1;')
-                    if FieldChangeType.Low in field.trigger_on:
-                        with latches.block(f'if ({portname} == 0)', ' // low', begin=False, end=False, blank_at_end=False):
-                            latches.add(f'{regname_latch} <= 1;')
-            else:
-                for field in reg.fields:
-                    if field.trigger_on != 0:
-                        raise ValueError(f'Field {reg.name}.{field.name} cannot have an event type set (only valid for event type registers)')
+            if reg.event:
+                # the latches of a register only depend on these inputs, so they are rendered once and re-used (e.g. when regenerating)
+                def gen_latches(latches: SvCodeFormatter):
+                    for field in reg.fields:
+                        portname = self.get_varname(reg, field, VarnameType.Port)
+                        regname_delay = self.get_varname(reg, field, VarnameType.DelayRegister)
+                        regname_latch = self.get_varname(reg, field, VarnameType.LatchRegister)
+                        latches.add(f'{regname_delay} <= {portname}; // latch current state')
+                        if FieldChangeType.Rising in field.trigger_on:
+                            with latches.block(f'if (({portname} == 1) && ({regname_delay} == 0))', ' // rising edge', begin=False, end=False, blank_at_end=False):
+                                latches.add(f'{regname_latch} <= 1;')
+                        if FieldChangeType.Falling in field.trigger_on:
+                            with latches.block(f'if (({portname} == 0) && ({regname_delay} == 1))', ' // falling edge', begin=False, end=False, blank_at_end=False):
+                                latches.add(f'{regname_latch} <= 1;')
+                        if FieldChangeType.High in field.trigger_on:
+                            with latches.block(f'if ({portname} == 1)', ' // high', begin=False, end=False, blank_at_end=False):
+                                latches.add(f'{regname_latch} <= 1;')
+                        if FieldChangeType.Low in field.trigger_on:
+                            with latches.block(f'if ({portname} == 0)', ' // low', begin=False, end=False, blank_at_end=False):
+                                latches.add(f'{regname_latch} <= 1;')
+                latches.fragment((self.fmt, reg), gen_latches)
         if latches.get_numbert_of_content_lines() > 0:
             impl_register.add('// event latches')
             impl_register.add(latches)
             impl_register.blank()
             
-        def gen_reg_code(write: bool, target: SvIfBlock):
-            with target.ifblock() as ifblk:
-                for i_reg,reg in enumerate(self.registers.registers):
-                    if reg.regtype not in [RegType.Write, RegType.WriteRead, RegType.Read, RegType.Strobe, RegType.Handshake, RegType.ReadEvent]:
-                        raise Exception(f'Invalid regtype: {reg.regtype}')
+        def gen_reg_code(write: bool, target: SvIfBlock, registers: "list[CompiledRegister]" = None, dat_r: str = 'wb_dat_r', op: str = '<=', data: bool = True, side_effects: bool = True, adr: str = 'wb_s.adr'):
+            if registers is None:
+                registers = self.registers.registers
+            if self.fmt.address_decoder == AddressDecoder.UniqueCase:
+                decoder = target.case(adr, unique=True, blank_after=False)
+            elif self.fmt.address_decoder == AddressDecoder.IfElse:
+                decoder = target.ifblock()
+            else:
+                raise ValueError(f'Invalid address decoder: {self.fmt.address_decoder}')
+            with decoder:
+                for i_reg,reg in enumerate(registers):
+                    if reg.is_array():
+                        continue # arrays have their own decoder
 
                     addr = reg.get_relative_address()
 
@@ -260,88 +327,118 @@ class RegisterSvGeneratorHelper:
                     
                     adr_lo = int(math.ceil(math.log2(self.registers.port_size//8)))
 
-                    with ifblk.ifthen(f'wb_s.adr== (\'h{addr:X} >> {adr_lo})'):
-                        ifsub = ifblk.sub()
+                    if self.fmt.address_decoder == AddressDecoder.UniqueCase:
+                        with decoder.item(f'\'h{addr>>adr_lo:X}', f' // {reg.name}'):
+                            ifsub = decoder.sub(blank_after=False)
+                    else:
+                        with decoder.ifthen(f'{adr}== (\'h{addr:X} >> {adr_lo})'):
+                            ifsub = decoder.sub()
                     
-                    added_field_code = False
-                    bits_in_use = 0
-                    for field in reg.fields:
-                        f_hi,f_lo = field.bits[0], field.bits[-1]
-
-                        for bit_offset in range(f_lo, f_hi+1):
-                            mask = 1 << bit_offset
-                            if bits_in_use & mask != 0:
-                                raise RuntimeError(f'Field {reg.name}.{field.name} overlaps with other fields')
-                            bits_in_use |= mask
-
-                        bytewise = write or self.is_event(reg.regtype)
-                        if bytewise:
-                            bit_ranges = list(zip(list(range(7, self.registers.port_size, 8)), list(range(0, self.registers.port_size-7, 8))))
-                        else:
-                            bit_ranges = [(self.registers.port_size-1,0)]
-
-                        if f_hi >= self.registers.port_size:
-                            raise Exception(f'Field {reg.name}.{field.name} is wider than the register size')
+                    # the body only depends on these inputs, so it is rendered once and re-used (e.g. when regenerating with unchanged registers)
+                    def gen_body(ifsub: SvCodeFormatter):
+                        added_field_code = False
+                        for field in reg.fields:
+                            f_hi,f_lo = field.msb, field.offset
+
+                            bytewise = write or reg.event
+                            if bytewise:
+                                bit_ranges = [(lane*8+7, lane*8) for lane in field.byte_lanes]
+                            else:
+                                bit_ranges = [(self.registers.port_size-1,0)]
                         
-                        regname = self.get_varname(reg, field, VarnameType.Register)
+                            regname = self.get_varname(reg, field, VarnameType.Register)
                         
-                        for bit_hi,bit_lo in bit_ranges:
+                            for bit_hi,bit_lo in bit_ranges:
                             
-                            i_byte = bit_lo//8
+                                i_byte = bit_lo//8
 
-                            wb_slice_lo = max(bit_lo, f_lo)
-                            wb_slice_hi = min(bit_hi, f_hi)
+                                wb_slice_lo = max(bit_lo, f_lo)
+                                wb_slice_hi = min(bit_hi, f_hi)
 
-                            if wb_slice_hi >= wb_slice_lo:
+                                if wb_slice_hi >= wb_slice_lo:
 
-                                field_slice_lo = wb_slice_lo - f_lo
-                                field_slice_hi = wb_slice_hi - f_lo
+                                    field_slice_lo = wb_slice_lo - f_lo
+                                    field_slice_hi = wb_slice_hi - f_lo
 
-                                def get_slice_code(hi, lo, totsize):
-                                    if totsize <= 1:
-                                        return ''
-                                    elif hi>lo:
-                                        return f'[{hi}:{lo}]'
-                                    else:
-                                        return f'[{lo}]'
+                                    def get_slice_code(hi, lo, totsize):
+                                        if totsize <= 1:
+                                            return ''
+                                        elif hi>lo:
+                                            return f'[{hi}:{lo}]'
+                                        else:
+                                            return f'[{lo}]'
 
-                                f_slice = get_slice_code(field_slice_hi, field_slice_lo, f_hi-f_lo+1)
-                                wb_slice = get_slice_code(wb_slice_hi, wb_slice_lo, self.registers.port_size)
+                                    f_slice = get_slice_code(field_slice_hi, field_slice_lo, f_hi-f_lo+1)
+                                    wb_slice = get_slice_code(wb_slice_hi, wb_slice_lo, self.registers.port_size)
                                 
-                                if (not write) and self.is_event(reg.regtype):
-                                    regname_latch = self.get_varname(reg, field, VarnameType.LatchRegister)
-                                    ifsub.add(f'wb_dat_r{wb_slice} <= {regname_latch};')
-                                    with ifsub.block(f'if (wb_s.sel[{i_byte}])', begin=False, end=False, blank_at_end=False):
-                                        ifsub.add(f'{regname_latch} <= 0; // clear latch on read')
-                                    added_field_code = True
-                                elif write and self.is_writable(reg.regtype):
-                                    regname = self.get_varname(reg, field, VarnameType.Register)
-                                    with ifsub.block(f'if (wb_s.sel[{i_byte}])', begin=False, end=False, blank_at_end=False):
-                                        ifsub.add(f'{regname}{f_slice} <= wb_s.dat_ms{wb_slice};')
-                                    added_field_code = True
-                                elif (not write) and self.is_readable(reg.regtype):
-                                    if self.is_writable(reg.regtype):
+                                    if (not write) and reg.event:
+                                        regname_latch = self.get_varname(reg, field, VarnameType.LatchRegister)
+                                        if data:
+                                            ifsub.add(f'{dat_r}{wb_slice} {op} {regname_latch};')
+                                        if side_effects:
+                                            with ifsub.block(f'if (wb_s.sel[{i_byte}])', begin=False, end=False, blank_at_end=False):
+                                                ifsub.add(f'{regname_latch} <= 0; // clear latch on read')
+                                        added_field_code = True
+                                    elif write and (reg.writable or reg.strobed):
                                         regname = self.get_varname(reg, field, VarnameType.Register)
-                                    else:
-                                        regname = self.get_varname(reg, field, VarnameType.Port)
-                                    ifsub.add(f'wb_dat_r{wb_slice} <= {regname}{f_slice};')
-                                    added_field_code = True
+                                        with ifsub.block(f'if (wb_s.sel[{i_byte}])', begin=False, end=False, blank_at_end=False):
+                                            ifsub.add(f'{regname}{f_slice} <= wb_s.dat_ms{wb_slice};')
+                                        added_field_code = True
+                                    elif (not write) and (reg.readable or reg.event):
+                                        if reg.writable or reg.strobed:
+                                            regname = self.get_varname(reg, field, VarnameType.Register)
+                                        else:
+                                            regname = self.get_varname(reg, field, VarnameType.Port)
+                                        if data:
+                                            ifsub.add(f'{dat_r}{wb_slice} {op} {regname}{f_slice};')
+                                        added_field_code = True
                         
-                    if added_field_code and self.is_strobed_after_write(reg.write_event):
-                        is_latch = reg.write_event==WriteEventType.StrobeAfterWriteOnCycleEnd
-                        regname = self.get_strobe_varname(reg.name, False, is_latch)
-                        ifsub.add(f'{regname} <= 1;')
+                        if added_field_code and side_effects and self.is_strobed_after_write(reg.write_event):
+                            is_latch = reg.write_event==WriteEventType.StrobeAfterWriteOnCycleEnd
+                            regname = self.get_strobe_varname(reg.name, False, is_latch)
+                            ifsub.add(f'{regname} <= 1;')
+                    ifsub.fragment((self.registers.port_size, self.fmt, reg, write, dat_r, op, data, side_effects), gen_body)
+
+                if self.fmt.address_decoder == AddressDecoder.UniqueCase:
+                    with decoder.default(' // unmapped address'):
+                        pass
 
         with impl_register.block('if (wb_s.stb)', ' // access-strobe'):
             with impl_register.ifblock() as ifblk:
                 with ifblk.ifthen('wb_s.we', ' // write-access'):
                     gen_reg_code(write=True, target=ifblk)
-                with ifblk.elsethen(' // read-access'):
-                    gen_reg_code(write=False, target=ifblk)
-            impl_register.add(f'ack_r <= 1;')
+                if n_stages > 0 and pipelined:
+                    with ifblk.elsethen(' // read-access'):
+                        for i_bank,bank in enumerate(read_banks):
+                            gen_reg_code(write=False, target=ifblk, registers=bank, dat_r=f'rd_bank{i_bank}_r')
+                elif n_stages > 0:
+                    with ifblk.ifthen('~rd_busy_w', ' // read-access'):
+                        ifblk.add('rd_valid_r[0] <= 1;')
+                        for i_bank,bank in enumerate(read_banks):
+                            gen_reg_code(write=False, target=ifblk, registers=bank, dat_r=f'rd_bank{i_bank}_r')
+                elif comb_read:
+                    if len(side_effect_regs) > 0:
+                        with ifblk.elsethen(' // read-access'):
+                            gen_reg_code(write=False, target=ifblk, registers=side_effect_regs, data=False)
+                elif burst:
+                    # a read in the acknowledge cycle would be discarded, so only words that are acknowledged next are read
+                    with ifblk.ifthen('~ack_r | burst_next_w', ' // read-access; during bursts, the next word is read ahead, unless reading it has side effects'):
+                        gen_reg_code(write=False, target=ifblk, adr='rd_adr_w')
+                else:
+                    with ifblk.elsethen(' // read-access'):
+                        gen_reg_code(write=False, target=ifblk)
+            if n_stages > 0 and pipelined:
+                impl_register.add(f'rd_valid_r[0] <= 1; // writes pass the pipeline too, to keep acknowledges in order')
+            elif burst:
+                impl_register.add(f'ack_r <= ~wb_s.we & (~ack_r | burst_next_w);')
+            elif n_stages == 0 and not comb_read:
+                impl_register.add(f'ack_r <= 1;')
 
         impl_register.blank()
         with impl_register.block('if (~wb_s.cyc)'):
+            if n_stages > 0:
+                impl_register.add(f'rd_valid_r <= \'0; // abort pending reads')
+                impl_register.add(f'ack_r <= 0;')
             for reg in self.registers.registers:
                 if reg.write_event==WriteEventType.StrobeAfterWriteOnCycleEnd:
                     regname = self.get_strobe_varname(reg.name, False)
@@ -349,8 +446,169 @@ class RegisterSvGeneratorHelper:
                     impl_register.add(f'{regname} <= {regname_latch};')
                     impl_register.add(f'{regname_latch} <= 0;')
 
-        self.implementation = impl.generate()
-        self.instance = templ.generate()
+        if comb_read:
+            read_mux = SvCodeFormatter(parent=impl_outputs)
+            with read_mux.always_comb(blank_at_end=False):
+                read_mux.add(f'wb_dat_c = {self.registers.port_size}\'h0;')
+                readable_regs = [reg for reg in self.registers.registers if reg.readable or reg.event]
+                gen_reg_code(write=False, target=read_mux, registers=readable_regs, dat_r='wb_dat_c', op='=', side_effects=False)
+            impl_outputs.blank()
+            impl_outputs.add('// combinational read path')
+            impl_outputs.add(read_mux)
+
+        if burst:
+            impl_outputs.blank()
+            impl_outputs.add('// burst address generation')
+            with impl_outputs.always_comb(blank_at_end=False):
+                bursts = impl_outputs.case('wb_s.bte', blank_after=False)
+                with bursts:
+                    for bte,wrap in [('2\'b01', 4), ('2\'b10', 8), ('2\'b11', 16)]:
+                        with bursts.item(bte, f' // {wrap}-beat wrap burst'):
+                            bursts.add(f'burst_adr_w = (wb_s.adr & ~\'h{wrap-1:X}) | ((wb_s.adr + 1) & \'h{wrap-1:X});')
+                    with bursts.default(' // linear burst'):
+                        bursts.add('burst_adr_w = wb_s.adr + 1;')
+                impl_outputs.add('rd_adr_w = burst_next_w ? burst_adr_w : wb_s.adr;')
+
+        self.implementation = impl
+        self.instance = templ
+
+
+    def get_read_banks(self) -> "list[list[CompiledRegister]]":
+        readable = [reg for reg in self.registers.registers if (reg.readable or reg.event) and not reg.is_array()]
+        if self.fmt.read_bank_size is not None:
+            if self.fmt.read_bank_size < 1:
+                raise ValueError(f'Invalid read bank size: {self.fmt.read_bank_size}')
+            bank_size = self.fmt.read_bank_size
+        else:
+            # balance the bank multiplexers against the OR-tree levels
+            bank_size = max(2, math.ceil(len(readable) ** (1 / (self.fmt.read_pipeline_stages+1))))
+        return [readable[i:i+bank_size] for i in range(0, len(readable), bank_size)]
+
+
+    def gen_read_pipeline(self, read_banks: "list[list[CompiledRegister]]", declarations: SvCodeFormatter, register: SvAlwaysFf):
+        n_stages = self.fmt.read_pipeline_stages
+        w = self.registers.port_size
+
+        declarations.add(f'reg[{n_stages-1}:0] rd_valid_r;')
+        if not self.registers.pipelined:
+            declarations.add(f'wire rd_busy_w = (|rd_valid_r) | ack_r;')
+        register.reset.add(f'rd_valid_r <= \'0;')
+
+        register.add('// read pipeline')
+        register.add(f'ack_r <= rd_valid_r[{n_stages-1}];')
+        if n_stages > 1:
+            register.add(f'rd_valid_r <= {{rd_valid_r[{n_stages-2}:0], 1\'b0}};')
+        else:
+            register.add(f'rd_valid_r <= 1\'b0;')
+        
+        stage = []
+        for i_bank in range(len(read_banks)):
+            regname = f'rd_bank{i_bank}_r'
+            declarations.add(f'reg[{w-1}:0] {regname};')
+            register.reset.add(f'{regname} <= {w}\'h0;')
+            register.add(f'{regname} <= {w}\'h0;')
+            stage.append(regname)
+        
+        for level in range(1, n_stages):
+            fan_in = max(2, math.ceil(len(stage) ** (1 / (n_stages-level+1))))
+            next_stage = []
+            for i_group,i in enumerate(range(0, len(stage), fan_in)):
+                regname = f'rd_or{level}_{i_group}_r'
+                declarations.add(f'reg[{w-1}:0] {regname};')
+                register.reset.add(f'{regname} <= {w}\'h0;')
+                register.add(f'{regname} <= ' + ' | '.join(stage[i:i+fan_in]) + ';')
+                next_stage.append(regname)
+            stage = next_stage
+        
+        if len(stage) > 0:
+            register.add(f'wb_dat_r <= ' + ' | '.join(stage) + ';')
+        else:
+            register.add(f'wb_dat_r <= {w}\'h0;')
+        register.blank()
+
+
+    def gen_array(self, reg: CompiledRegister, module: SvModule, templ_inst: SvInstance, declarations: SvCodeFormatter, target: SvCodeFormatter, rd_adr: str) -> str:
+        """ Implements a register array as block RAM; returns the expression of its read data for the Wishbone data output """
+        
+        w = self.registers.port_size
+        adr_lo = clog2(w//8)
+        idx_bits = max(1, clog2(reg.count))
+        base = reg.get_relative_address()
+        name = self.signal_name(reg.name)
+        mem, addr_port, we_port = f'{name}_mem', f'{name}_addr_i', f'{name}_we_i'
+        hw_writes = not (reg.writable or reg.strobed)
+
+        module.ports.add(f'// Register array {reg.name} ({reg.count} entries)')
+        templ_inst.signals.add(f'// Register array {reg.name} ({reg.count} entries)')
+        module.ports.add_comma(f'input[{idx_bits-1}:0] {addr_port}')
+        templ_inst.map_signal(addr_port, '__SIGNAL_PLACEHOLDER__')
+        if hw_writes:
+            module.ports.add_comma(f'input {we_port}')
+            templ_inst.map_signal(we_port, '__SIGNAL_PLACEHOLDER__')
+        
+        declarations.blank()
+        # one port for the Wishbone bus (reads and writes share its address; during writes, <rd_adr> equals the Wishbone address),
+        #   one port for the hardware; so the array can be inferred as a dual-port block RAM
+        declarations.add(f'reg[{w-1}:0] {mem}[{reg.count}]; // register array {reg.name}, inferred as dual-port block RAM')
+        declarations.add(f'reg[{w-1}:0] {name}_rd_r;')
+        declarations.add(f'reg {name}_hit_r;')
+        declarations.add(f'wire {name}_sel_w = ({rd_adr} >> {idx_bits}) == (\'h{base:X} >> {adr_lo+idx_bits});')
+        declarations.add(f'wire[{idx_bits-1}:0] {name}_idx_w = {rd_adr};')
+        if hw_writes:
+            declarations.add(f'logic[{w-1}:0] {name}_hw_wdata_w;')
+        else:
+            declarations.add(f'reg[{w-1}:0] {name}_hw_rd_r;')
+        
+        default = 0
+        hw_outputs = []
+        for field in reg.fields:
+            f_lo,f_hi = field.offset, field.msb
+            f_dim = f'[{f_hi-f_lo}:0]' if f_hi>f_lo else ''
+            w_slice = f'[{f_hi}:{f_lo}]' if f_hi>f_lo else f'[{f_lo}]'
+            portname = self.get_varname(reg, field, VarnameType.Port)
+            if hw_writes:
+                module.ports.add_comma(f'input{f_dim} {portname}')
+            else:
+                module.ports.add_comma(f'output{f_dim} {portname}')
+                hw_outputs.append(f'assign {portname} = {name}_hw_rd_r{w_slice};')
+            templ_inst.map_signal(portname, '__SIGNAL_PLACEHOLDER__')
+            default |= (field.default << f_lo) & field.bitmask
+        
+        if default != 0:
+            with target.block('initial'):
+                with target.block(f'for (int i = 0; i < {reg.count}; i++)', begin=False, end=False, blank_at_end=False):
+                    target.add(f'{mem}[i] = {w}\'h{default:X};')
+        
+        if hw_writes:
+            with target.always_comb():
+                target.add(f'{name}_hw_wdata_w = \'0;')
+                for field in reg.fields:
+                    w_slice = f'[{field.msb}:{field.offset}]' if field.msb>field.offset else f'[{field.offset}]'
+                    target.add(f'{name}_hw_wdata_w{w_slice} = {self.get_varname(reg, field, VarnameType.Port)};')
+        
+        with target.block('always_ff @(posedge clk_i)', f' // block RAM of register array {reg.name}'):
+            if hw_writes:
+                with target.block(f'if ({we_port})', ' // hardware write port', begin=False, end=False, blank_at_end=False):
+                    target.add(f'{mem}[{addr_port}] <= {name}_hw_wdata_w;')
+            else:
+                with target.block(f'if (wb_s.stb & wb_s.we & {name}_sel_w)', ' // Wishbone write port'):
+                    for i_byte in range(w//8):
+                        with target.block(f'if (wb_s.sel[{i_byte}])', begin=False, end=False, blank_at_end=False):
+                            target.add(f'{mem}[{name}_idx_w][{i_byte*8+7}:{i_byte*8}] <= wb_s.dat_ms[{i_byte*8+7}:{i_byte*8}];')
+                target.add(f'{name}_hw_rd_r <= {mem}[{addr_port}]; // hardware read port')
+            if reg.readable or reg.event:
+                target.add(f'{name}_rd_r <= {mem}[{name}_idx_w]; // Wishbone read port')
+                target.add(f'{name}_hit_r <= wb_s.stb & ~wb_s.we & {name}_sel_w;')
+            else:
+                target.add(f'{name}_rd_r <= \'0;')
+                target.add(f'{name}_hit_r <= 0;')
+        
+        for line in hw_outputs:
+            target.add(line)
+        if len(hw_outputs) > 0:
+            target.blank()
+        
+        return f'({name}_hit_r ? {name}_rd_r : {w}\'h0)'
 
 
     def has_any_strobed_regs(self):
@@ -377,12 +635,14 @@ class RegisterSvGeneratorHelper:
                 r_comment = 'event read-only'
             else:
                 raise Exception(f'Unknown regtype: {field["regtype"]}')
-            result.append(f'0x{reg.get_relative_address():08X}: <{reg.name}> ({r_comment}) {reg.description}')
+            if reg.is_array():
+                result.append(f'0x{reg.get_relative_address():08X}: <{reg.name}[{reg.count}]> ({r_comment}, array) {reg.description}')
+            else:
+                result.append(f'0x{reg.get_relative_address():08X}: <{reg.name}> ({r_comment}) {reg.description}')
             if reg.comment:
                 result.append(f'    {reg.comment}')
             for field in reg.fields:
-                f_lo,_,f_hi = self.get_field_size(field)
-                result.append(f'    [{f_hi}:{f_lo}]: <{field.name}> {field.description}')
+                result.append(f'    [{field.msb}:{field.offset}]: <{field.name}> {field.description}')
                 if field.comment:
                     result.append(f'        {field.comment}')
         return result
@@ -392,7 +652,7 @@ class RegisterSvGeneratorHelper:
         
         max_byteaddr = 0
         for reg in self.registers.registers:
-            max_byteaddr = max(max_byteaddr, reg.get_relative_address())
+            max_byteaddr = max(max_byteaddr, reg.get_relative_address() + (reg.count-1)*(self.registers.port_size//8))
 
         addr_lo = clog2(self.registers.port_size//8)
         addr_hi = max(addr_lo, clog2(max_byteaddr+1)-1)
@@ -400,15 +660,6 @@ class RegisterSvGeneratorHelper:
         return max_byteaddr, addr_lo, addr_hi
 
 
-    def perform_pre_checks(self):
-        if self.registers.port_size not in [8, 16, 32, 64]:
-            raise Exception(f'Invalid register size: {self.registers.port_size}')
-
-    
-    def is_signed(self, fieldtype):
-        return fieldtype in [FieldType.Signed8Bit, FieldType.Signed16Bit, FieldType.Signed32Bit, FieldType.Signed64Bit]
-
-
     def is_strobed(self, regtype):
         return regtype in [RegType.Strobe, RegType.Handshake]
 
@@ -417,16 +668,16 @@ class RegisterSvGeneratorHelper:
         return regtype in [RegType.Handshake]
 
 
-    def is_writable(self, regtype):
-        return regtype in [RegType.Write, RegType.WriteRead, RegType.Strobe, RegType.Handshake]
+    def module_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
 
+    def signal_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.snake_case)
 
-    def is_readable(self, regtype):
-        return regtype in [RegType.WriteRead, RegType.Read, RegType.ReadEvent]
+    def placeholder_name(self, name: str) -> str:
+        return self.registers.symbols.name(name, NamingConvention.CONSTANT_CASE)
 
 
-    def is_event(self, regtype):
-        return regtype in [RegType.ReadEvent]
 
 
     def is_strobed_after_write(self, regevent):
@@ -440,21 +691,13 @@ class RegisterSvGeneratorHelper:
             sigil = '_latch_o'
         else:
             sigil = '_r'
-        return f'{self.fmt.strobed_prefix}{signal_name(reg_name)}_access{self.fmt.strobed_suffix}{sigil}'
+        return f'{self.fmt.strobed_prefix}{self.signal_name(reg_name)}_access{self.fmt.strobed_suffix}{sigil}'
 
     
-    def get_field_size(self, field: Field) -> "tuple(int,int,int)":
-        
-        f_hi,f_lo = field.bits[0], field.bits[-1]
-        f_size = f_hi - f_lo + 1
-
-        return f_lo, f_size, f_hi
-
-
-    def get_varname(self, reg: Register, field: Field, var_type: VarnameType) -> str:
+    def get_varname(self, reg: CompiledRegister, field: CompiledField, var_type: VarnameType) -> str:
 
-        _,f_size,_ = self.get_field_size(field)
-        name = signal_name(f'{reg.name}_{field.name}')
+        f_size = field.size
+        name = self.signal_name(f'{reg.name}_{field.name}')
 
         if self.is_handshake(reg.regtype):
             if var_type == VarnameType.AckPort:
@@ -481,7 +724,7 @@ class RegisterSvGeneratorHelper:
         if var_type == VarnameType.Port or var_type == VarnameType.AckPort:
             if self.is_handshake(reg.regtype) and var_type == VarnameType.AckPort:
                 sigil = '_i'
-            elif self.is_writable(reg.regtype):
+            elif reg.writable or reg.strobed:
                 sigil = '_o'
             else:
                 sigil = '_i'
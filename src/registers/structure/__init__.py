@@ -1 +1,3 @@
 from .types import RegisterSet, Register, RegType, Field, FieldFunction, FieldType, FieldChangeType, WriteEventType
+from .layout import RegisterLayout, FieldLayout
+from .compiled import CompiledRegisterSet, CompiledRegister, CompiledField, as_compiled
\ No newline at end of file
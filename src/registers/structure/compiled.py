@@ -0,0 +1,269 @@
+from ...tools import check_names, SymbolTable
+from .types import RegisterSet, RegType, FieldType, FieldFunction, FieldChangeType, WriteEventType
+
+import dataclasses
+import hashlib
+import typing
+
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledField:
+    """ A validated field, including its bit layout """
+
+    name: str
+    description: str
+    comment: typing.Optional[str]
+    bits: "tuple[int,...]"
+    datatype: FieldType
+    functions: FieldFunction
+    default: int
+    trigger_on: FieldChangeType
+
+    offset: int
+    size: int
+    bitmask: int
+    wordmask: int
+    byte_lanes: "tuple[int,...]"
+    overlaps: bool
+    exclusive_lanes: bool
+
+
+    @property
+    def msb(self) -> int:
+        return self.offset + self.size - 1
+
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledRegister:
+    """ A validated register, with its final address and access flags """
+
+    name: str
+    description: str
+    comment: typing.Optional[str]
+    regtype: RegType
+    write_event: typing.Optional[WriteEventType]
+    count: int
+    fields: "tuple[CompiledField,...]"
+
+    rel_adr: int
+    abs_adr: int
+    window_size: int
+
+    """ the software can read the register (Read, WriteRead) """
+    readable: bool
+    """ the software can write the register (Write, WriteRead) """
+    writable: bool
+    """ the register contains strobes (Strobe, Handshake) """
+    strobed: bool
+    """ the register latches events (ReadEvent) """
+    event: bool
+    """ the software keeps a shadow copy that is loaded from hardware """
+    need_shadow_read: bool
+    """ the software keeps a shadow copy that is flushed to hardware """
+    need_shadow_write: bool
+
+
+    def is_array(self) -> bool:
+        return self.count > 1
+
+
+    def get_relative_address(self) -> int:
+        return self.rel_adr
+
+
+    def get_absolute_address(self) -> int:
+        return self.abs_adr
+
+
+    def get_window_size(self, port_size: int) -> int:
+        return self.window_size
+
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class CompiledRegisterSet:
+    """
+    Immutable, validated model of a RegisterSet, from which all register generators work
+
+    Create it with RegisterSet.compile(). It is picklable, and hashing or comparing it only
+    looks at a digest of its contents, so it is cheap to use as a cache key or to send to
+    worker processes.
+    """
+
+    name: str
+    base_address: int
+    port_size: int
+    pipelined: bool
+    burst: bool
+    registers: "tuple[CompiledRegister,...]"
+    address_bits: "tuple[int,int]"
+    digest: str = dataclasses.field(default='', repr=False)
+    """ source code names of the register set, registers and fields; shared by all generators """
+    symbols: typing.Optional[SymbolTable] = dataclasses.field(default=None, repr=False)
+
+
+    def __post_init__(self):
+        if self.digest == '':
+            content = repr((self.name, self.base_address, self.port_size, self.pipelined, self.burst, self.registers, self.address_bits))
+            object.__setattr__(self, 'digest', hashlib.sha256(content.encode('utf-8')).hexdigest())
+
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CompiledRegisterSet):
+            return NotImplemented
+        return self.digest == other.digest
+
+
+    def get_base_address(self) -> int:
+        return self.base_address
+
+
+    def granularity(self) -> int:
+        return 8
+
+
+    def address_bit_range(self) -> "tuple[int,int]":
+        return self.address_bits
+
+
+    def compile(self) -> "CompiledRegisterSet":
+        return self
+
+
+
+def as_compiled(registers: "RegisterSet|CompiledRegisterSet") -> CompiledRegisterSet:
+    """ Returns <registers> if it is compiled already, otherwise compiles it """
+    if isinstance(registers, CompiledRegisterSet):
+        return registers
+    return compile_register_set(registers)
+
+
+
+def compile_register_set(regset: RegisterSet) -> CompiledRegisterSet:
+    """ Validates <regset> in a single pass, and returns its compiled representation """
+
+    check_names(regset)
+    symbols = _make_symbols(regset)
+    regset.check()
+    if regset.port_size not in [8, 16, 32, 64]:
+        raise Exception(f'Invalid register size: {regset.port_size}')
+
+    layout = regset.get_layout()
+    registers = []
+    for reg in regset.registers:
+
+        if reg.regtype not in [RegType.Write, RegType.WriteRead, RegType.Read, RegType.Strobe, RegType.Handshake, RegType.ReadEvent]:
+            raise Exception(f'Invalid regtype: {reg.regtype}')
+        r_readable = reg.regtype in [RegType.Read, RegType.WriteRead]
+        r_writable = reg.regtype in [RegType.Write, RegType.WriteRead]
+        r_strobed = reg.regtype in [RegType.Strobe, RegType.Handshake]
+        r_event = reg.regtype in [RegType.ReadEvent]
+
+        fields = []
+        need_shadow_read = need_shadow_write = False
+        for fl in layout.fields(reg):
+            field = fl.field
+            functions = _combine_functions(field.functions)
+            trigger_on = FieldChangeType(field.trigger_on)
+            _check_field(regset, reg, field, fl, functions, trigger_on, r_readable, r_writable, r_strobed, r_event)
+
+            if FieldFunction.ReadShadow in functions and (r_readable or r_event):
+                need_shadow_read = True
+            if FieldFunction.WriteShadow in functions and r_writable:
+                need_shadow_write = True
+
+            fields.append(CompiledField(field.name, field.description, field.comment, tuple(field.bits), field.datatype, functions, field.default, trigger_on,
+                fl.offset, fl.size, fl.bitmask, fl.wordmask, fl.byte_lanes, fl.overlaps, fl.exclusive_lanes))
+
+        if r_strobed:
+            need_shadow_read = need_shadow_write = False
+        if reg.is_array() and (need_shadow_read or need_shadow_write):
+            raise TypeError(f'Register {regset.name}.{reg.name} is an array, which does not support shadow functions')
+
+        registers.append(CompiledRegister(reg.name, reg.description, reg.comment, reg.regtype, reg.write_event, reg.count, tuple(fields),
+            reg.get_relative_address(), reg.get_absolute_address(), reg.get_window_size(regset.port_size),
+            r_readable, r_writable, r_strobed, r_event, need_shadow_read, need_shadow_write))
+
+    return CompiledRegisterSet(regset.name, regset.get_base_address(), regset.port_size, regset.pipelined, regset.burst, tuple(registers), regset.address_bit_range(),
+        symbols=symbols)
+
+
+
+def _make_symbols(regset: RegisterSet) -> SymbolTable:
+    """ Declares all names that the generators derive identifiers from, so that ambiguous names are reported before generating anything """
+
+    symbols = SymbolTable(regset.name)
+    for reg in regset.registers:
+        reg_id = symbols.declare('registers', reg.name)
+        for field in reg.fields:
+            field_id = symbols.declare(f'fields of {reg.name}', field.name)
+            owner = f'{reg.name}.{field.name}'
+            # HDL signals mangle the combined name, the software accessors combine the mangled names
+            symbols.claim('signals', symbols.name(f'{reg.name}_{field.name}'), owner)
+            symbols.claim('accessors', f'{reg_id}_{field_id}', owner)
+    return symbols
+
+
+
+def _combine_functions(functions: "FieldFunction|list[FieldFunction]") -> FieldFunction:
+    if isinstance(functions, FieldFunction):
+        return functions
+    result = FieldFunction(0)
+    for function in functions:
+        result |= function
+    return result
+
+
+
+def _check_field(regset, reg, field, fl, functions, trigger_on, r_readable, r_writable, r_strobed, r_event):
+
+    name = f'{regset.name}.{reg.name}.{field.name}'
+
+    if fl.overlaps:
+        raise RuntimeError(f'Field {reg.name}.{field.name} overlaps with other fields')
+    if fl.msb >= regset.port_size:
+        raise Exception(f'Field {name} is wider than the bus')
+
+    if field.datatype in [FieldType.Signed8Bit, FieldType.Signed16Bit, FieldType.Signed32Bit, FieldType.Signed64Bit]:
+        f_val_min, f_val_max = -(1<<(fl.size-1)), (1<<(fl.size-1))-1
+    else:
+        f_val_min, f_val_max = 0, (1<<fl.size)-1
+    if field.default is not None and (field.default < f_val_min or field.default > f_val_max):
+        raise Exception(f'Default <{field.default}> for field {name} is out of range {f_val_min}..{f_val_max}')
+
+    if r_event:
+        if fl.size > 1:
+            raise ValueError(f'Field {reg.name}.{field.name} must be exactly one bit wide, as it is in an event-type register')
+    elif trigger_on:
+        raise ValueError(f'Field {reg.name}.{field.name} cannot have an event type set (only valid for event type registers)')
+
+    reg_name = f'{regset.name}.{reg.name}'
+    if FieldFunction.Read in functions:
+        if (not r_readable) and (not r_event):
+            raise TypeError(f'Field {name} cannot do read (register {reg_name} needs read access)')
+    if FieldFunction.ReadShadow in functions:
+        # ReadShadow is still valid if WriteShadow is supported (to read back what was written)
+        if (not r_readable) and (not r_event) and (FieldFunction.WriteShadow not in functions):
+            raise TypeError(f'Field {name} cannot do read (register {reg_name} needs read access)')
+    if FieldFunction.Overwrite in functions or FieldFunction.WriteMasked in functions:
+        if not r_writable:
+            raise TypeError(f'Field {name} cannot do write (register {reg_name} needs write access)')
+    if FieldFunction.ReadModifyWrite in functions:
+        if not r_writable:
+            raise TypeError(f'Field {name} cannot do write (register {reg_name} needs write access)')
+        if r_event:
+            raise TypeError(f'Field {name} cannot do read-modify-write (register {reg_name} is of event type)')
+        if not (r_readable and r_writable):
+            raise TypeError(f'Field {name} cannot do read-modify-write (register {reg_name} needs write+read access)')
+    if FieldFunction.WriteShadow in functions:
+        if not r_writable:
+            raise TypeError(f'Field {name} cannot do write (register {reg_name} needs write access)')
+    if FieldFunction.Strobe in functions:
+        if not r_strobed:
+            raise TypeError(f'Field {name} cannot do strobe (register {reg_name} needs strobe access)')
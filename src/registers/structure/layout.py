@@ -0,0 +1,89 @@
+from .types import RegisterSet, Register, Field
+
+import dataclasses
+
+
+
+@dataclasses.dataclass(frozen=True)
+class FieldLayout:
+
+    field: Field
+
+    """ index of the lowest bit """
+    offset: int
+
+    """ number of bits """
+    size: int
+
+    """ mask of the bits in the register word """
+    bitmask: int
+
+    """ mask of the byte lanes (one bit per byte) the field touches """
+    wordmask: int
+
+    """ indices of the byte lanes the field touches """
+    byte_lanes: "tuple[int,...]"
+
+    """ True if the field shares at least one bit with another field of the same register """
+    overlaps: bool
+
+    """ True if no other field uses any of the field's byte lanes, i.e. it can be written with a byte mask without side-effects """
+    exclusive_lanes: bool
+
+
+    @property
+    def msb(self) -> int:
+        return self.offset + self.size - 1
+
+
+
+class RegisterLayout:
+    """ Bit offsets, masks and byte lanes of all fields of a register set, computed once """
+
+
+    def __init__(self, regset: RegisterSet):
+        self.regset = regset
+        self._fields: "dict[str,list[FieldLayout]]" = {}
+        self._bitmasks: "dict[str,int]" = {}
+        for reg in regset.registers:
+            self._fields[reg.name], self._bitmasks[reg.name] = self._layout_register(reg)
+
+
+    def fields(self, reg: Register) -> "list[FieldLayout]":
+        """ Returns the layouts of all fields of <reg>, in the same order as reg.fields """
+        return self._fields[reg.name]
+
+
+    def bitmask(self, reg: Register) -> "int":
+        """ Returns the mask of all bits of <reg> that are used by any field """
+        return self._bitmasks[reg.name]
+
+
+    def _layout_register(self, reg: Register) -> "tuple[list[FieldLayout],int]":
+
+        # first pass: find bits and byte lanes that are used by more than one field
+        spans = []
+        used_bits = shared_bits = used_lanes = shared_lanes = 0
+        for field in reg.fields:
+            if len(field.bits) == 1:
+                offset, size = field.bits[0], 1
+            else:
+                offset, size = field.bits[1], field.bits[0] - field.bits[1] + 1
+            if size < 1 or offset < 0:
+                raise ValueError(f'Field {self.regset.name}.{reg.name}.{field.name} has invalid bits: {field.bits}')
+
+            bitmask = ((1 << size) - 1) << offset
+            lane_lo, lane_hi = offset // 8, (offset + size - 1) // 8
+            wordmask = ((1 << (lane_hi - lane_lo + 1)) - 1) << lane_lo
+            spans.append((offset, size, bitmask, wordmask, lane_lo, lane_hi))
+
+            shared_bits |= used_bits & bitmask
+            used_bits |= bitmask
+            shared_lanes |= used_lanes & wordmask
+            used_lanes |= wordmask
+
+        result = []
+        for field,(offset, size, bitmask, wordmask, lane_lo, lane_hi) in zip(reg.fields, spans):
+            result.append(FieldLayout(field, offset, size, bitmask, wordmask, tuple(range(lane_lo, lane_hi+1)),
+                overlaps=(bitmask & shared_bits) != 0, exclusive_lanes=(wordmask & shared_lanes) == 0))
+        return result, used_bits
@@ -2,6 +2,7 @@ from ...tools import clog2
 from .types import RegisterSet
 
 import math
+import bisect
 
 
 
@@ -34,40 +35,114 @@ class RegisterSetSolver:
 
     def assign_register_addresses(self):
         
-        reg_addresses_in_use = []
-        next_free_address = 0
-        
-        address_stride = self.regset.port_size // 8
         (bus_adr_lo, _) = self.regset.address_bit_range()
         forbidden_mask = (1 << bus_adr_lo) - 1
         
-        # check assigned addresses
+        # check assigned addresses; collect all problems before reporting them
+        address_map = AddressMap()
+        errors = []
         for reg in self.regset.registers:
             addr = reg._requested_address
             if addr is Ellipsis:
                 continue
+            window_size = reg.get_window_size(self.regset.port_size)
                 
             if (addr & forbidden_mask) != 0:
-                raise RuntimeError(f'Register {reg.name}\' address (0x{addr:08X}) is not aligned with the required bus granularity')
-
-            if addr in reg_addresses_in_use:
-                raise RuntimeError(f'Register {reg.name}\'s address (0x{addr:08X}) is not unique')
-            reg_addresses_in_use.append(addr)
+                errors.append(f'Register {reg.name}\' address (0x{addr:08X}) is not aligned with the required bus granularity')
+                continue
+            if (addr & (window_size-1)) != 0:
+                errors.append(f'Register array {reg.name}\' address (0x{addr:08X}) must be aligned to its window size (0x{window_size:X})')
+                continue
 
-            next_free_address = max(next_free_address, addr + address_stride)
+            overlapping = address_map.find_overlaps(addr, window_size)
+            if len(overlapping) > 0:
+                errors.append(f'Register {reg.name}\'s address (0x{addr:08X}) is not unique (overlaps with {", ".join(overlapping)})')
+                continue
+            address_map.add(reg.name, addr, window_size)
 
             reg._rel_adr = addr
             reg._abs_adr = addr + self.regset.get_base_address()
-
         
+        if len(errors) == 1:
+            raise RuntimeError(errors[0])
+        elif len(errors) > 1:
+            raise RuntimeError(f'{len(errors)} address conflicts in register set {self.regset.name}:\n' + '\n'.join(['- '+e for e in errors]))
+
+        # fill the gaps between assigned addresses first; arrays are aligned to their window size
+        free_space = FreeSpace(address_map)
         for reg in self.regset.registers:
             addr = reg._requested_address
             if addr is not Ellipsis:
                 continue
+            window_size = reg.get_window_size(self.regset.port_size)
                 
-            addr = next_free_address
+            addr = free_space.allocate(window_size, window_size)
             assert (addr & forbidden_mask) == 0
-            next_free_address += address_stride
 
             reg._rel_adr = addr
             reg._abs_adr = addr + self.regset.get_base_address()
+
+
+
+class AddressMap:
+    """ Sorted, non-overlapping address ranges; looking up overlaps is O(log n) """
+
+    def __init__(self):
+        self.starts: "list[int]" = []
+        self.ends: "list[int]" = [] # exclusive
+        self.names: "list[str]" = []
+    
+
+    def find_overlaps(self, start: int, size: int) -> "list[str]":
+        """ Returns the names of all ranges that overlap with [start, start+size) """
+        end = start + size
+        i = bisect.bisect_right(self.starts, start)
+        if i > 0 and self.ends[i-1] > start:
+            i -= 1
+        result = []
+        while i < len(self.starts) and self.starts[i] < end:
+            result.append(self.names[i])
+            i += 1
+        return result
+    
+
+    def add(self, name: str, start: int, size: int):
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, start + size)
+        self.names.insert(i, name)
+
+
+
+class FreeSpace:
+    """ Sorted list of the unused address ranges in an AddressMap, for first-fit allocation """
+
+    def __init__(self, address_map: AddressMap):
+        self.gap_starts: "list[int]" = []
+        self.gap_ends: "list[int]" = [] # exclusive; the last gap is unbounded
+        pos = 0
+        for start,end in zip(address_map.starts, address_map.ends):
+            if start > pos:
+                self.gap_starts.append(pos)
+                self.gap_ends.append(start)
+            pos = max(pos, end)
+        self.gap_starts.append(pos)
+        self.gap_ends.append(None)
+    
+
+    def allocate(self, size: int, alignment: int) -> int:
+        """ Returns the lowest free address that is aligned to <alignment> and has <size> bytes of room """
+        for i,(start,end) in enumerate(zip(self.gap_starts, self.gap_ends)):
+            addr = (start + alignment - 1) & ~(alignment - 1)
+            if end is not None and addr + size > end:
+                continue
+            
+            # split the gap into what is left below and above the allocated range
+            below, above = (start, addr), (addr + size, end)
+            del self.gap_starts[i], self.gap_ends[i]
+            for lo,hi in [above, below]:
+                if hi is None or hi > lo:
+                    self.gap_starts.insert(i, lo)
+                    self.gap_ends.insert(i, hi)
+            return addr
+        assert False, 'the last gap is unbounded'
@@ -110,7 +110,7 @@ class Register:
 
 
     def __init__(self, name: str, description: str, address: "int|Ellipsis", regtype: RegType, fields: list[Field],
-        write_event: WriteEventType = None, comment: str = None):
+        write_event: WriteEventType = None, comment: str = None, count: int = 1):
         """
         name:        
         description: 
@@ -119,10 +119,12 @@ class Register:
         fields:      
         write_event: 
         comment:     
+        count:       Number of entries; if more than 1, this is a register array (implemented as block RAM)
         """
 
         self.name, self.description, self._requested_address, self.regtype, self.fields, self.write_event, self.comment = \
             name, description, address, regtype, fields, write_event, comment
+        self.count = count
         self._rel_adr: typing.Optional[int] = None
         self._abs_adr: typing.Optional[int] = None
     
@@ -137,23 +139,39 @@ class Register:
         if self._abs_adr is None:
             raise RuntimeError('This register was not properly initialized yet. Put it into a RegisterSet first.')
         return self._abs_adr
+    
+
+    def is_array(self) -> bool:
+        return self.count > 1
+    
+
+    def get_window_size(self, port_size: int) -> int:
+        """ Size of the address window, in bytes; arrays occupy a power-of-2 sized window """
+        stride = port_size // 8
+        if not self.is_array():
+            return stride
+        return stride << clog2(self.count)
 
 
 
 class RegisterSet:
 
-    def __init__(self, name: str, base_address: "int|Ellipsis", port_size: int, registers: "list[Register]"):
+    def __init__(self, name: str, base_address: "int|Ellipsis", port_size: int, registers: "list[Register]", pipelined: bool = False, burst: bool = False):
         """
         name:         Name of this register set
         base_address: The address of the 1st register inside of the bus
         port_size:    Port size, in bits (note that granularity will alyways be 8 bit)
         registers:    List of registers within this register set
+        pipelined:    Use Wishbone B4 pipelined mode instead of classic mode
+        burst:        Support registered-feedback bursts (CTI/BTE signals)
         """
 
         self.name, self._requested_base_address, self.port_size, self.registers = name, base_address, port_size, registers
+        self.pipelined, self.burst = pipelined, burst
         
         # this
         self._base_address = Ellipsis
+        self._layout = None
         
         self.check()
         self._update()
@@ -162,6 +180,21 @@ class RegisterSet:
     def _update(self):
         from .regset_solver import RegisterSetSolver
         RegisterSetSolver(self)
+        self._layout = None
+    
+
+    def compile(self) -> "CompiledRegisterSet":
+        """ Validates this register set, and returns an immutable model of it, from which all generators work """
+        from .compiled import compile_register_set
+        return compile_register_set(self)
+    
+
+    def get_layout(self) -> "RegisterLayout":
+        """ Returns the bit layout of all fields; it is computed once, and shared by all generators """
+        if self._layout is None:
+            from .layout import RegisterLayout
+            self._layout = RegisterLayout(self)
+        return self._layout
     
 
     def get_base_address(self) -> int:
@@ -181,6 +214,18 @@ class RegisterSet:
         
         if len(self.registers) != len(set([s.name for s in self.registers])):
             raise RuntimeError(f'Register names must be unique')
+        
+        if self.burst and self.pipelined:
+            raise ValueError(f'Bursts are only supported in classic mode, not in pipelined mode')
+        
+        for reg in self.registers:
+            if reg.count < 1:
+                raise ValueError(f'Register {reg.name} must have a count of at least 1')
+            if reg.is_array():
+                if reg.regtype not in [RegType.Write, RegType.WriteRead, RegType.Read]:
+                    raise ValueError(f'Register array {reg.name} must be of type Write, WriteRead or Read')
+                if reg.write_event is not None:
+                    raise ValueError(f'Register array {reg.name} cannot have a write event')
 
 
     def granularity(self) -> int:
@@ -197,7 +242,9 @@ class RegisterSet:
         Then the adr_in port has the range [3:2], and this method returns (2,3)
         """
         
-        n_regs = len(self.registers)
+        n_regs = sum([reg.count for reg in self.registers])
+        if all([reg._rel_adr is not None for reg in self.registers]):
+            n_regs = max(n_regs, max([reg._rel_adr + reg.get_window_size(self.port_size) for reg in self.registers]) // (self.port_size // 8))
         adr_bits = max(1, int(math.ceil(math.log2(n_regs))))
 
         lowest_bit = clog2(self.port_size // 8)
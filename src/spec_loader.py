@@ -0,0 +1,296 @@
+from .generate import Backend
+from .build import BuildSpec, load_python_spec
+from .output_cache import input_digest
+from .registers.structure import RegisterSet, Register, Field, RegType, FieldType, FieldFunction, FieldChangeType, WriteEventType
+from .bus.structure import WbMaster, WbSlave, WbBus, WbBusTopology
+
+import enum
+import hashlib
+import json
+import os
+import pickle
+import typing
+
+
+
+# A declarative spec is a JSON or YAML document like this (optional keys in brackets):
+#
+#   register_sets:
+#     - name: My Registers
+#       [base_address: 0x00]         # omit, or set to null or "...", for automatic addressing
+#       port_size: 16
+#       [pipelined: false]
+#       [burst: false]
+#       registers:
+#         - name: Config
+#           [description: Config Data]
+#           [address: 0x00]
+#           regtype: WriteRead
+#           [write_event: StrobeOnWrite]
+#           [count: 1]
+#           [comment: ...]
+#           fields:
+#             - name: Speed
+#               [description: Speed Value]
+#               bits: [7, 0]
+#               datatype: Unsigned8Bit
+#               functions: [Read, ReadModifyWrite]
+#               [default: 0]
+#               [comment: ...]
+#               [trigger_on: Rising]
+#   [buses:]
+#     - name: My Bus
+#       [topology: SharedBus]
+#       masters:
+#         - {name: MCU, port_size: 32, granularity: 8, address_size: 16, [pipelined: false], [burst: false]}
+#       slaves:
+#         - {register_set: My Registers}
+#         - {name: Other, port_size: 8, granularity: 8, address_size: 4, [base_address: 0x100], [pipelined: false], [burst: false]}
+#   [backends: [systemverilog, c, python, markdown, graph]]
+#
+# Enums are given by name; integers may also be given as strings (e.g. "0x10"), as JSON has no hex literals.
+#
+# Loading a spec validates and compiles it, which is cached in a hidden <.name.fiogen.pickle> file next to the spec.
+# The cache is keyed by the contents of the spec and by the code of this package, so it never has to be cleaned up.
+# The key is stored as a text line in front of the pickle, so that a cache with another key is never unpickled.
+
+CACHE_PREFIX = '.'
+CACHE_SUFFIX = '.fiogen.pickle'
+
+
+
+def load_spec(filename: str, use_cache: bool = True) -> BuildSpec:
+    """ Loads a Python script (see load_python_spec()), or a JSON or YAML document (see load_declarative_spec()) """
+    if os.path.splitext(filename)[1].lower() in ['.json', '.yaml', '.yml']:
+        return load_declarative_spec(filename, use_cache)
+    return load_python_spec(filename)
+
+
+
+def load_declarative_spec(filename: str, use_cache: bool = True) -> BuildSpec:
+    """
+    Loads a JSON or YAML spec; YAML requires the <pyyaml> package
+
+    The validated and compiled spec is cached, so loading an unchanged spec again only has to unpickle it.
+    """
+    with open(filename, 'rb') as fp:
+        content = fp.read()
+    key = input_digest(hashlib.sha256(content).hexdigest())
+    directory, name = os.path.split(filename)
+    cache_filename = os.path.join(directory, f'{CACHE_PREFIX}{name}{CACHE_SUFFIX}')
+
+    if use_cache:
+        try:
+            with open(cache_filename, 'rb') as fp:
+                if fp.readline() == f'{key}\n'.encode('ascii'):
+                    return pickle.load(fp)
+        except Exception:
+            pass # missing, outdated or corrupt cache
+
+    if os.path.splitext(filename)[1].lower() == '.json':
+        document = json.loads(content.decode('utf-8'))
+    else:
+        import yaml
+        document = yaml.safe_load(content.decode('utf-8'))
+    spec = build_spec(document, filename)
+
+    if use_cache:
+        try:
+            temp_filename = cache_filename + '.tmp'
+            with open(temp_filename, 'wb') as fp:
+                fp.write(f'{key}\n'.encode('ascii'))
+                pickle.dump(spec, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_filename, cache_filename)
+        except OSError:
+            pass # e.g. read-only directory; the cache is only an optimization
+    return spec
+
+
+
+def build_spec(document: typing.Any, filename: str) -> BuildSpec:
+    """ Validates a parsed JSON/YAML document, and builds the register sets and buses it describes """
+
+    root = _Node(document, os.path.basename(filename) + ':')
+    root.check_keys(required=['register_sets'], optional=['buses', 'backends'])
+
+    register_sets = {}
+    for regset_node in root.children('register_sets'):
+        regset = _build_register_set(regset_node)
+        if regset.name in register_sets:
+            raise ValueError(f'{regset_node.path}: duplicate register set <{regset.name}>')
+        register_sets[regset.name] = regset
+
+    buses = [_build_bus(bus_node, register_sets) for bus_node in root.children('buses', [])]
+
+    backends = None
+    if 'backends' in root.value:
+        backends = [backend_node.to_enum(Backend, ignore_case=True) for backend_node in root.children('backends')]
+
+    # the compiled register sets are validated, and are what the generators need; they are also cheap to unpickle
+    compiled = []
+    for regset_node,regset in zip(root.children('register_sets'), register_sets.values()):
+        try:
+            compiled.append(regset.compile())
+        except Exception as ex:
+            raise ValueError(f'{regset_node.path}: {ex}') from ex
+
+    return BuildSpec(compiled, buses, backends, sources=[filename])
+
+
+
+def _build_register_set(node: "_Node") -> RegisterSet:
+    node.check_keys(required=['name', 'port_size', 'registers'], optional=['base_address', 'pipelined', 'burst'])
+    registers = []
+    for reg_node in node.children('registers'):
+        reg_node.check_keys(required=['name', 'regtype', 'fields'], optional=['description', 'address', 'write_event', 'count', 'comment'])
+        fields = []
+        for field_node in reg_node.children('fields'):
+            field_node.check_keys(required=['name', 'bits', 'datatype', 'functions'], optional=['description', 'default', 'comment', 'trigger_on'])
+            bits = [bit_node.to_int() for bit_node in field_node.children('bits')]
+            if len(bits) not in [1, 2]:
+                raise ValueError(f'{field_node.path}.bits: must be [bit] or [msb, lsb]')
+            fields.append(Field(field_node.get_str('name'), field_node.get_str('description', ''), bits,
+                field_node.child('datatype').to_enum(FieldType), field_node.child('functions').to_flags(FieldFunction),
+                default=field_node.child('default').to_int() if 'default' in field_node.value else 0,
+                comment=field_node.get_str('comment', None),
+                trigger_on=field_node.child('trigger_on').to_flags(FieldChangeType) if 'trigger_on' in field_node.value else 0))
+        write_event = reg_node.child('write_event').to_enum(WriteEventType) if reg_node.value.get('write_event') is not None else None
+        registers.append(Register(reg_node.get_str('name'), reg_node.get_str('description', ''), reg_node.get_address('address'),
+            reg_node.child('regtype').to_enum(RegType), fields, write_event=write_event, comment=reg_node.get_str('comment', None),
+            count=reg_node.child('count').to_int() if 'count' in reg_node.value else 1))
+
+    name, base_address, port_size = node.get_str('name'), node.get_address('base_address'), node.child('port_size').to_int()
+    pipelined, burst = node.get_bool('pipelined', False), node.get_bool('burst', False)
+    try:
+        return RegisterSet(name, base_address, port_size, registers, pipelined=pipelined, burst=burst)
+    except Exception as ex:
+        raise ValueError(f'{node.path}: {ex}') from ex
+
+
+
+def _build_bus(node: "_Node", register_sets: "dict[str,RegisterSet]") -> WbBus:
+    node.check_keys(required=['name', 'masters', 'slaves'], optional=['topology'])
+    node_keys = ['name', 'port_size', 'granularity', 'address_size']
+
+    masters = []
+    for master_node in node.children('masters'):
+        master_node.check_keys(required=node_keys, optional=['pipelined', 'burst'])
+        masters.append(WbMaster(master_node.get_str('name'), master_node.child('port_size').to_int(), master_node.child('granularity').to_int(),
+            master_node.child('address_size').to_int(), master_node.get_bool('pipelined', False), master_node.get_bool('burst', False)))
+
+    slaves = []
+    for slave_node in node.children('slaves'):
+        if isinstance(slave_node.value, dict) and 'register_set' in slave_node.value:
+            slave_node.check_keys(required=['register_set'])
+            regset_name = slave_node.get_str('register_set')
+            if regset_name not in register_sets:
+                raise ValueError(f'{slave_node.path}.register_set: unknown register set <{regset_name}>')
+            slaves.append(WbSlave.from_register_set(register_sets[regset_name]))
+        else:
+            slave_node.check_keys(required=node_keys, optional=['base_address', 'pipelined', 'burst'])
+            slaves.append(WbSlave(slave_node.get_str('name'), slave_node.child('port_size').to_int(), slave_node.child('granularity').to_int(),
+                slave_node.child('address_size').to_int(), slave_node.get_address('base_address'), slave_node.get_bool('pipelined', False), slave_node.get_bool('burst', False)))
+
+    name = node.get_str('name')
+    topology = node.child('topology').to_enum(WbBusTopology) if 'topology' in node.value else WbBusTopology.SharedBus
+    try:
+        return WbBus(name, masters, slaves, topology)
+    except Exception as ex:
+        raise ValueError(f'{node.path}: {ex}') from ex
+
+
+
+class _Node:
+    """ A value in the parsed document, together with its path for error messages """
+
+
+    def __init__(self, value: typing.Any, path: str):
+        self.value, self.path = value, path
+
+
+    @property
+    def where(self) -> str:
+        return self.path.rstrip(':')
+
+
+    def _key_path(self, key: str) -> str:
+        return f'{self.path}{key}' if self.path.endswith(':') else f'{self.path}.{key}'
+
+
+    def check_keys(self, required: "list[str]", optional: "list[str]" = []):
+        if not isinstance(self.value, dict):
+            raise ValueError(f'{self.where}: expected a mapping')
+        for key in required:
+            if key not in self.value:
+                raise ValueError(f'{self.where}: missing key <{key}>')
+        for key in self.value.keys():
+            if key not in required and key not in optional:
+                raise ValueError(f'{self.where}: unknown key <{key}>')
+
+
+    def child(self, key: str) -> "_Node":
+        return _Node(self.value.get(key), self._key_path(key))
+
+
+    def children(self, key: str, default: "list|None" = None) -> "list[_Node]":
+        if key not in self.value and default is not None:
+            return default
+        items = self.value[key]
+        if not isinstance(items, list):
+            raise ValueError(f'{self._key_path(key)}: expected a list')
+        return [_Node(item, f'{self._key_path(key)}[{i}]') for i,item in enumerate(items)]
+
+
+    def get_str(self, key: str, default: "str|None" = ...) -> "str|None":
+        if key not in self.value or self.value[key] is None:
+            if default is Ellipsis:
+                raise ValueError(f'{self._key_path(key)}: expected a string')
+            return default
+        if not isinstance(self.value[key], str):
+            raise ValueError(f'{self._key_path(key)}: expected a string')
+        return self.value[key]
+
+
+    def get_bool(self, key: str, default: bool) -> bool:
+        value = self.value.get(key, default)
+        if not isinstance(value, bool):
+            raise ValueError(f'{self._key_path(key)}: expected true or false')
+        return value
+
+
+    def to_int(self) -> int:
+        if isinstance(self.value, bool):
+            raise ValueError(f'{self.where}: expected an integer')
+        if isinstance(self.value, int):
+            return self.value
+        if isinstance(self.value, str):
+            try:
+                return int(self.value, 0)
+            except ValueError:
+                pass
+        raise ValueError(f'{self.where}: expected an integer')
+
+
+    def get_address(self, key: str) -> "int|Ellipsis":
+        """ An address, or Ellipsis for automatic addressing """
+        if self.value.get(key) in [None, '...']:
+            return Ellipsis
+        return self.child(key).to_int()
+
+
+    def to_enum(self, enum_type: "type[enum.Enum]", ignore_case: bool = False) -> enum.Enum:
+        names = {(member.lower() if ignore_case else member): member for member in enum_type.__members__.keys()}
+        if isinstance(self.value, str):
+            name = self.value.lower() if ignore_case else self.value
+            if name in names:
+                return enum_type[names[name]]
+        raise ValueError(f'{self.where}: expected one of {", ".join(enum_type.__members__.keys())}, got <{self.value}>')
+
+
+    def to_flags(self, flag_type: "type[enum.Flag]") -> enum.Flag:
+        """ A single flag, or a list of flags that are combined """
+        items = self.value if isinstance(self.value, list) else [self.value]
+        result = flag_type(0)
+        for i,item in enumerate(items):
+            result |= _Node(item, f'{self.path}[{i}]' if isinstance(self.value, list) else self.path).to_enum(flag_type)
+        return result
@@ -1,6 +1,8 @@
+import functools
 import math
 import re
 import enum
+import typing
 
 
 def check_names(registers: "WbRegisterSet"):
@@ -61,6 +63,15 @@ def md_table(rows: "list[list[any]]") -> str:
     return md
 
 
+def write_lines(fp: "typing.TextIO", lines: "typing.Iterable[str]", line_end: str = '\n'):
+    """ Writes lines to a file-like object, separated by <line_end>; same result as fp.write(line_end.join(lines)),
+        but without building the whole text in memory """
+    for i, line in enumerate(lines):
+        if i > 0:
+            fp.write(line_end)
+        fp.write(line)
+
+
 def binary_si(n: int, unit: str = '') -> str:
     assert n >= 0
     assert isinstance(n, int)
@@ -84,13 +95,22 @@ class NamingConvention(enum.Enum):
     PascalCase = enum.auto()
 
 
+_RE_LOWER = re.compile(r'[a-z]')
+_RE_UPPER = re.compile(r'[A-Z]')
+_RE_UPPER_RUN = re.compile(r'[A-Z]+')
+_RE_SEPARATOR = re.compile(r'[ _-]')
+_RE_INVALID = re.compile(r'[^a-zA-Z0-9]')
+_RE_DIGITS_ONLY = re.compile(r'^[0-9]*$')
+
+
+@functools.lru_cache(maxsize=4096)
 def make_sourcecode_name(name: str, convention: "NamingConvention" = NamingConvention.snake_case) -> str:
 
     # split at word boundaries
-    is_mixed_case = re.search(r'[a-z]', name) is not None and re.search(r'[A-Z]', name) is not None
-    contains_separators = re.search(r'[ _-]', name) is not None
+    is_mixed_case = _RE_LOWER.search(name) is not None and _RE_UPPER.search(name) is not None
+    contains_separators = _RE_SEPARATOR.search(name) is not None
     if is_mixed_case and not contains_separators:
-        cuts = [m.span()[0] for m in re.finditer(r'[A-Z]+', name)]
+        cuts = [m.span()[0] for m in _RE_UPPER_RUN.finditer(name)]
         pos = 0
         parts = []
         for cut in cuts:
@@ -102,13 +122,13 @@ def make_sourcecode_name(name: str, convention: "NamingConvention" = NamingConve
             parts.append(name[pos:])
         parts = [p.lower() for p in parts]
     else:
-        parts = re.split(r'[ _-]', name)
+        parts = _RE_SEPARATOR.split(name)
 
     # remove empty parts
     parts = [p for p in parts if len(p)>0]
 
     # remove invalid characters
-    parts = [re.sub(r'[^a-zA-Z0-9]', r'', p) for p in parts]
+    parts = [_RE_INVALID.sub(r'', p) for p in parts]
 
     # convert to naming convention
     if convention is NamingConvention.snake_case:
@@ -121,7 +141,44 @@ def make_sourcecode_name(name: str, convention: "NamingConvention" = NamingConve
             code += part[0].upper() + part[1:].lower()
 
     # remote leading digits
-    if re.match(r'^[0-9]*$', code):
+    if _RE_DIGITS_ONLY.match(code):
         code = '_' + code
 
     return code
+
+
+class SymbolTable:
+    """
+    Source code names of one model (e.g. a register set), shared by all generators
+
+    Every name is mangled once per convention. Names are declared in a scope (e.g. the registers of a register set),
+    and declaring a name that mangles to the same identifier as another name in the same scope raises an error, as
+    the generated code would not compile, or silently use the wrong register.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._names: "dict[tuple[str,NamingConvention],str]" = {}
+        self._owners: "dict[tuple[str,str],str]" = {}
+
+
+    def name(self, name: str, convention: "NamingConvention" = NamingConvention.snake_case) -> str:
+        """ Returns the identifier for <name> """
+        key = (name, convention)
+        identifier = self._names.get(key)
+        if identifier is None:
+            identifier = self._names[key] = make_sourcecode_name(name, convention)
+        return identifier
+
+
+    def declare(self, scope: str, name: str, convention: "NamingConvention" = NamingConvention.snake_case) -> str:
+        """ Returns the identifier for <name>, after checking that no other name in <scope> has the same identifier """
+        return self.claim(scope, self.name(name, convention), name)
+
+
+    def claim(self, scope: str, identifier: str, owner: str) -> str:
+        """ Reserves an already mangled <identifier> in <scope> for <owner> (e.g. a combination of names) """
+        other = self._owners.setdefault((scope, identifier), owner)
+        if other != owner:
+            raise RuntimeError(f'Names in {self.model_name} are ambiguous: <{other}> and <{owner}> both result in <{identifier}>')
+        return identifier